@@ -0,0 +1,196 @@
+"""retrieval_namesの前方一致の曖昧さの報告。
+
+    python ambiguity_report.py [--max-length 5] [-o report.json]
+
+retrieve_one_data()は、入力に前方一致するデータが複数あると候補を選ばせる。種類ごとにpokemon_data.PrefixIndexを作り、次のものを求める。
+- データごとの、そのデータだけに一致する最短の入力（shortest_unique_prefixes）
+- 複数のデータに一致する入力と、それに一致するデータ（ambiguous_prefixes）
+- どう入力しても候補を選ぶことになるデータ（max_lengthを指定したときは、最短の入力がそれより長いデータも）に追加するretrieval_namesの案（suggested_aliases）
+
+retrieval_namesの案は、そのデータのretrieval_namesの語の後ろの部分（「かみなり」に対する「なり」）から、今より短い入力で区別できるようになり、
+他のデータの最短の入力を長くしないものを選ぶ。*_names.jsonのretrieval_namesにそのまま書ける、変換前の形で出す。
+
+標準出力には、最短の入力の長さごとのデータの数の表と、retrieval_namesの案を出す。-oを指定すると、全体をJSONで保存する。
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable
+from dataclasses import dataclass
+from os import PathLike
+import argparse
+import json
+import os
+import re
+
+import jsonc
+
+import pokemon_data
+from input_filepaths import default_input_filepaths, NamesFilepaths
+from pokemon_data import Converter, PrefixIndex
+
+# 表の列。これより長いものはまとめる
+MAX_LENGTH_COLUMN = 8
+ALIAS_SEPARATORS = r"[（）()・ 　]"
+NOT_ALIAS_STARTS = set("ぁぃぅぇぉっゃゅょゎんァィゥェォッャュョヮンー")
+
+
+@dataclass(eq=False)
+class AliasSuggestion:
+    name: str
+    display_name: str
+    alias: str
+    """ *_names.jsonに書く形 """
+    unique_prefix: str
+    """ aliasを追加したときの最短の入力 """
+    current_unique_prefix: str | None
+
+
+@dataclass(eq=False)
+class KindReport:
+    index: PrefixIndex
+    shortest_unique_prefixes: list[str | None]
+    ambiguous_prefixes: dict[str, list[int]]
+    suggestions: list[AliasSuggestion]
+
+
+def _alias_candidates(retrieval_names: Iterable[str]) -> list[str]:
+    """retrieval_namesを括弧などで区切った語と、その2文字以上の後ろの部分。小さい仮名、「ん」、「ー」で始まるものは除く。"""
+    words = {word for name in retrieval_names for word in re.split(ALIAS_SEPARATORS, name) if word != ""}
+    return sorted(
+        {
+            word[start:]
+            for word in words
+            for start in range(len(word) - 1)
+            if word[start] not in NOT_ALIAS_STARTS and word[start:] not in retrieval_names
+        },
+        key=len,
+    )
+
+
+def suggest_aliases(
+    index: PrefixIndex,
+    shortest_unique_prefixes: list[str | None],
+    names_json: dict,
+    converter: Converter,
+    max_length: int | None = None,
+) -> list[AliasSuggestion]:
+    # 最短の入力 -> データの番号。これを前方一致で含む名前を追加すると、そのデータを区別するのに長い入力が必要になる
+    taken = {prefix: i for i, prefix in enumerate(shortest_unique_prefixes) if prefix is not None}
+    # 案として採用した名前の変換後 -> データの番号
+    added: list[tuple[str, int]] = []
+    suggestions: list[AliasSuggestion] = []
+    for i, name in enumerate(index.names):
+        current = shortest_unique_prefixes[i]
+        if current is not None and (max_length is None or len(current) <= max_length):
+            continue
+        best: tuple[int, int, str, str, list[str]] | None = None
+        for alias in _alias_candidates(names_json[name]["retrieval_names"]):
+            try:
+                converted = converter.convert(alias)
+            except Exception:
+                continue
+            if any(taken.get(c[:k], i) != i for c in converted for k in range(1, len(c) + 1)):
+                continue
+            lengths = [(length, c) for c in converted if (length := index.unique_prefix_length(c, i)) is not None]
+            if len(lengths) == 0:
+                continue
+            length, c = min(lengths)
+            unique_prefix = c[:length]
+            if current is not None and length >= len(current):
+                continue
+            if any(j != i and other.startswith(unique_prefix) for other, j in added):
+                continue
+            if best is None or (length, len(alias)) < best[:2]:
+                best = (length, len(alias), alias, unique_prefix, converted)
+        if best is not None:
+            _, _, alias, unique_prefix, converted = best
+            suggestions.append(AliasSuggestion(name, index.data[i].display_name, alias, unique_prefix, current))
+            taken[unique_prefix] = i
+            added += [(c, i) for c in converted]
+    return suggestions
+
+
+def make_kind_report(
+    names_filepath: PathLike | str, converter: Converter, max_length: int | None = None
+) -> KindReport:
+    with open(names_filepath, encoding="utf-8") as f:
+        names_json: dict = jsonc.load(f)
+    index = PrefixIndex(pokemon_data.load_name_extended_other_data(names_filepath, converter))
+    shortest_unique_prefixes = index.shortest_unique_prefixes()
+    return KindReport(
+        index,
+        shortest_unique_prefixes,
+        index.ambiguous_prefixes(),
+        suggest_aliases(index, shortest_unique_prefixes, names_json, converter, max_length),
+    )
+
+
+def make_report(
+    names_filepaths: NamesFilepaths, converter: Converter, max_length: int | None = None
+) -> dict[str, KindReport]:
+    return {
+        kind: make_kind_report(getattr(names_filepaths, names_filepath_name), converter, max_length)
+        for kind, names_filepath_name in pokemon_data.NAMES_FILEPATH_NAMES.items()
+    }
+
+
+def format_table(report: dict[str, KindReport]) -> list[str]:
+    """種類ごとに、最短の入力の長さ（noneはどう入力しても候補を選ぶもの）ごとのデータの数。"""
+    columns = [str(length) for length in range(1, MAX_LENGTH_COLUMN)] + [f"{MAX_LENGTH_COLUMN}+", "none", "ambiguous"]
+    lines = [f"{'':<10}" + "".join(f"{column:>10}" for column in columns)]
+    for kind, kind_report in report.items():
+        counts = dict.fromkeys(columns, 0)
+        for prefix in kind_report.shortest_unique_prefixes:
+            if prefix is None:
+                counts["none"] += 1
+            else:
+                counts[columns[min(len(prefix), MAX_LENGTH_COLUMN) - 1]] += 1
+        counts["ambiguous"] = len(kind_report.ambiguous_prefixes)
+        lines.append(f"{kind:<10}" + "".join(f"{count:>10}" for count in counts.values()))
+    return lines
+
+
+def to_json(report: dict[str, KindReport]) -> dict:
+    result = {}
+    for kind, kind_report in report.items():
+        index = kind_report.index
+        result[kind] = {
+            "shortest_unique_prefixes": dict(zip(index.names, kind_report.shortest_unique_prefixes)),
+            "ambiguous_prefixes": {
+                prefix: [index.data[i].display_name for i in candidates]
+                for prefix, candidates in kind_report.ambiguous_prefixes.items()
+            },
+            "suggested_aliases": {suggestion.name: [suggestion.alias] for suggestion in kind_report.suggestions},
+        }
+    return result
+
+
+def save_report(report: dict[str, KindReport], output_filepath: PathLike | str) -> None:
+    temp_filepath = f"{os.fspath(output_filepath)}.tmp"
+    with open(temp_filepath, encoding="utf-8", mode="w") as f:
+        json.dump(to_json(report), f, ensure_ascii=False, indent=4)
+    os.replace(temp_filepath, output_filepath)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--max-length", type=int, default=None, help="最短の入力がこれより長いデータにもretrieval_namesの案を出す"
+    )
+    parser.add_argument("-o", "--output", help="報告全体を保存するJSONファイル")
+    args = parser.parse_args()
+    converter = pokemon_data.JpToRomaji(default_input_filepaths.replacement_filepath)
+    report = make_report(default_input_filepaths.names_filepaths, converter, args.max_length)
+    print(*format_table(report), sep="\n")
+    for kind, kind_report in report.items():
+        for suggestion in kind_report.suggestions:
+            print(
+                f"{kind} {suggestion.name} ({suggestion.display_name}): {suggestion.alias} "
+                f"({suggestion.current_unique_prefix} -> {suggestion.unique_prefix})"
+            )
+    if args.output is not None:
+        save_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""ファイルまたは標準入力から1行に1つのクエリ（対話モードと同じ書式）を読み、計算結果をJSON LinesまたはCSVで書き出す。
+
+候補が一つに定まらない名前は、入力を求めずにambiguity_policyに従って扱う。
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal, TextIO
+import argparse
+import itertools
+import sys
+
+import input_processor
+from pokemon_data import AllData
+from pokemon_calc import OUTPUT_FIELDNAMES, calc_damages, write_csv, write_json_lines
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import AmbiguityPolicy, InvalidInput
+
+
+CSV_FIELDNAMES = ["line_number", "query", "error", *OUTPUT_FIELDNAMES]
+
+
+class BatchCalculator:
+    """AllData等を一度だけ読み込んで、クエリを評価する。"""
+
+    def __init__(self, input_filepaths: InputFilepaths, ambiguity_policy: AmbiguityPolicy = "first") -> None:
+        context = input_processor.load_query_context(input_filepaths)
+        self.all_data: AllData = context.all_data
+        self.preset_store = context.preset_store
+        self.compiled_presets = context.compiled_presets
+        self.spread_profile = context.spread_profile
+        self.ambiguity_policy: AmbiguityPolicy = ambiguity_policy
+
+    def evaluate(self, line_number: int, query: str) -> list[dict]:
+        """queryの計算結果を1つのOutputにつき1つの辞書で返す。エラーのときはerrorを持つ辞書を1つ返す。"""
+        try:
+            inputs = input_processor.get_inputs_from_str(
+                query,
+                self.all_data,
+                self.preset_store,
+                self.spread_profile,
+                self.compiled_presets,
+                ambiguity_policy=self.ambiguity_policy,
+                allow_preset_commands=False,
+            )
+            assert inputs is not None
+            return [
+                {"line_number": line_number, "query": query, **output.to_dict()}
+                for output in calc_damages(inputs, self.all_data)
+            ]
+        except InvalidInput as e:
+            return [{"line_number": line_number, "query": query, "error": str(e)}]
+        except Exception as e:
+            # 1行の失敗でバッチ全体を止めない
+            return [{"line_number": line_number, "query": query, "error": f"{type(e).__name__}: {e}"}]
+
+    def evaluate_chunk(self, chunk: list[tuple[int, str]]) -> list[dict]:
+        return [record for line_number, query in chunk for record in self.evaluate(line_number, query)]
+
+
+# ProcessPoolExecutorの各プロセスで使う。forkで起動するときは親プロセスで読み込んだものがそのまま使われる。
+_worker_calculator: BatchCalculator | None = None
+
+
+def init_worker(input_filepaths: InputFilepaths, ambiguity_policy: AmbiguityPolicy) -> BatchCalculator:
+    """このプロセスのBatchCalculatorを用意して返す。読み込み済みならそれを使う。"""
+    global _worker_calculator
+    if _worker_calculator is None or _worker_calculator.ambiguity_policy != ambiguity_policy:
+        _worker_calculator = BatchCalculator(input_filepaths, ambiguity_policy)
+    return _worker_calculator
+
+
+def evaluate_chunk_in_worker(chunk: list[tuple[int, str]]) -> list[dict]:
+    """init_worker()を初期化関数としたProcessPoolExecutorで使う。"""
+    assert _worker_calculator is not None
+    return _worker_calculator.evaluate_chunk(chunk)
+
+
+def read_queries(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """空行と "#" で始まる行を除いて、(行番号, クエリ) を返す。"""
+    for line_number, line in enumerate(lines, 1):
+        query = line.strip()
+        if query != "" and not query.startswith("#"):
+            yield line_number, query
+
+
+def chunked[T](iterable: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def run_batch(
+    queries: Iterable[tuple[int, str]],
+    input_filepaths: InputFilepaths,
+    ambiguity_policy: AmbiguityPolicy = "first",
+    workers: int = 1,
+    chunk_size: int = 64,
+) -> Iterator[dict]:
+    """結果をqueriesの順に返す。workersが2以上のとき、chunk_size個ずつ別プロセスで計算する。"""
+    calculator = init_worker(input_filepaths, ambiguity_policy)
+    if workers <= 1:
+        for line_number, query in queries:
+            yield from calculator.evaluate(line_number, query)
+        return
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(input_filepaths, ambiguity_policy)
+    ) as executor:
+        for records in executor.map(evaluate_chunk_in_worker, chunked(queries, chunk_size)):
+            yield from records
+
+
+def write_records(records: Iterable[dict], output: TextIO, output_format: Literal["jsonl", "csv"]) -> None:
+    if output_format == "jsonl":
+        write_json_lines(records, output)
+    else:
+        write_csv(records, output, CSV_FIELDNAMES)
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", nargs="?", default="-", help="クエリのファイル。省略または - のとき標準入力")
+    parser.add_argument("-o", "--output", default="-", help="出力先のファイル。省略または - のとき標準出力")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--ambiguity", choices=["first", "error"], default="first")
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_file = sys.stdout if args.output == "-" else open(args.output, encoding="utf-8", mode="w", newline="")
+    try:
+        records = run_batch(read_queries(input_file), input_filepaths, args.ambiguity, args.workers, args.chunk_size)
+        write_records(records, output_file, args.format)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
@@ -0,0 +1,338 @@
+"""ダメージ計算、能力値計算、名前の検索の速度を、決まった入力で計測する。
+
+各ケースの結果はgoldenファイル（JSON Lines）と比較する。計算を速くする変更を加えたときは、goldenと完全に一致することを確認する。
+goldenはpokeapiのデータとnamesファイルに依存するため、--update-goldenでそれぞれの環境で作る。
+goldenは変更を加える前のコミットで作る必要があり、変更後の実装で作ると比較の意味がないため、--update-goldenは既にあるgoldenを上書きしない。
+ベースラインの実装で作ったgoldenは、tests/fixtures/engine_golden.jsonl（tests/test_engine_golden.pyで比較する）としてリポジトリにある。
+"""
+
+from __future__ import annotations
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import ast
+import json
+import math
+import sys
+import time
+
+import pokemon_data
+import input_processor
+import pokemon_calc
+import profiler
+from pokemon_data import AllData
+from pokemon_calc import BattlePokemonArgs, InputArgs, OutputTable, calc_damages, calc_nouryokuchi
+from pokemon_calc import Hoseichi, mul_round_5_to_up, mul_round_5_to_down, mul_round_5_to_down_list
+from pokemon_calc import round_5_to_up, round_5_to_down
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import InvalidInput, SpreadProfile
+from preset_store import PresetStore
+
+default_golden_filepath = Path(__file__).resolve().parent / "benchmark_golden.jsonl"
+
+# 対話モードの入力。presetは使わない
+SINGLE_QUERIES = [
+    "gabu kai w zis",
+    "gabu kai w zis d 252 s a m inoti",
+    "gabu doraparu w gekiril m tama j hare",
+    "kai gabu w silsoku r 1",
+    "kai gabu w reitoubi-mu t honoo",
+    "doraparu gabu w doragonaro- to kuria s n",
+    "gabu kai w kaelhousya d 100 s k h 252",
+    "kai doraparu w sinsoku d6 0-252-0-0-4-252 seikaku a-c",
+]
+# (attacker, defender, move)。努力値を入力しないため、spread_profileのすべての組に展開される
+EXPANSION_CASES = [
+    ("garchomp", "dragonite", "earthquake"),
+    ("garchomp", "dragapult", "dragon-claw"),
+    ("dragonite", "garchomp", "ice-beam"),
+    ("dragapult", "dragonite", "draco-meteor"),
+    ("dragonite", "dragapult", "extreme-speed"),
+]
+# 1体のattackerから、すべてのポケモンへのダメージを計算する
+SWEEP_ATTACKER = "garchomp"
+SWEEP_MOVE = "earthquake"
+RETRIEVAL_PREFIX_LENGTHS = [1, 2, 3, 4]
+
+
+@dataclass(eq=False)
+class Case:
+    name: str
+    run: Callable[[], object]
+    """ 戻り値をgoldenと比較する。jsonに変換できる値を返す。 """
+
+
+@dataclass(eq=False)
+class WorkloadResult:
+    name: str
+    latencies_ns: list[int]
+    results: dict[str, object]
+
+    def percentile_us(self, p: float) -> float:
+        latencies = sorted(self.latencies_ns)
+        return latencies[min(len(latencies) - 1, math.ceil(len(latencies) * p / 100) - 1)] / 1000
+
+    def to_str(self) -> str:
+        ops_per_sec = len(self.latencies_ns) / (sum(self.latencies_ns) / 1e9) if sum(self.latencies_ns) > 0 else 0
+        return (
+            f"{self.name:<16} {len(self.latencies_ns):>7d} ops {ops_per_sec:>12.1f} ops/s"
+            f" p50 {self.percentile_us(50):>10.1f}us p90 {self.percentile_us(90):>10.1f}us"
+            f" p99 {self.percentile_us(99):>10.1f}us max {max(self.latencies_ns) / 1000:>10.1f}us"
+        )
+
+
+class Benchmark:
+    def __init__(self, input_filepaths: InputFilepaths) -> None:
+        self.all_data: AllData = pokemon_data.load_all_data(
+            input_filepaths.pokeapi_filepaths,
+            input_filepaths.names_filepaths,
+            pokemon_data.JpToRomaji(input_filepaths.replacement_filepath),
+            input_filepaths.metagame_filepath,
+        )
+        # 保存されたpresetが結果に影響しないように、存在しないファイルを使う
+        self.preset_store = PresetStore(Path(input_filepaths.preset_filepath).with_name("benchmark_preset.json"))
+        self.spread_profile = SpreadProfile(self.all_data, input_filepaths.spread_profile_filepath)
+        self.workloads: dict[str, Callable[[], list[Case]]] = {
+            "single_query": self.single_query_cases,
+            "expansion": self.expansion_cases,
+            "sweep": self.sweep_cases,
+            **{f"retrieval_{n}": (lambda n=n: self.retrieval_cases(n)) for n in RETRIEVAL_PREFIX_LENGTHS},
+            "nouryokuchi": self.nouryokuchi_cases,
+        }
+
+    def single_query_cases(self) -> list[Case]:
+        def run(query: str) -> object:
+            try:
+                inputs = input_processor.get_inputs_from_str(
+                    query,
+                    self.all_data,
+                    self.preset_store,
+                    self.spread_profile,
+                    ambiguity_policy="first",
+                    allow_preset_commands=False,
+                )
+            except InvalidInput as e:
+                return {"error": str(e)}
+            assert inputs is not None
+            outputs = calc_damages(inputs, self.all_data)
+            return [outputs[0].header_str(), *OutputTable(outputs).render().split("\n")]
+
+        return [Case(query, lambda query=query: run(query)) for query in SINGLE_QUERIES]
+
+    def _calc(self, attacker: BattlePokemonArgs, defender: BattlePokemonArgs, move_name: str) -> object:
+        input_args = InputArgs(attacker, defender, self.all_data.moves[move_name])
+        try:
+            inputs = list(input_processor.iter_inputs(input_args, self.all_data, self.spread_profile))
+        except InvalidInput as e:
+            return {"error": str(e)}
+        return [output.to_dict() for output in calc_damages(inputs, self.all_data)]
+
+    def expansion_cases(self) -> list[Case]:
+        return [
+            Case(
+                f"{attacker} {defender} {move}",
+                lambda attacker=attacker, defender=defender, move=move: self._calc(
+                    BattlePokemonArgs(self.all_data.pokemons[attacker]),
+                    BattlePokemonArgs(self.all_data.pokemons[defender]),
+                    move,
+                ),
+            )
+            for attacker, defender, move in EXPANSION_CASES
+            if attacker in self.all_data.pokemons and defender in self.all_data.pokemons
+        ]
+
+    def sweep_cases(self) -> list[Case]:
+        if SWEEP_ATTACKER not in self.all_data.pokemons:
+            return []
+        return [
+            Case(
+                defender,
+                lambda defender=defender: self._calc(
+                    BattlePokemonArgs(self.all_data.pokemons[SWEEP_ATTACKER], doryokuchi=252, seikaku_hosei=1.1),
+                    BattlePokemonArgs(self.all_data.pokemons[defender]),
+                    SWEEP_MOVE,
+                ),
+            )
+            for defender in sorted(self.all_data.pokemons)
+        ]
+
+    def retrieval_cases(self, prefix_length: int) -> list[Case]:
+        prefixes = sorted(
+            {
+                retrieval_name[:prefix_length]
+                for data in self.all_data.pokemons.values()
+                for retrieval_name in data.retrieval_names
+            }
+        )
+        return [
+            Case(
+                prefix,
+                lambda prefix=prefix: [
+                    data.data.name for data in pokemon_data.retrieve_data(self.all_data.pokemons, prefix)
+                ],
+            )
+            for prefix in prefixes
+        ]
+
+    def nouryokuchi_cases(self) -> list[Case]:
+        def run(shuzokuchi: int) -> object:
+            return [
+                calc_nouryokuchi(shuzokuchi, doryokuchi, kotaichi, seikaku_hosei, level)
+                for doryokuchi in range(0, 253, 4)
+                for kotaichi in [0, 31]
+                for seikaku_hosei in [0.9, 1, 1.1]
+                for level in [50, 100]
+            ]
+
+        return [Case(str(shuzokuchi), lambda shuzokuchi=shuzokuchi: run(shuzokuchi)) for shuzokuchi in range(5, 256)]
+
+    def run(self, workload_name: str, repeat: int = 1) -> WorkloadResult:
+        """各ケースを1回実行して結果を記録したあと、repeat回ずつ時間を計る。"""
+        cases = self.workloads[workload_name]()
+        results: dict[str, object] = {}
+        latencies_ns: list[int] = []
+        for case in cases:
+            # goldenと同じ形で比較するため、jsonを経由させる
+            results[case.name] = json.loads(json.dumps(case.run(), ensure_ascii=False))
+        for _ in range(repeat):
+            for case in cases:
+                start = time.perf_counter_ns()
+                case.run()
+                latencies_ns.append(time.perf_counter_ns() - start)
+        return WorkloadResult(workload_name, latencies_ns, results)
+
+
+def save_golden(workload_results: list[WorkloadResult], golden_filepath: Path | str) -> None:
+    with open(golden_filepath, encoding="utf-8", mode="w", newline="\n") as f:
+        for workload_result in workload_results:
+            for case_name, result in workload_result.results.items():
+                record = {"workload": workload_result.name, "case": case_name, "result": result}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def check_golden(workload_results: list[WorkloadResult], golden_filepath: Path | str) -> list[str]:
+    """goldenと一致しないケースを "<workload> <case>" の形で返す。goldenにないケースも一致しないものとする。"""
+    golden: dict[tuple[str, str], object] = {}
+    with open(golden_filepath, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            golden[(record["workload"], record["case"])] = record["result"]
+    mismatches: list[str] = []
+    for workload_result in workload_results:
+        for case_name, result in workload_result.results.items():
+            key = (workload_result.name, case_name)
+            if key not in golden or golden[key] != result:
+                mismatches.append(f"{workload_result.name} {case_name}")
+    return mismatches
+
+
+def hoseichi_table_values() -> list[int]:
+    """pokemon_calc.pyで.hosei()に渡される定数の補正値。"""
+    tree = ast.parse(Path(pokemon_calc.__file__).read_text(encoding="utf-8"))
+    return sorted(
+        {
+            node.args[0].value
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "hosei"
+            and len(node.args) == 1
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, int)
+        }
+    )
+
+
+def verify_fixed_point(max_x: int = 1024, max_quotient: int = 1 << 16) -> list[str]:
+    """整数演算の補正値の計算が、浮動小数点数による計算と一致することを確かめ、一致しない入力を返す。
+
+    valueは補正値の表の定数と、それらを2つまでHoseichiで掛け合わせた値。xは0以上max_x未満と、表の定数を掛け合わせた値。
+    それに加えて、x * value / 4096 の小数部が0.5の前後になる積を、商が -max_quotient 以上 max_quotient 未満の範囲で調べる。
+    """
+    table_values = hoseichi_table_values()
+    values = set(table_values)
+    for first in table_values:
+        for second in table_values:
+            hoseichi = Hoseichi()
+            hoseichi.hosei(first)
+            hoseichi.hosei(second)
+            values.add(hoseichi.hoseichi)
+    xs = sorted(set(range(max_x)) | values)
+    mismatches: list[str] = []
+    for value in sorted(values):
+        if mul_round_5_to_down_list(xs, value) != [mul_round_5_to_down(x, value) for x in xs]:
+            mismatches.append(f"mul_round_5_to_down_list {value}")
+        for x in xs:
+            if mul_round_5_to_up(x, value) != round_5_to_up(x * value / 4096):
+                mismatches.append(f"mul_round_5_to_up {x} {value}")
+            if mul_round_5_to_down(x, value) != round_5_to_down(x * value / 4096):
+                mismatches.append(f"mul_round_5_to_down {x} {value}")
+    # 四捨五入の境界。x * value / 4096 は 2**53 未満では誤差なく表せるため、valueを1として積を直接調べる
+    for quotient in range(-max_quotient, max_quotient):
+        for remainder in [0, 1, 2047, 2048, 2049, 4095]:
+            product = quotient * 4096 + remainder
+            if mul_round_5_to_up(product, 1) != round_5_to_up(product / 4096):
+                mismatches.append(f"mul_round_5_to_up {product}")
+            if mul_round_5_to_down(product, 1) != round_5_to_down(product / 4096):
+                mismatches.append(f"mul_round_5_to_down {product}")
+    # FinalDamageCalc.ransuu()
+    for damage in range(max_x * 16):
+        for r in range(85, 101):
+            if damage * r // 100 != math.floor(damage * r / 100):
+                mismatches.append(f"ransuu {damage} {r}")
+    return mismatches
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "workloads", nargs="*", help="single_query, expansion, sweep, retrieval_<n>, nouryokuchi。省略するとすべて"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--golden", default=default_golden_filepath)
+    parser.add_argument("--update-golden", action="store_true", help="結果をgoldenとして保存する。既にあるgoldenは上書きしない")
+    parser.add_argument("--profile", action="store_true", help="段階ごとの時間を最後に表示する。計測自体の時間も含まれる")
+    parser.add_argument("--verify-fixed-point", action="store_true", help="補正値の整数演算を浮動小数点数の計算と比べる")
+    args = parser.parse_args()
+    if args.verify_fixed_point:
+        mismatches = verify_fixed_point()
+        for mismatch in mismatches[:20]:
+            print(f"mismatch: {mismatch}")
+        print(f"fixed point: {len(mismatches)} mismatches")
+        if mismatches:
+            sys.exit(1)
+        return
+    if args.update_golden and Path(args.golden).exists():
+        sys.exit(f"golden already exists: {args.golden} (作り直すときは、変更を加える前のコミットで削除してから実行する)")
+    if args.profile:
+        profiler.enable()
+    benchmark = Benchmark(input_filepaths)
+    for workload_name in args.workloads:
+        if workload_name not in benchmark.workloads:
+            parser.error(f"unknown workload: {workload_name}")
+
+    workload_results: list[WorkloadResult] = []
+    for workload_name in args.workloads or benchmark.workloads:
+        workload_result = benchmark.run(workload_name, args.repeat)
+        print(workload_result.to_str(), flush=True)
+        workload_results.append(workload_result)
+    if args.profile:
+        print(profiler.report())
+
+    if args.update_golden:
+        save_golden(workload_results, args.golden)
+        print(f"golden saved: {args.golden}")
+    elif Path(args.golden).exists():
+        mismatches = check_golden(workload_results, args.golden)
+        for mismatch in mismatches:
+            print(f"mismatch: {mismatch}")
+        print(f"golden: {len(mismatches)} mismatches")
+        if mismatches:
+            sys.exit(1)
+    else:
+        print(f"golden not found: {args.golden} (--update-goldenで作る)")
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
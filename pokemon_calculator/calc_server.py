@@ -0,0 +1,245 @@
+"""AllDataを読み込んだまま待ち受け、HTTP/JSONで計算を受け付けるローカルサーバー。
+
+POST /calc
+    {"query": "gabu kai w zis"} または query_from_json() の形式のJSONを受け取り、{"outputs": [Output.to_dict(), ...]} を返す。
+POST /sweep
+    {"queries": [...]} を受け取り、batch_calcと同じ形式の結果を {"results": [...]} で返す。プロセスプールで計算する。
+    line_numberはqueriesの添字。不正な要素はその要素だけerrorを持つ結果になる。
+GET /health
+    {"status": "ok"} を返す。
+
+外部からの接続は想定していないため、既定では127.0.0.1で待ち受ける。--unixを指定するとUnixソケットで待ち受ける。
+"""
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+import argparse
+import asyncio
+import json
+import sys
+import traceback
+
+import batch_calc
+from batch_calc import BatchCalculator
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import AmbiguityPolicy, BATTLE_POKEMON_OPTIONS
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def query_from_json(request: dict) -> str:
+    """InputArgsに対応するJSONを対話モードと同じ書式のクエリに変換する。
+
+    {
+        "attacker": {"pokemon": "gabu", "d": "252", "m": "kodawari"},
+        "defender": {"pokemon": "kai", "to": "marusuke"},
+        "move": "zis",
+        "states": ["hare"],
+        "hp_doryokuchi": 0,
+        "hp_kotaichi": 31
+    }
+    attacker、defenderのキーには "pokemon" とBATTLE_POKEMON_OPTIONSが使える。
+    """
+    words: list[str] = []
+    for side in ["attacker", "defender"]:
+        battle_pokemon = request.get(side)
+        if not isinstance(battle_pokemon, dict) or "pokemon" not in battle_pokemon:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"{side}.pokemon is required")
+        words.append(str(battle_pokemon["pokemon"]))
+        for option, value in battle_pokemon.items():
+            if option == "pokemon":
+                continue
+            if option not in BATTLE_POKEMON_OPTIONS:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"unknown option: {side}.{option}")
+            words += [option, str(value)]
+    if "move" in request:
+        words += ["w", str(request["move"])]
+    if "hp_doryokuchi" in request:
+        words += ["h", str(request["hp_doryokuchi"])]
+    if "hp_kotaichi" in request:
+        words += ["hk", str(request["hp_kotaichi"])]
+    if request.get("states"):
+        words += ["j", *map(str, request["states"])]
+    if any(word == "" or len(word.split()) != 1 for word in words):
+        raise HttpError(HTTPStatus.BAD_REQUEST, "values must be single words")
+    return " ".join(words)
+
+
+def _query_from_item(item: str | dict) -> str:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and isinstance(item.get("query"), str):
+        return item["query"]
+    if isinstance(item, dict):
+        return query_from_json(item)
+    raise HttpError(HTTPStatus.BAD_REQUEST, "query must be a string or an object")
+
+
+class CalcServer:
+    def __init__(
+        self,
+        input_filepaths: InputFilepaths,
+        ambiguity_policy: AmbiguityPolicy = "first",
+        workers: int = 1,
+        chunk_size: int = 64,
+    ) -> None:
+        self.calculator: BatchCalculator = batch_calc.init_worker(input_filepaths, ambiguity_policy)
+        self.chunk_size = chunk_size
+        # forkで起動するときは、読み込み済みのBatchCalculatorがそのまま引き継がれる
+        self.executor = ProcessPoolExecutor(
+            workers, initializer=batch_calc.init_worker, initargs=(input_filepaths, ambiguity_policy)
+        )
+        # 最初の/sweepでプロセスを起動すると、そのとき開いている接続のソケットが子プロセスに引き継がれて閉じなくなる。
+        # 待ち受けを始める前に起動しておく
+        self.executor.submit(int).result()
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def calc(self, request: dict) -> dict:
+        records = self.calculator.evaluate(1, _query_from_item(request))
+        if len(records) == 1 and "error" in records[0]:
+            raise HttpError(HTTPStatus.BAD_REQUEST, records[0]["error"])
+        for record in records:
+            del record["line_number"]
+        return {"outputs": records}
+
+    async def sweep(self, request: dict) -> dict:
+        items = request.get("queries")
+        if not isinstance(items, list):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "queries must be a list")
+        queries: list[tuple[int, str]] = []
+        # 添字からその要素の結果
+        results: list[list[dict]] = [[] for _ in items]
+        for i, item in enumerate(items):
+            try:
+                queries.append((i, _query_from_item(item)))
+            except HttpError as e:
+                results[i].append({"line_number": i, "query": item if isinstance(item, str) else None, "error": str(e)})
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, batch_calc.evaluate_chunk_in_worker, chunk)
+                for chunk in batch_calc.chunked(queries, self.chunk_size)
+            )
+        )
+        for chunk in chunks:
+            for record in chunk:
+                results[record["line_number"]].append(record)
+        return {"results": [record for records in results for record in records]}
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> dict:
+        if path == "/health":
+            if method != "GET":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} {path}")
+            return {"status": "ok"}
+        if path not in ["/calc", "/sweep"]:
+            raise HttpError(HTTPStatus.NOT_FOUND, path)
+        if method != "POST":
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} {path}")
+        try:
+            request = json.loads(body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"invalid json: {e}")
+        if not isinstance(request, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "request must be an object")
+        if path == "/calc":
+            return self.calc(request)
+        else:
+            return await self.sweep(request)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1のkeep-aliveに対応する。チャンク転送などは扱わない。"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "bad request line"}, False)
+                    break
+                headers: dict[str, str] = {}
+                while (line := await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                content_length = headers.get("content-length", "0")
+                if not content_length.isdigit():
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "bad content-length"}, False)
+                    break
+                if int(content_length) > MAX_BODY_SIZE:
+                    await self._write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": path}, False)
+                    break
+                body = await reader.readexactly(int(content_length))
+                try:
+                    status, response = HTTPStatus.OK, await self.dispatch(method, path.split("?")[0], body)
+                except HttpError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    traceback.print_exc(file=sys.stderr)
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                await self._write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_response(
+        self, writer: asyncio.StreamWriter, status: HTTPStatus, response: dict, keep_alive: bool
+    ) -> None:
+        body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                "\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, unix_path: str | None = None) -> None:
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        for socket in server.sockets:
+            print(f"listening on {socket.getsockname()}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="Unixソケットのパス。指定したときは--host、--portは使わない")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="/sweepで使うプロセス数")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--ambiguity", choices=["first", "error"], default="first")
+    args = parser.parse_args()
+
+    calc_server = CalcServer(input_filepaths, args.ambiguity, args.workers, args.chunk_size)
+    try:
+        asyncio.run(calc_server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        calc_server.close()
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
@@ -0,0 +1,271 @@
+"""データの生成を、makeのように依存関係をたどって必要なものだけ行う。
+
+    python data_build.py [-j 4] [-n]
+
+PokeAPIのダンプ → *_names.json（まだないエントリーの追加）
+→ 種類ごとのスナップショット（*_names.json.snapshot.pickle）とdata_validatorの検査結果（pokeapi/validation_report.txt）、
+ambiguity_reportの報告（pokeapi/ambiguity_report.json） の順に作る。metagame.jsonからは metagame.json.sqlite3（metagame_db）を作り、
+検査結果はこれにも依存する。
+各ステップは、入力ファイルの内容のsha256が前回実行したときと同じで、出力がすべてあれば実行しない。
+依存し合わないステップはプロセスを分けて並行して実行する。例えばmove_names.jsonを編集したときは、技のスナップショットと検査結果だけを作り直す。
+
+*_names.jsonは手で編集するファイルでもあるため、出力が前回から変わったことは実行する理由にしない。
+実行した記録（入力のハッシュと、ハッシュを計算し直さないためのファイルの更新時刻とサイズ）は pokeapi/build_state.json に保存する。
+"""
+
+from __future__ import annotations
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import ambiguity_report
+import data_validator
+import metagame_db
+import pokemon_data
+from input_filepaths import default_input_filepaths, InputFilepaths, NamesFilepaths, PokeapiFilepaths
+
+
+@dataclass(eq=False)
+class Step:
+    """actionは別のプロセスで実行するため、モジュールの最上位の関数で、argsはpickleできるものにする。"""
+
+    name: str
+    inputs: list[str]
+    outputs: list[str]
+    action: Callable[..., None]
+    args: tuple
+
+
+def state_filepath(pokeapi_filepaths: PokeapiFilepaths) -> Path:
+    return Path(pokeapi_filepaths.pokeapi_moves_filepath).with_name("build_state.json")
+
+
+def build_snapshot(
+    kind: str, pokeapi_filepaths: PokeapiFilepaths, names_filepaths: NamesFilepaths, replacement_filepath: str
+) -> None:
+    pokemon_data.build_snapshot(kind, pokeapi_filepaths, names_filepaths, pokemon_data.JpToRomaji(replacement_filepath))
+
+
+def validate(
+    pokeapi_filepaths: PokeapiFilepaths,
+    names_filepaths: NamesFilepaths,
+    replacement_filepath: str,
+    metagame_filepath: str,
+    output_filepath: str,
+) -> None:
+    converter = pokemon_data.JpToRomaji(replacement_filepath)
+    problems = data_validator.validate_all(pokeapi_filepaths, names_filepaths, converter, metagame_filepath)
+    data_validator.save_report(problems, output_filepath)
+    print(f"{len(problems)} problems. See {output_filepath}", flush=True)
+
+
+def report_filepath(pokeapi_filepaths: PokeapiFilepaths) -> Path:
+    return Path(pokeapi_filepaths.pokeapi_moves_filepath).with_name("validation_report.txt")
+
+
+def report_ambiguity(names_filepaths: NamesFilepaths, replacement_filepath: str, output_filepath: str) -> None:
+    report = ambiguity_report.make_report(names_filepaths, pokemon_data.JpToRomaji(replacement_filepath))
+    ambiguity_report.save_report(report, output_filepath)
+
+
+def ambiguity_report_filepath(pokeapi_filepaths: PokeapiFilepaths) -> Path:
+    return Path(pokeapi_filepaths.pokeapi_moves_filepath).with_name("ambiguity_report.json")
+
+
+def make_steps(input_filepaths: InputFilepaths) -> list[Step]:
+    pokeapi_filepaths = input_filepaths.pokeapi_filepaths
+    names_filepaths = input_filepaths.names_filepaths
+    dump_filepaths = [os.fspath(filepath) for filepath in vars(pokeapi_filepaths).values()]
+    replacement_filepath = os.fspath(input_filepaths.replacement_filepath)
+    metagame_filepath = os.fspath(input_filepaths.metagame_filepath)
+    metagame_database_filepath = metagame_db.database_filepath(metagame_filepath)
+
+    steps: list[Step] = []
+    for kind, endpoint, dump_filepath in [
+        ("pokemons", "pokemon-species", pokeapi_filepaths.pokeapi_pokemon_species_filepath),
+        ("moves", "move", pokeapi_filepaths.pokeapi_moves_filepath),
+        ("abilities", "ability", pokeapi_filepaths.pokeapi_abilities_filepath),
+        ("types", "type", pokeapi_filepaths.pokeapi_types_filepath),
+    ]:
+        names_filepath = os.fspath(getattr(names_filepaths, pokemon_data.NAMES_FILEPATH_NAMES[kind]))
+        steps.append(
+            Step(
+                f"{kind} names",
+                [os.fspath(dump_filepath)],
+                [names_filepath],
+                pokemon_data.update_initial_names_file,
+                (endpoint, dump_filepath, names_filepath),
+            )
+        )
+    for kind, names_filepath_name in pokemon_data.NAMES_FILEPATH_NAMES.items():
+        names_filepath = os.fspath(getattr(names_filepaths, names_filepath_name))
+        inputs = [names_filepath, replacement_filepath]
+        if kind in pokemon_data.POKEAPI_DATA_KINDS:
+            inputs += dump_filepaths
+        steps.append(
+            Step(
+                f"{kind} snapshot",
+                inputs,
+                [pokemon_data.snapshot_filepath(names_filepath)],
+                build_snapshot,
+                (kind, pokeapi_filepaths, names_filepaths, replacement_filepath),
+            )
+        )
+    if os.path.exists(metagame_filepath):
+        steps.append(
+            Step(
+                "metagame db", [metagame_filepath], [metagame_database_filepath], metagame_db.build, (metagame_filepath,)
+            )
+        )
+    names_filepaths_list = [os.fspath(filepath) for filepath in vars(names_filepaths).values()]
+    steps.append(
+        Step(
+            "validation",
+            [*names_filepaths_list, replacement_filepath, *dump_filepaths, metagame_database_filepath],
+            [os.fspath(report_filepath(pokeapi_filepaths))],
+            validate,
+            (
+                pokeapi_filepaths,
+                names_filepaths,
+                replacement_filepath,
+                metagame_filepath,
+                os.fspath(report_filepath(pokeapi_filepaths)),
+            ),
+        )
+    )
+    steps.append(
+        Step(
+            "ambiguity report",
+            [*names_filepaths_list, replacement_filepath],
+            [os.fspath(ambiguity_report_filepath(pokeapi_filepaths))],
+            report_ambiguity,
+            (names_filepaths, replacement_filepath, os.fspath(ambiguity_report_filepath(pokeapi_filepaths))),
+        )
+    )
+    return steps
+
+
+def make_levels(steps: list[Step]) -> list[list[Step]]:
+    """依存するステップより後の段に置く。同じ段のステップは互いに依存しない。"""
+    producers = {output: step for step in steps for output in step.outputs}
+    levels: dict[Step, int] = {}
+
+    def level(step: Step, visiting: frozenset[Step] = frozenset()) -> int:
+        if step in visiting:
+            raise ValueError(f"{step.name} depends on itself")
+        if step not in levels:
+            dependencies = [producers[input] for input in step.inputs if input in producers]
+            levels[step] = 1 + max((level(dependency, visiting | {step}) for dependency in dependencies), default=-1)
+        return levels[step]
+
+    result: list[list[Step]] = []
+    for step in steps:
+        while len(result) <= level(step):
+            result.append([])
+        result[levels[step]].append(step)
+    return result
+
+
+class BuildState:
+    def __init__(self, filepath: PathLike | str) -> None:
+        self.filepath = filepath
+        try:
+            with open(filepath, encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        # path -> [mtime_ns, size, sha256]
+        self.files: dict[str, list] = state.get("files", {})
+        # ステップの名前 -> {入力のpath: sha256}
+        self.steps: dict[str, dict[str, str]] = state.get("steps", {})
+
+    def file_hash(self, filepath: str) -> str | None:
+        """ファイルがないときNone。更新時刻とサイズが前回と同じなら、前回のハッシュを使う。"""
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        match self.files.get(filepath):
+            case [stat.st_mtime_ns, stat.st_size, str(sha256)]:
+                return sha256
+        with open(filepath, mode="rb") as f:
+            sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+        self.files[filepath] = [stat.st_mtime_ns, stat.st_size, sha256]
+        return sha256
+
+    def input_hashes(self, step: Step) -> dict[str, str | None]:
+        return {input: self.file_hash(input) for input in step.inputs}
+
+    def is_up_to_date(self, step: Step) -> bool:
+        return self.steps.get(step.name) == self.input_hashes(step) and all(map(os.path.exists, step.outputs))
+
+    def record(self, step: Step) -> None:
+        self.steps[step.name] = self.input_hashes(step)
+
+    def save(self) -> None:
+        temp_filepath = f"{os.fspath(self.filepath)}.tmp"
+        with open(temp_filepath, encoding="utf-8", mode="w") as f:
+            json.dump({"files": self.files, "steps": self.steps}, f, ensure_ascii=False, indent=4)
+        os.replace(temp_filepath, self.filepath)
+
+
+def _run(step: Step) -> float:
+    start = time.perf_counter()
+    step.action(*step.args)
+    return time.perf_counter() - start
+
+
+def build(steps: list[Step], state: BuildState, jobs: int | None = None, dry_run: bool = False) -> list[Step]:
+    """実行した（dry_runのときは実行する）ステップを返す。失敗したステップがあれば、その段を終えてから例外を送出する。"""
+    executed: list[Step] = []
+    with ProcessPoolExecutor(jobs) as executor:
+        for level in make_levels(steps):
+            futures: dict[Step, Future[float]] = {}
+            for step in level:
+                if dry_run:
+                    # 実行する前のステップの出力は、実行すると変わるかもしれない
+                    changed_outputs = {output for executed_step in executed for output in executed_step.outputs}
+                    if state.is_up_to_date(step) and changed_outputs.isdisjoint(step.inputs):
+                        print(f"{step.name}: up to date", flush=True)
+                    else:
+                        print(f"{step.name}: would be built", flush=True)
+                        executed.append(step)
+                elif state.is_up_to_date(step):
+                    print(f"{step.name}: up to date", flush=True)
+                else:
+                    futures[step] = executor.submit(_run, step)
+            errors: list[BaseException] = []
+            for step, future in futures.items():
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    print(f"{step.name}: failed: {e!r}", flush=True)
+                    errors.append(e)
+                    continue
+                print(f"{step.name}: built in {elapsed:.2f}s", flush=True)
+                state.record(step)
+                executed.append(step)
+            state.save()
+            if len(errors) > 0:
+                raise errors[0]
+    return executed
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="並行して実行するステップの数。省略したときはCPUの数")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="実行するステップを表示するだけ")
+    args = parser.parse_args()
+    state = BuildState(state_filepath(input_filepaths.pokeapi_filepaths))
+    build(make_steps(input_filepaths), state, args.jobs, args.dry_run)
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
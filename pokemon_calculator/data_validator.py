@@ -0,0 +1,167 @@
+"""AllDataと*_names.jsonの検査。
+
+    python data_validator.py
+
+validate()はAllDataを1回ずつ走査し、nameとdisplay_nameの辞書、retrieval_namesのソート済みリスト（pokemon_data.PrefixIndex）を索引にして、次のものを見つける。
+- display_nameの重複
+- 存在しない特性・技・タイプへの参照（metagame.jsonからの参照を含む）
+- どう入力しても候補の選択を求められるもの（retrieval_namesがどれも他のデータのretrieval_nameの接頭辞）
+validate_names_files()は*_names.jsonを直接読み、データにないnameと、ローマ字に変換できないretrieval_namesを見つける。
+これらがあるとAllDataを作るときに例外になる。
+
+検査はdata_build.pyのビルドのステップとして行い、対話モードなどで使うpokemon_data.load_all_data()では行わない。
+data_build.pyでスナップショットを作るステップが例外になっても原因がわかるように、validate_all()はスナップショットを使わない。
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable
+from dataclasses import dataclass
+from os import PathLike
+from typing import Literal
+import os
+
+import jsonc
+
+import pokemon_data
+from input_filepaths import default_input_filepaths, InputFilepaths, NamesFilepaths, PokeapiFilepaths
+
+type Check = Literal[
+    "duplicate_display_name", "dangling_reference", "prefix_collision", "unknown_name", "conversion_failure"
+]
+
+
+@dataclass(eq=False)
+class Problem:
+    check: Check
+    kind: str
+    """ AllDataのメンバ名 """
+    name: str
+    detail: str
+
+    def __str__(self) -> str:
+        return f"{self.check}: {self.kind} {self.name}: {self.detail}"
+
+
+def _check_duplicate_display_names(kind: str, data_dict: dict[str, pokemon_data.NameExtended]) -> list[Problem]:
+    problems: list[Problem] = []
+    display_name_to_name: dict[str, str] = {}
+    for name, data in data_dict.items():
+        if (other_name := display_name_to_name.setdefault(data.display_name, name)) != name:
+            problems.append(Problem("duplicate_display_name", kind, name, f"{data.display_name} is also {other_name}"))
+    return problems
+
+
+def _check_references(
+    kind: str, name: str, reference_kind: str, reference_names: Iterable[str], all_data: pokemon_data.AllData
+) -> list[Problem]:
+    references = getattr(all_data, reference_kind)
+    return [
+        Problem("dangling_reference", kind, name, f"{reference_kind} {reference_name} does not exist")
+        for reference_name in reference_names
+        if reference_name not in references
+    ]
+
+
+def _check_prefix_collisions(kind: str, data_dict: dict[str, pokemon_data.NameExtended]) -> list[Problem]:
+    """retrieval_namesのどれを最後まで入力しても、他のデータも前方一致するもの。"""
+    index = pokemon_data.PrefixIndex(data_dict)
+    problems: list[Problem] = []
+    for i, shortest in enumerate(index.shortest_unique_prefixes()):
+        data = index.data[i]
+        if shortest is not None or len(data.retrieval_names) == 0:
+            continue
+        colliding_names = {
+            index.names[j]
+            for retrieval_name in data.retrieval_names
+            for j in index.candidates(retrieval_name)
+            if j != i
+        }
+        detail = f"every retrieval name also matches {', '.join(sorted(colliding_names))}"
+        problems.append(Problem("prefix_collision", kind, index.names[i], detail))
+    return problems
+
+
+def _check_metagame_references(all_data: pokemon_data.AllData) -> list[Problem]:
+    assert all_data.metagame is not None
+    return [
+        Problem("dangling_reference", "metagame", pokemon, f"{reference_kind} {reference_name} does not exist")
+        for pokemon, reference_kind, reference_name in all_data.metagame.references()
+        if reference_name not in getattr(all_data, reference_kind)
+    ]
+
+
+def validate(all_data: pokemon_data.AllData) -> list[Problem]:
+    problems: list[Problem] = []
+    for kind in pokemon_data.NAMES_FILEPATH_NAMES:
+        data_dict = getattr(all_data, kind)
+        problems += _check_duplicate_display_names(kind, data_dict)
+        problems += _check_prefix_collisions(kind, data_dict)
+    for name, pokemon in all_data.pokemons.items():
+        problems += _check_references("pokemons", name, "types", pokemon.data.type_names, all_data)
+        problems += _check_references("pokemons", name, "abilities", pokemon.data.ability_names, all_data)
+        problems += _check_references("pokemons", name, "moves", pokemon.data.move_names, all_data)
+    for name, move in all_data.moves.items():
+        problems += _check_references("moves", name, "types", [move.data.type_name], all_data)
+    for name, type_ in all_data.types.items():
+        relations = [*type_.data.no_damage_to, *type_.data.half_damage_to, *type_.data.double_damage_to]
+        problems += _check_references("types", name, "types", relations, all_data)
+    if all_data.metagame is not None:
+        problems += _check_metagame_references(all_data)
+    return problems
+
+
+def validate_names_files(
+    pokeapi_filepaths: PokeapiFilepaths, names_filepaths: NamesFilepaths, converter: pokemon_data.Converter
+) -> list[Problem]:
+    pokeapi_data = pokemon_data.load_pokeapi_data(pokeapi_filepaths)
+    problems: list[Problem] = []
+    for kind, names_filepath_name in pokemon_data.NAMES_FILEPATH_NAMES.items():
+        with open(getattr(names_filepaths, names_filepath_name), encoding="utf-8") as f:
+            names_json: dict = jsonc.load(f)
+        data_dict = None
+        if kind in pokemon_data.POKEAPI_DATA_KINDS:
+            data_dict = pokeapi_data[pokemon_data.POKEAPI_DATA_KINDS.index(kind)]
+        for name, names in names_json.items():
+            if data_dict is not None and name not in data_dict:
+                problems.append(Problem("unknown_name", kind, name, "not in the PokeAPI data"))
+            for retrieval_name in names["retrieval_names"]:
+                try:
+                    converter.convert(retrieval_name)
+                except Exception as e:
+                    problems.append(Problem("conversion_failure", kind, name, f"{retrieval_name}: {e}"))
+    return problems
+
+
+def validate_all(
+    pokeapi_filepaths: PokeapiFilepaths,
+    names_filepaths: NamesFilepaths,
+    converter: pokemon_data.Converter,
+    metagame_filepath: PathLike | str | None = default_input_filepaths.metagame_filepath,
+) -> list[Problem]:
+    problems = validate_names_files(pokeapi_filepaths, names_filepaths, converter)
+    # validate_names_files()で見つかるものがあると、build_all_data()は例外になる
+    if len(problems) == 0:
+        all_data = pokemon_data.build_all_data(pokeapi_filepaths, names_filepaths, converter, metagame_filepath)
+        problems = validate(all_data)
+    return problems
+
+
+def save_report(problems: list[Problem], output_filepath: PathLike | str) -> None:
+    temp_filepath = f"{os.fspath(output_filepath)}.tmp"
+    with open(temp_filepath, encoding="utf-8", mode="w") as f:
+        f.writelines(f"{problem}\n" for problem in problems)
+    os.replace(temp_filepath, output_filepath)
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    converter = pokemon_data.JpToRomaji(input_filepaths.replacement_filepath)
+    problems = validate_all(
+        input_filepaths.pokeapi_filepaths, input_filepaths.names_filepaths, converter, input_filepaths.metagame_filepath
+    )
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems")
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
@@ -0,0 +1,126 @@
+"""ダブルバトルで全体技を使ったときの、相手2体（と、"all-other-pokemon"の技では味方）へのダメージと、同時にひんしになる確率を計算する。
+
+    python doubles_calc.py "gabu d 252 s a" zisin "kai h 252 d 4" "doraparu h 0 d 0" --ally "kinoga h 252 d 0"
+attackerと技に続けて、相手のポケモンを対話モードと同じ書式（ポケモンとそのオプション）で書く。"ダブルバトル"の状態は自動で加える。
+-jの状態はすべてのtargetに、targetのオプションに書いた状態（"j anawohoru"など）はそのtargetにだけかかる。
+努力値は1つのInputになるように入力する。
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+import argparse
+import itertools
+
+import input_processor
+from pokemon_data import AllData
+from pokemon_calc import Input, InputArgs, Output, OutputTable, calc_damages
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import InvalidInput
+
+SPREAD_MOVE_TARGETS = ["all-other-pokemon", "all-opponents"]
+# 味方には相手の場の状態がかからない。state_names.jsonの状態のうち、場の片側だけにかかるものは壁だけである。
+# 天気とフィールドは両方の場に、てだすけなどattackerの状態は全員に、あなをほるなどtarget自身の状態はそのtargetにだけかかる
+OPPONENTS_FIELD_STATE_NAMES = ["壁"]
+
+
+@dataclass(eq=False)
+class Target:
+    output: Output
+    is_ally: bool
+
+
+def make_spread_inputs(
+    input_args_list: list[InputArgs], ally_input_args: InputArgs | None, all_data: AllData
+) -> list[Input]:
+    """各targetへのInputを作る。attackerと技は最初のinput_argsのものを全員で共有し、状態はtargetごとのinput_argsのものを使う。"""
+    first = input_args_list[0]
+    if first.move is None:
+        raise InvalidInput("no move")
+    if first.move.data.target not in SPREAD_MOVE_TARGETS:
+        raise InvalidInput(f"{first.move.display_name} is not a spread move")
+    if ally_input_args is not None and first.move.data.target != "all-other-pokemon":
+        raise InvalidInput(f"{first.move.display_name} does not hit the ally")
+    input_args_list = [*input_args_list, *([ally_input_args] if ally_input_args is not None else [])]
+    for input_args in input_args_list:
+        input_processor.complete_input_args(input_args, all_data)
+        input_args.attacker = first.attacker
+        input_args.move = first.move
+        input_processor.check_args_set(input_args)
+    attacker = first.attacker.make_battle_pokemon()
+    inputs: list[Input] = []
+    for i, input_args in enumerate(input_args_list):
+        assert input_args.hp_doryokuchi is not None
+        is_ally = ally_input_args is not None and i == len(input_args_list) - 1
+        # input_args.statesは書き換えない
+        states = [
+            state
+            for state in input_args.states
+            if not (is_ally and state.data.name in OPPONENTS_FIELD_STATE_NAMES)
+        ]
+        if all(state.data.name != "ダブルバトル" for state in states):
+            states.append(all_data.states["ダブルバトル"])
+        inputs.append(
+            Input(
+                attacker,
+                input_args.defender.make_battle_pokemon(),
+                first.move,
+                states,
+                input_args.hp_doryokuchi,
+                input_args.hp_kotaichi,
+            )
+        )
+    return inputs
+
+
+def joint_ko_table(targets: list[Target]) -> list[tuple[tuple[bool, ...], float]]:
+    """各targetがひんしになるかどうかの組と、その確率。乱数はtargetごとに独立に決まる。"""
+    ko_probabilities = [target.output.ko_probability for target in targets]
+    table: list[tuple[tuple[bool, ...], float]] = []
+    for kos in itertools.product([True, False], repeat=len(targets)):
+        probability = 1.0
+        for ko, ko_probability in zip(kos, ko_probabilities):
+            probability *= ko_probability if ko else 1 - ko_probability
+        table.append((kos, probability))
+    return table
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("attacker", help="attackerのポケモンとオプション")
+    parser.add_argument("move")
+    parser.add_argument("opponents", nargs="+", help="相手のポケモンとオプション。1体または2体")
+    parser.add_argument("--ally", default=None, help="味方のポケモンとオプション。技が味方にも当たるときだけ")
+    parser.add_argument("-j", "--states", nargs="+", default=[], help="状態。すべてのtargetに共通（味方には壁はかからない）")
+    args = parser.parse_args()
+
+    context = input_processor.load_query_context(input_filepaths)
+    all_data, preset_store, compiled_presets = context.all_data, context.preset_store, context.compiled_presets
+
+    def make_input_args(target: str) -> InputArgs:
+        query = f"{args.attacker} {target} w {args.move}" + (f" j {' '.join(args.states)}" if args.states else "")
+        return input_processor.make_input_args_from_str(query, all_data, preset_store, compiled_presets)
+
+    try:
+        if len(args.opponents) > 2:
+            raise InvalidInput("at most 2 opponents")
+        inputs = make_spread_inputs(
+            [make_input_args(opponent) for opponent in args.opponents],
+            make_input_args(args.ally) if args.ally is not None else None,
+            all_data,
+        )
+    except (InvalidInput, IndexError, ValueError) as e:
+        print(e)
+        return
+    outputs = calc_damages(inputs, all_data)
+    targets = [Target(output, args.ally is not None and i == len(outputs) - 1) for i, output in enumerate(outputs)]
+    print(outputs[0].header_str())
+    print(OutputTable(outputs).render())
+    names = [
+        f"{target.output.input.defender.pokemon.display_name}{'(味方)' if target.is_ally else ''}" for target in targets
+    ]
+    for kos, probability in joint_ko_table(targets):
+        print(" ".join(f"{name}{'○' if ko else '×'}" for name, ko in zip(names, kos)), f"{probability * 100:6.2f}%")
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
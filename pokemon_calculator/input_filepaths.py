@@ -27,6 +27,8 @@ class InputFilepaths:
     names_filepaths: NamesFilepaths
     replacement_filepath: PathLike | str
     preset_filepath: PathLike | str
+    spread_profile_filepath: PathLike | str
+    metagame_filepath: PathLike | str
 
 
 parent_dir_path = Path(__file__).resolve().parent
@@ -47,5 +49,7 @@ default_input_filepaths = InputFilepaths(
     ),
     parent_dir_path / "jp_replacement.json",
     parent_dir_path / "preset.json",
+    parent_dir_path / "spread_profile.json",
+    parent_dir_path / "metagame.json",
 )
 del parent_dir_path
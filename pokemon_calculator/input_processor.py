@@ -1,17 +1,29 @@
-from typing import Iterable
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, Literal
 import sys
+import os
+import json
+import functools
+import dataclasses
 from os import PathLike
 import jsonc
 
 import pokemon_data
-from pokemon_data import NameExtended, AllData, Stats
-from pokemon_calc import InputArgs, Input
+import profiler
+from pokemon_data import NameExtended, NGramIndex, AllData, Stats
+from input_filepaths import InputFilepaths
+from pokemon_calc import InputArgs, Input, BattlePokemon, BattlePokemonArgs, PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES
+from preset_store import PresetStore
+from query_history import QueryHistory, UsageTable
 
 
 class InvalidInput(Exception):
     pass
 
 
+type AmbiguityPolicy = Literal["prompt", "first", "error"]
+
+
 def get_input(prompt_str: str = ">>>") -> str:
     input_str = input(prompt_str)
     if input_str == "e":
@@ -20,35 +32,70 @@ def get_input(prompt_str: str = ">>>") -> str:
 
 
 def retrieve_one_data[T](
-    data_dict: dict[str, NameExtended[T]], query: str, restriction: Iterable[str] | None = None
+    data_dict: dict[str, NameExtended[T]],
+    query: str,
+    restriction: Iterable[str] | None = None,
+    ngram_index: NGramIndex[T] | None = None,
+    ambiguity_policy: AmbiguityPolicy = "prompt",
+    history: UsageTable | None = None,
 ) -> NameExtended[T]:
+    """前方一致で一つも見つからないとき、ngram_indexが指定されていれば、queryに近い候補から選ばせる。
+    候補が複数あるときの扱いはambiguity_policyで決まる。"prompt"は入力で選ばせ、"first"はselect_first_data()で選び、"error"はInvalidInputを出す。
+    historyが指定されていれば選んだものを記録する。"prompt"のときは、記録の中で一つが十分多く選ばれていればそれを選び、そうでなければ記録のスコアの順に並べて選ばせる。"""
     if restriction is not None:
         data_dict_to_retrieve = {name: data_dict[name] for name in restriction if name in data_dict}
     else:
         data_dict_to_retrieve = data_dict
-    result = pokemon_data.retrieve_data(data_dict_to_retrieve, query)
-    length = len(result)
-    if length == 0:
+    with profiler.timer("retrieve.prefix"):
+        result = pokemon_data.retrieve_data(data_dict_to_retrieve, query)
+    if len(result) == 0 and ngram_index is not None:
+        with profiler.timer("retrieve.ngram"):
+            result = ngram_index.search(query, restriction=restriction)
+        # "prompt"以外では、batch_calc.pyなどの出力に混ざらないように表示しない
+        if len(result) == 1 and ambiguity_policy == "prompt":
+            print(f"{query} -> {result[0].display_name}")
+    if len(result) == 0:
         raise InvalidInput(f"Invalid input: {query}")
+    if len(result) == 1:
+        selected = result[0]
+    else:
+        profiler.count("retrieve.ambiguous")
+        if ambiguity_policy == "first":
+            selected = select_first_data(result, query)
+        elif ambiguity_policy == "error":
+            raise InvalidInput(f"Ambiguous input: {query} ({', '.join(data.display_name for data in result)})")
+        elif history is not None and (dominant := history.dominant(result)) is not None:
+            print(f"{query} -> {dominant.display_name}")
+            selected = dominant
+        else:
+            selected = _select_one_data(history.rank(result) if history is not None else result)
+    if history is not None:
+        history.record(selected.data.name)
+    return selected
+
+
+def select_first_data[T](result: list[NameExtended[T]], query: str) -> NameExtended[T]:
+    """入力を求めずに候補を一つに決める。queryと完全に一致するretrieval_nameを持つもの、より短いretrieval_nameで一致するもの、元の順で前にあるものを優先する。"""
+
+    def matched_length(data: NameExtended[T]) -> int:
+        return min((len(name) for name in data.retrieval_names if name.startswith(query)), default=sys.maxsize)
+
+    return min(result, key=matched_length)
+
+
+# 候補を選ぶキー。候補の数によらず、先頭の候補から順に割り当てる
+SELECTION_KEYS = ("f", "j", "d", "k", "s", "l", "a", ";")
+
+
+def _select_one_data[T](result: list[NameExtended[T]]) -> NameExtended[T]:
+    length = len(result)
     if length == 1:
         return result[0]
 
-    if length == 2:
-        keys = ("f", "j")
-    elif length == 3:
-        keys = ("d", "f", "j")
-    elif length == 4:
-        keys = ("d", "f", "j", "k")
-    elif length == 5:
-        keys = ("j", "d", "f", "j", "k")
-    elif length == 6:
-        keys = ("j", "d", "f", "j", "k", "l")
-    elif length == 7:
-        keys = ("a", "j", "d", "f", "j", "k", "l")
-    elif length == 8:
-        keys = ("a", "j", "d", "f", "j", "k", "l", ";")
-    elif length > 8:
-        keys = list(map(str, range(1, length + 1)))
+    if length <= len(SELECTION_KEYS):
+        keys = SELECTION_KEYS[:length]
+    else:
+        keys = tuple(map(str, range(1, length + 1)))
 
     candidate_dict = {key: data for key, data in zip(keys, result, strict=True)}
     print(*(f"{key}: {data.display_name}" for key, data in candidate_dict.items()))
@@ -57,48 +104,79 @@ def retrieve_one_data[T](
     return candidate_dict[s]
 
 
-def _parse_input_str(input_str: str, preset_filepath: PathLike | str) -> dict:
+ONE_WORD_OPTIONS = ["to", "tox", "d", "k", "s", "m", "r", "t", "l", "w", "wx", "h", "hk", "d6", "k6", "seikaku"]
+NO_WORD_OPTIONS = [
+    "akyoku",
+    "ckyoku",
+    "atokka",
+    "ctokka",
+    "bkyoku",
+    "dkyoku",
+    "btokka",
+    "dtokka",
+    "hb",
+    "hd",
+    "hkyoku",
+    "amuburi",
+    "cmuburi",
+    "bmuburi",
+    "dmuburi",
+]
+STATE_OPTIONS = ["a", "b", "j", "save", "del"]
+SPECIAL_OPTIONS = ["p"]
+ALL_OPTIONS = ONE_WORD_OPTIONS + NO_WORD_OPTIONS + STATE_OPTIONS + SPECIAL_OPTIONS
+# ONE_WORD_OPTIONSのうち、その状態（"a"または"b"）のポケモンだけに作用するもの
+BATTLE_POKEMON_OPTIONS = ["to", "tox", "d", "k", "s", "m", "r", "t", "l", "d6", "k6", "seikaku"]
+
+
+def _parse_input_str(
+    input_str: str, preset_store: PresetStore, compiled_presets: CompiledPresets | None = None
+) -> dict:
+    """compiled_presetsが指定されたとき、ポケモンを指定するpresetは展開せずに、コンパイル済みのBattlePokemonArgsを "a_pokemon" または "b_pokemon" にする。"""
     input_words = input_str.split()
     output_dict = {"a_pokemon": None, "b_pokemon": None, "a": {}, "b": {}, "j": [], "save": None, "del": None}
     # state "a" 中に入力されたone_word_optionは output_dict["a"][option_str] = value になる。no_word_optionは output_dict["a"][option_str] = True になる。state "b" も同様。state "j"で入力されたものは output_dict["j"] にappendされる。
-    one_word_options = ["to", "tox", "d", "k", "s", "m", "r", "t", "l", "w", "wx", "h", "hk", "d6", "k6", "seikaku"]
-    no_word_options = [
-        "akyoku",
-        "ckyoku",
-        "atokka",
-        "ctokka",
-        "bkyoku",
-        "dkyoku",
-        "btokka",
-        "dtokka",
-        "hb",
-        "hd",
-        "hkyoku",
-        "amuburi",
-        "cmuburi",
-        "bmuburi",
-        "dmuburi",
-    ]
-    state_options = ["a", "b", "j", "save", "del"]
-    special_option = ["p"]
-    all_options = one_word_options + no_word_options + state_options + special_option
     i = 0
     current_state = "a"
     previous_state = "a"  # "j"から戻るときに使う
     while i < len(input_words):
-        if input_words[i] == "p":
+        if (
+            i + 1 == len(input_words)
+            and current_state not in ["save", "del"]
+            and (input_words[i] == "p" or input_words[i] in ONE_WORD_OPTIONS)
+        ):
+            # 値のないオプションで終わっている
+            raise InvalidInput(f"{input_words[i]} requires a {'preset name' if input_words[i] == 'p' else 'value'}")
+        if (
+            input_words[i] == "p"
+            and compiled_presets is not None
+            and current_state in ["a", "b"]
+            and (template := compiled_presets.get(get_preset(input_words[i + 1], preset_store))) is not None
+        ):
+            if current_state == "a" and output_dict["a_pokemon"] is None:
+                output_dict["a_pokemon"] = template
+            elif current_state == "b" and output_dict["b_pokemon"] is None:
+                output_dict["b_pokemon"] = template
+            elif current_state == "a":
+                output_dict["b_pokemon"] = template
+                previous_state = current_state
+                current_state = "b"
+            else:
+                raise InvalidInput(f"Invalid input: p {input_words[i + 1]}")
+            i += 1
+        elif input_words[i] == "p":
             input_words = (
-                input_words[:i] + get_preset(input_words[i + 1], preset_filepath).split() + input_words[i + 2 :]
+                input_words[:i] + get_preset(input_words[i + 1], preset_store).split() + input_words[i + 2 :]
             )
             i -= 1  # "p"があった場所をもう一度見る
-        elif input_words[i] in state_options:
+        elif input_words[i] in STATE_OPTIONS:
             previous_state = current_state
             current_state = input_words[i]
         elif current_state == "a" and output_dict["a_pokemon"] is None:
             output_dict["a_pokemon"] = input_words[i]
         elif current_state == "b" and output_dict["b_pokemon"] is None:
             output_dict["b_pokemon"] = input_words[i]
-        elif current_state == "a" and input_words[i] not in all_options:
+        elif current_state == "a" and input_words[i] not in ALL_OPTIONS:
             output_dict["b_pokemon"] = input_words[i]
             previous_state = current_state
             current_state = "b"
@@ -108,16 +186,16 @@ def _parse_input_str(input_str: str, preset_filepath: PathLike | str) -> dict:
         elif current_state == "del":
             output_dict["del"] = input_words[i]
             return output_dict
-        elif input_words[i] in one_word_options:
+        elif input_words[i] in ONE_WORD_OPTIONS:
             if current_state == "j":
                 current_state = previous_state
             output_dict[current_state][input_words[i]] = input_words[i + 1]
             i += 1
-        elif input_words[i] in no_word_options:
+        elif input_words[i] in NO_WORD_OPTIONS:
             if current_state == "j":
                 current_state = previous_state
             output_dict[current_state][input_words[i]] = True
-        elif current_state == "j" and input_words[i] not in all_options:
+        elif current_state == "j" and input_words[i] not in ALL_OPTIONS:
             output_dict["j"].append(input_words[i])
         else:
             raise InvalidInput(f"Invalid input: {input_words[i]}")
@@ -127,54 +205,69 @@ def _parse_input_str(input_str: str, preset_filepath: PathLike | str) -> dict:
     return output_dict
 
 
-def _make_input_args_from_str(input_str: str, all_data: AllData, preset_filepath: PathLike | str) -> InputArgs | None:
+def _make_input_args_from_str(
+    input_str: str,
+    all_data: AllData,
+    preset_store: PresetStore,
+    compiled_presets: CompiledPresets | None = None,
+    ambiguity_policy: AmbiguityPolicy = "prompt",
+    allow_preset_commands: bool = True,
+    history: QueryHistory | None = None,
+) -> InputArgs | None:
+    retrieve = functools.partial(retrieve_one_data, ambiguity_policy=ambiguity_policy)
     input_args = InputArgs()
-    options_dict = _parse_input_str(input_str, preset_filepath)
+    options_dict = _parse_input_str(input_str, preset_store, compiled_presets)
+    if not allow_preset_commands and (options_dict["save"] is not None or options_dict["del"] is not None):
+        raise InvalidInput("Invalid input: save and del are not allowed")
     if options_dict["save"] is not None:
-        add_preset(options_dict["save"][0], options_dict["save"][1], preset_filepath)
+        add_preset(options_dict["save"][0], options_dict["save"][1], preset_store)
+        if compiled_presets is not None:
+            compiled_presets.get(options_dict["save"][1])
         return None
     if options_dict["del"] is not None:
-        delete_preset(options_dict["del"], preset_filepath)
+        delete_preset(options_dict["del"], preset_store)
         return None
-    input_args.attacker.pokemon = retrieve_one_data(all_data.pokemons, options_dict["a_pokemon"])
-    input_args.defender.pokemon = retrieve_one_data(all_data.pokemons, options_dict["b_pokemon"])
+    for key in ["a", "b"]:
+        pokemon = options_dict[f"{key}_pokemon"]
+        if isinstance(pokemon, BattlePokemonArgs):
+            battle_pokemon = pokemon
+            if key == "b" and battle_pokemon.all_doryokuchi is not None:
+                input_args.hp_doryokuchi = 0  # presetの"d6"に対応する
+        else:
+            battle_pokemon = BattlePokemonArgs(
+                retrieve(
+                    all_data.pokemons,
+                    pokemon,
+                    ngram_index=all_data.ngram_indexes["pokemons"],
+                    history=_usage_table(history, "pokemons"),
+                )
+            )
+        if key == "a":
+            input_args.attacker = battle_pokemon
+        else:
+            input_args.defender = battle_pokemon
     for key, battle_pokemon in zip(["a", "b"], [input_args.attacker, input_args.defender]):
         assert battle_pokemon.pokemon is not None
         for option, value in options_dict[key].items():
-            if option == "to":
-                battle_pokemon.ability = retrieve_one_data(
-                    all_data.abilities, value, battle_pokemon.pokemon.data.ability_names
-                )
-            elif option == "tox":
-                battle_pokemon.ability = retrieve_one_data(all_data.abilities, value)
-            elif option == "d":
-                if value == "m":
-                    battle_pokemon.doryokuchi = 252
-                else:
-                    battle_pokemon.doryokuchi = int(value)
-            elif option == "k":
-                battle_pokemon.kotaichi = int(value)
-            elif option == "s":
-                if value == "a":
-                    battle_pokemon.seikaku_hosei = 1.1
-                elif value == "n":
-                    battle_pokemon.seikaku_hosei = 1
-                elif value == "k":
-                    battle_pokemon.seikaku_hosei = 0.9
-                else:
-                    raise InvalidInput(f"Invalid input: {value}")
-            elif option == "m":
-                battle_pokemon.item = retrieve_one_data(all_data.items, value)
-            elif option == "r":
-                battle_pokemon.rank = int(value)
-            elif option == "t":
-                battle_pokemon.terasu_type = retrieve_one_data(all_data.types, value)
-            elif option == "l":
-                battle_pokemon.level = int(value)
+            if option in BATTLE_POKEMON_OPTIONS:
+                _apply_battle_pokemon_option(battle_pokemon, option, value, all_data, ambiguity_policy, history)
+                if option == "d6" and key == "b":
+                    input_args.hp_doryokuchi = 0
             elif option == "w":
-                input_args.move = retrieve_one_data(all_data.moves, value, input_args.attacker.pokemon.data.move_names)
+                input_args.move = retrieve(
+                    all_data.moves,
+                    value,
+                    input_args.attacker.pokemon.data.move_names,
+                    all_data.ngram_indexes["moves"],
+                    history=_usage_table(history, "moves"),
+                )
             elif option == "wx":
-                input_args.move = retrieve_one_data(all_data.moves, value)
+                input_args.move = retrieve(
+                    all_data.moves,
+                    value,
+                    ngram_index=all_data.ngram_indexes["moves"],
+                    history=_usage_table(history, "moves"),
+                )
             elif option == "h":
                 input_args.hp_doryokuchi = int(value)
             elif option == "hk":
@@ -208,81 +301,262 @@ def _make_input_args_from_str(input_str: str, all_data: AllData, preset_filepath
                 input_args.defender.doryokuchi = 0
                 input_args.defender.seikaku_hosei = 1
                 input_args.hp_doryokuchi = 0
-            elif option == "d6":
-                if len(temp := value.split("-")) != 6:
-                    raise InvalidInput("Invalid input: {value}")
-                battle_pokemon.all_doryokuchi = Stats(*map(int, temp))
-                battle_pokemon.doryokuchi = 0  # あとの処理で無入力とされないように0にしておく
-                if key == "b":
-                    input_args.hp_doryokuchi = 0
-            elif option == "k6":
-                if len(temp := value.split("-")) != 6:
-                    raise InvalidInput("Invalid input: {value}")
-                battle_pokemon.all_kotaichi = Stats(*map(int, temp))
-            elif option == "seikaku":
-                if len(temp := value.split("-")) != 2:
-                    raise InvalidInput("Invalid input: {value}")
-                battle_pokemon.seikaku_hosei_up_down = tuple(temp)
 
     for value in options_dict["j"]:
-        input_args.states.append(retrieve_one_data(all_data.states, value))
+        input_args.states.append(
+            retrieve(
+                all_data.states,
+                value,
+                ngram_index=all_data.ngram_indexes["states"],
+                history=_usage_table(history, "states"),
+            )
+        )
 
     return input_args
 
 
-def add_preset(preset_key: str, preset_value: str, preset_filepath: PathLike | str) -> None:
-    preset = load_preset(preset_filepath)
-    preset[preset_key] = preset_value
-    with open(preset_filepath, encoding="utf-8", mode="w") as f:
-        jsonc.dump(preset, f, ensure_ascii=False, indent=4)
+def _usage_table(history: QueryHistory | None, kind: str) -> UsageTable | None:
+    return history.table(kind) if history is not None else None
+
+
+def _apply_battle_pokemon_option(
+    battle_pokemon: BattlePokemonArgs,
+    option: str,
+    value: str,
+    all_data: AllData,
+    ambiguity_policy: AmbiguityPolicy = "prompt",
+    history: QueryHistory | None = None,
+    fuzzy: bool = True,
+) -> None:
+    """BATTLE_POKEMON_OPTIONSのoptionを適用する。ambiguity_policyとhistoryはretrieve_one_data()に渡す。
+    fuzzyがFalseのときは、前方一致で見つからない名前にn-gramの索引を使わない。"""
+    assert battle_pokemon.pokemon is not None
+    retrieve = functools.partial(retrieve_one_data, ambiguity_policy=ambiguity_policy)
+    ngram_indexes = all_data.ngram_indexes if fuzzy else {}
+    if option == "to":
+        battle_pokemon.ability = retrieve(
+            all_data.abilities,
+            value,
+            battle_pokemon.pokemon.data.ability_names,
+            ngram_indexes.get("abilities"),
+            history=_usage_table(history, "abilities"),
+        )
+    elif option == "tox":
+        battle_pokemon.ability = retrieve(
+            all_data.abilities,
+            value,
+            ngram_index=ngram_indexes.get("abilities"),
+            history=_usage_table(history, "abilities"),
+        )
+    elif option == "d":
+        if value == "m":
+            battle_pokemon.doryokuchi = 252
+        else:
+            battle_pokemon.doryokuchi = int(value)
+    elif option == "k":
+        battle_pokemon.kotaichi = int(value)
+    elif option == "s":
+        if value == "a":
+            battle_pokemon.seikaku_hosei = 1.1
+        elif value == "n":
+            battle_pokemon.seikaku_hosei = 1
+        elif value == "k":
+            battle_pokemon.seikaku_hosei = 0.9
+        else:
+            raise InvalidInput(f"Invalid input: {value}")
+    elif option == "m":
+        battle_pokemon.item = retrieve(
+            all_data.items, value, ngram_index=ngram_indexes.get("items"), history=_usage_table(history, "items")
+        )
+    elif option == "r":
+        battle_pokemon.rank = int(value)
+    elif option == "t":
+        battle_pokemon.terasu_type = retrieve(
+            all_data.types, value, ngram_index=ngram_indexes.get("types"), history=_usage_table(history, "types")
+        )
+    elif option == "l":
+        battle_pokemon.level = int(value)
+    elif option == "d6":
+        if len(temp := value.split("-")) != 6:
+            raise InvalidInput("Invalid input: {value}")
+        battle_pokemon.all_doryokuchi = Stats(*map(int, temp))
+        battle_pokemon.doryokuchi = 0  # あとの処理で無入力とされないように0にしておく
+    elif option == "k6":
+        if len(temp := value.split("-")) != 6:
+            raise InvalidInput("Invalid input: {value}")
+        battle_pokemon.all_kotaichi = Stats(*map(int, temp))
+    elif option == "seikaku":
+        if len(temp := value.split("-")) != 2:
+            raise InvalidInput("Invalid input: {value}")
+        battle_pokemon.seikaku_hosei_up_down = tuple(temp)
+
+
+def add_preset(preset_key: str, preset_value: str, preset_store: PresetStore) -> None:
+    preset_store.set(preset_key, preset_value)
     print(f"save preset: {preset_key}: {preset_value}")
 
 
-def delete_preset(input_word: str, preset_filepath: PathLike | str) -> None:
-    preset = load_preset(preset_filepath)
-    if len(key := retrieve_preset(preset, input_word)) != 1:
-        raise InvalidInput(f"Invalid input: {preset}")
-    print(f"delete preset: {key[0]}: {preset[key[0]]}")
-    del preset[key[0]]
-
-
-def retrieve_one_preset(preset: dict[str, str], input_word: str) -> str:
-    if len(keys := retrieve_preset(preset, input_word)) != 1:
-        raise InvalidInput(f"Invalid input: {preset}")
-    return preset[keys[0]]
-
-
-def retrieve_preset(preset: dict[str, str], input_str: str) -> list[str]:
-    return [key for key in preset if key.startswith(input_str)]
-
-
-def load_preset(preset_filepath: PathLike | str) -> dict[str, str]:
-    with open(preset_filepath, encoding="utf-8") as f:
-        return jsonc.load(f)
-
-
-def get_preset(input_word: str, preset_filepath: PathLike | str) -> str:
-    preset = load_preset(preset_filepath)
-    return retrieve_one_preset(preset, input_word)
+def delete_preset(input_word: str, preset_store: PresetStore) -> None:
+    key = retrieve_one_preset(preset_store, input_word)
+    print(f"delete preset: {key}: {preset_store.get(key)}")
+    preset_store.delete(key)
+
+
+def retrieve_one_preset(preset_store: PresetStore, input_word: str) -> str:
+    """input_wordで始まるpresetのkeyが一つに定まるとき、そのkeyを返す。"""
+    if len(keys := preset_store.retrieve(input_word)) != 1:
+        raise InvalidInput(f"Invalid input: {input_word} ({', '.join(keys)})")
+    return keys[0]
+
+
+def get_preset(input_word: str, preset_store: PresetStore) -> str:
+    return preset_store.get(retrieve_one_preset(preset_store, input_word))
+
+
+class CompiledPresets:
+    """ポケモンを指定するpresetの文字列を、名前を解決済みのBattlePokemonArgsにコンパイルしたものを保持する。
+
+    コンパイルできるのは "<ポケモン> <BATTLE_POKEMON_OPTIONSのoption> <value> ..." の形で、すべての名前が入力なしで前方一致により一つに定まるpresetだけである。
+    n-gramの索引で近い名前を探す必要があるpresetは、解決した結果を表示せずに保存することになるためコンパイルしない。それ以外のpresetは従来通り文字列として展開する。
+    結果はcache_filepathにdataのnameで保存し、dependency_filepaths（names, replacementのファイル）が変更されたら破棄する。
+    """
+
+    # コンパイルの規則を変えたときに上げる
+    CACHE_VERSION = 1
+
+    def __init__(
+        self, all_data: AllData, dependency_filepaths: Iterable[PathLike | str], cache_filepath: PathLike | str
+    ) -> None:
+        self.all_data = all_data
+        self.dependency_filepaths = list(dependency_filepaths)
+        self.cache_filepath = cache_filepath
+        self.templates: dict[str, BattlePokemonArgs | None] = {}
+        self.fingerprint = self._get_fingerprint()
+        self._load()
+
+    def _get_fingerprint(self) -> list:
+        fingerprint = []
+        for filepath in self.dependency_filepaths:
+            stat = os.stat(filepath)
+            fingerprint.append([os.fspath(filepath), stat.st_mtime_ns, stat.st_size])
+        return fingerprint
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_filepath):
+            return
+        with open(self.cache_filepath, encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") != self.CACHE_VERSION or cache["fingerprint"] != self.fingerprint:
+            return
+        try:
+            self.templates = {
+                preset_value: self._from_json(template) if template is not None else None
+                for preset_value, template in cache["templates"].items()
+            }
+        except KeyError:
+            self.templates = {}
+
+    def _save(self) -> None:
+        cache = {
+            "version": self.CACHE_VERSION,
+            "fingerprint": self.fingerprint,
+            "templates": {
+                preset_value: self._to_json(template) if template is not None else None
+                for preset_value, template in self.templates.items()
+            },
+        }
+        temp_filepath = f"{os.fspath(self.cache_filepath)}.tmp"
+        with open(temp_filepath, encoding="utf-8", mode="w") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_filepath, self.cache_filepath)
+
+    def get(self, preset_value: str) -> BattlePokemonArgs | None:
+        """コンパイルできないpresetのときNoneを返す。返り値はコピーなので変更してよい。"""
+        if (fingerprint := self._get_fingerprint()) != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.templates = {}
+        if preset_value not in self.templates:
+            self.templates[preset_value] = self.compile(preset_value)
+            self._save()
+        template = self.templates[preset_value]
+        return template.copy() if template is not None else None
+
+    def compile(self, preset_value: str) -> BattlePokemonArgs | None:
+        words = preset_value.split()
+        if len(words) % 2 != 1 or words[0] in ALL_OPTIONS:
+            return None
+        options = list(zip(words[1::2], words[2::2]))
+        if any(option not in BATTLE_POKEMON_OPTIONS for option, _ in options):
+            return None
+        try:
+            battle_pokemon = BattlePokemonArgs(
+                retrieve_one_data(self.all_data.pokemons, words[0], ambiguity_policy="error")
+            )
+            for option, value in options:
+                _apply_battle_pokemon_option(battle_pokemon, option, value, self.all_data, "error", fuzzy=False)
+        except (InvalidInput, ValueError):
+            return None
+        return battle_pokemon
+
+    def _to_json(self, template: BattlePokemonArgs) -> dict:
+        assert template.pokemon is not None
+        return {
+            "pokemon": template.pokemon.data.name,
+            "ability": template.ability.data.name if template.ability is not None else None,
+            "doryokuchi": template.doryokuchi,
+            "kotaichi": template.kotaichi,
+            "seikaku_hosei": template.seikaku_hosei,
+            "item": template.item.data.name if template.item is not None else None,
+            "rank": template.rank,
+            "terasu_type": template.terasu_type.data.name if template.terasu_type is not None else None,
+            "level": template.level,
+            "all_doryokuchi": vars(template.all_doryokuchi) if template.all_doryokuchi is not None else None,
+            "all_kotaichi": vars(template.all_kotaichi) if template.all_kotaichi is not None else None,
+            "seikaku_hosei_up_down": template.seikaku_hosei_up_down,
+        }
+
+    def _from_json(self, template: dict) -> BattlePokemonArgs:
+        return BattlePokemonArgs(
+            pokemon=self.all_data.pokemons[template["pokemon"]],
+            ability=self.all_data.abilities[a] if (a := template["ability"]) is not None else None,
+            doryokuchi=template["doryokuchi"],
+            kotaichi=template["kotaichi"],
+            seikaku_hosei=template["seikaku_hosei"],
+            item=self.all_data.items[i] if (i := template["item"]) is not None else None,
+            rank=template["rank"],
+            terasu_type=self.all_data.types[t] if (t := template["terasu_type"]) is not None else None,
+            level=template["level"],
+            all_doryokuchi=Stats(**d) if (d := template["all_doryokuchi"]) is not None else None,
+            all_kotaichi=Stats(**k) if (k := template["all_kotaichi"]) is not None else None,
+            seikaku_hosei_up_down=tuple(u) if (u := template["seikaku_hosei_up_down"]) is not None else None,
+        )
+
+
+# 入力によらず適用する (持ち物, テラスタイプ)
+BUILTIN_FIXED_SETTINGS: dict[str, tuple[str | None, str | None]] = {
+    "terapagos-stellar": (None, "stellar"),
+    "zacian-crowned": ("もちもの指定なし", None),
+    "zamazenta-crowned": ("もちもの指定なし", None),
+    "ogerpon-wellspring-mask": ("オーガポン仮面", None),
+    "ogerpon-hearthflame-mask": ("オーガポン仮面", None),
+    "ogerpon-cornerstone-mask": ("オーガポン仮面", None),
+}
 
 
 def _process_specific_settings(input_args_list: list[InputArgs], all_data: AllData) -> list[InputArgs]:
+    """BUILTIN_FIXED_SETTINGSの持ち物、テラスタイプを適用する。"""
     processed_input_args_list: list[InputArgs] = []
     for input_args in input_args_list:
         for battle_pokemon_args in [input_args.attacker, input_args.defender]:
             assert battle_pokemon_args.pokemon is not None
-            if battle_pokemon_args.pokemon.data.name == "terapagos-stellar":
-                battle_pokemon_args.terasu_type = all_data.types["stellar"]
-            elif battle_pokemon_args.pokemon.data.name == "zacian-crowned":
-                battle_pokemon_args.item = all_data.items["もちもの指定なし"]
-            elif battle_pokemon_args.pokemon.data.name == "zamazenta-crowned":
-                battle_pokemon_args.item = all_data.items["もちもの指定なし"]
-            elif battle_pokemon_args.pokemon.data.name in [
-                "ogerpon-wellspring-mask",
-                "ogerpon-hearthflame-mask",
-                "ogerpon-cornerstone-mask",
-            ]:
-                battle_pokemon_args.item = all_data.items["オーガポン仮面"]
+            pokemon_name = battle_pokemon_args.pokemon.data.name
+            fixed = BUILTIN_FIXED_SETTINGS.get(pokemon_name)
+            if fixed is not None:
+                item_name, terasu_type_name = fixed
+                if item_name is not None:
+                    battle_pokemon_args.item = all_data.items[item_name]
+                if terasu_type_name is not None:
+                    battle_pokemon_args.terasu_type = all_data.types[terasu_type_name]
         processed_input_args_list.append(input_args)
     return processed_input_args_list
 
@@ -311,13 +585,16 @@ def _process_ability(input_args_list: list[InputArgs], all_data: AllData) -> lis
         "unaware",
     ]
     # "マルチスケイル", "エレキスキン", "フェアリースキン", "てつのこぶし", "すてみ", "そうだいしょう", "ちからずく", "かたいツメ", "テクニシャン", "こんじょう", "ちからもち", "ヨガパワー", "すいほう", "きよめのしお", "いろめがね", "ハードロック", "フィルター", "てきおうりょく", "さいせいりょく", "てんねん"
-    # このリストが優先度の高い順になる
+    # このリストが優先度の高い順になる。metagame.jsonの"sets"にある特性はこれより優先する
     processed_input_args_list: list[InputArgs] = []
     for input_args in input_args_list:
         for battle_pokemon_args in (input_args.attacker, input_args.defender):
             assert battle_pokemon_args.pokemon is not None
             if battle_pokemon_args.ability is None:
-                for preffered_ability_name in preffered_ability_names:
+                metagame_ability_names = []
+                if all_data.metagame is not None:
+                    metagame_ability_names = all_data.metagame.abilities(battle_pokemon_args.pokemon.data.name)
+                for preffered_ability_name in [*metagame_ability_names, *preffered_ability_names]:
                     if preffered_ability_name in battle_pokemon_args.pokemon.data.ability_names:
                         battle_pokemon_args.ability = all_data.abilities[preffered_ability_name]
                         break
@@ -327,102 +604,215 @@ def _process_ability(input_args_list: list[InputArgs], all_data: AllData) -> lis
     return processed_input_args_list
 
 
-def _process_attacker_nouryokuchi(input_args_list: list[InputArgs], all_data: AllData) -> list[InputArgs]:
-    processed_input_args_list: list[InputArgs] = []
-    for input_args in input_args_list:
-        if input_args.attacker.doryokuchi is None:
-            if input_args.attacker.item is None:
-                new_args = input_args.copy()
-                new_args.attacker.doryokuchi = 252
-                new_args.attacker.kotaichi = 31
-                new_args.attacker.seikaku_hosei = 1.1
-                new_args.attacker.item = all_data.items["こだわり"]
-                processed_input_args_list.append(new_args)
-
-                new_args = input_args.copy()
-                new_args.attacker.doryokuchi = 252
-                new_args.attacker.kotaichi = 31
-                new_args.attacker.seikaku_hosei = 1.1
-                new_args.attacker.item = all_data.items["1.2倍アイテム"]
-                processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.attacker.doryokuchi = 252
-            new_args.attacker.kotaichi = 31
-            new_args.attacker.seikaku_hosei = 1.1
-            processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.attacker.doryokuchi = 252
-            new_args.attacker.kotaichi = 31
-            new_args.attacker.seikaku_hosei = 1
-            processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.attacker.doryokuchi = 0
-            new_args.attacker.kotaichi = 31
-            new_args.attacker.seikaku_hosei = 1
-            processed_input_args_list.append(new_args)
-        else:
-            processed_input_args_list.append(input_args)
-    return processed_input_args_list
+def _damage_stats(input_args: InputArgs) -> tuple[str, str] | None:
+    """pokemon_calc.calc_damage()が使う (attackerの能力値, defenderの能力値)。変化技のときはNone。
+    イカサマのattackerの能力値は、defenderのこうげき。
+    """
+    assert input_args.move is not None
+    move_name = input_args.move.data.name
+    damage_class = input_args.move.data.damage_class
+    state_names = [state.data.name for state in input_args.states]
+    if move_name in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES:
+        return "c", "b"
+    if move_name == "body-press":
+        return "b", "b"
+    if move_name == "foul-play":
+        return "a", "b"
+    if "物理" in state_names or damage_class == "physical":
+        return "a", "b"
+    if "特殊" in state_names or damage_class == "special":
+        return "c", "d"
+    return None
+
+
+# 展開で上書きするフィールドと値の組。BattlePokemonArgsまたはInputArgsのフィールド名をkeyにする。
+type Override = dict[str, Any]
+
+
+class SpreadProfile:
+    """努力値が無入力のときに試す組（spread_profile.json）を、上書きの組にコンパイルしたものを保持する。
+
+    書式はspread_profile.jsonのコメントを参照。努力値等が同じ組は同じOverrideのオブジェクトにまとめる。
+    all_data.metagameにポケモンの"sets"があり、技が物理か特殊のときは、spread_profile.jsonの代わりにsetsの努力値等を試す。
+    iter_inputs()はOverrideのオブジェクトごとにBattlePokemonを1つ作り、pokemon_calc.calc_damages()はHP以外が同じInputのダメージを1回だけ計算する。
+    """
+
+    ATTACKER_KEYS = {"doryokuchi", "kotaichi", "seikaku_hosei", "item", "damage_class"}
+    DEFENDER_KEYS = ATTACKER_KEYS | {"hp_doryokuchi", "hp_kotaichi"}
+
+    def __init__(self, all_data: AllData, spread_profile_filepath: PathLike | str) -> None:
+        self.all_data = all_data
+        with open(spread_profile_filepath, encoding="utf-8") as f:
+            profile = jsonc.load(f)
+        self.overrides: dict[tuple, Override] = {}
+        # (上書き, HPへの上書き, itemを指定しているか, damage_class)
+        self.attackers: list[tuple[Override, Override, bool, str | None]] = [
+            self._compile(spread, self.ATTACKER_KEYS) for spread in profile["attacker"]
+        ]
+        self.defenders: list[tuple[Override, Override, bool, str | None]] = [
+            self._compile(spread, self.DEFENDER_KEYS) for spread in profile["defender"]
+        ]
+
+    def _compile(self, spread: dict, keys: set[str]) -> tuple[Override, Override, bool, str | None]:
+        if not keys.issuperset(spread) or "doryokuchi" not in spread:
+            raise ValueError(f"invalid spread: {spread}")
+        if "item" in spread and spread["item"] not in self.all_data.items:
+            raise ValueError(f"unknown item: {spread['item']}")
+        override = self._override(
+            int(spread["doryokuchi"]),
+            int(spread.get("kotaichi", 31)),
+            spread.get("seikaku_hosei", 1),
+            spread.get("item"),
+        )
+        hp_override: Override = {}
+        if "hp_doryokuchi" in spread:
+            hp_override = {
+                "hp_doryokuchi": int(spread["hp_doryokuchi"]),
+                "hp_kotaichi": int(spread.get("hp_kotaichi", 31)),
+            }
+        return override, hp_override, "item" in spread, spread.get("damage_class")
+
+    def _override(self, doryokuchi: int, kotaichi: int, seikaku_hosei: float, item_name: str | None) -> Override:
+        key = (doryokuchi, kotaichi, seikaku_hosei, item_name)
+        if key not in self.overrides:
+            override: Override = {"doryokuchi": doryokuchi, "kotaichi": kotaichi, "seikaku_hosei": seikaku_hosei}
+            if item_name is not None:
+                override["item"] = self.all_data.items[item_name]
+            self.overrides[key] = override
+        return self.overrides[key]
+
+    def _select_metagame(
+        self, battle_pokemon_args: BattlePokemonArgs, input_args: InputArgs, is_defender: bool
+    ) -> list[tuple[Override, Override]] | None:
+        """metagameのsetsから作る組。setsがないとき、技が変化技のときはNone。
+
+        能力値はcalc_damage()と同じく技で決める。イカサマのattackerは、defenderのsetsのこうげきの努力値等を使う。
+        """
+        assert input_args.move is not None and input_args.defender.pokemon is not None
+        if self.all_data.metagame is None or (stats := _damage_stats(input_args)) is None:
+            return None
+        stat = stats[1] if is_defender else stats[0]
+        # calc_damage()はイカサマのとき、defenderのこうげきにattackerの努力値等を使う
+        uses_defender_sets = not is_defender and input_args.move.data.name == "foul-play"
+        source = input_args.defender if uses_defender_sets else battle_pokemon_args
+        assert source.pokemon is not None
+        metagame_sets = self.all_data.metagame.sets(source.pokemon.data.name)
+        if len(metagame_sets) == 0:
+            return None
+        selected: list[tuple[Override, Override]] = []
+        for metagame_set in metagame_sets:
+            # 持ち物は入力がなく、AllDataにあるときだけ使う。defenderのsetsの持ち物は使わない
+            item_name = metagame_set.item
+            if battle_pokemon_args.item is not None or item_name not in self.all_data.items or uses_defender_sets:
+                item_name = None
+            override = self._override(
+                getattr(metagame_set.doryokuchi, stat), 31, metagame_set.seikaku_hosei(stat), item_name
+            )
+            hp_override: Override = {}
+            if is_defender:
+                hp_override = {"hp_doryokuchi": metagame_set.doryokuchi.h, "hp_kotaichi": 31}
+            # 使用率の高い順のまま、同じ組を除く
+            if all(override is not o or hp_override != h for o, h in selected):
+                selected.append((override, hp_override))
+        return selected
+
+    def _select(
+        self,
+        spreads: list[tuple[Override, Override, bool, str | None]],
+        battle_pokemon_args: BattlePokemonArgs,
+        input_args: InputArgs,
+    ) -> list[tuple[Override, Override]]:
+        assert input_args.move is not None
+        return [
+            (override, hp_override)
+            for override, hp_override, has_item, damage_class in spreads
+            if (not has_item or battle_pokemon_args.item is None)
+            and (damage_class is None or damage_class == input_args.move.data.damage_class)
+        ]
+
+    def attacker_overrides(self, input_args: InputArgs) -> list[Override]:
+        """attackerの努力値が無入力のときに試す組。入力されているときは何も上書きしない組を1つ返す。"""
+        if input_args.attacker.doryokuchi is not None:
+            return [{}]
+        if (selected := self._select_metagame(input_args.attacker, input_args, False)) is None:
+            selected = self._select(self.attackers, input_args.attacker, input_args)
+        return [override for override, _ in selected]
+
+    def defender_overrides(self, input_args: InputArgs) -> list[tuple[Override, Override]]:
+        """defenderの努力値が無入力のときに試す (defenderへの上書き, InputArgsのHPへの上書き) の組。"""
+        if input_args.defender.doryokuchi is not None:
+            return [({}, {})]
+        if (selected := self._select_metagame(input_args.defender, input_args, True)) is not None:
+            return selected
+        return self._select(self.defenders, input_args.defender, input_args)
+
+
+def make_input_args_from_str(
+    input_str: str,
+    all_data: AllData,
+    preset_store: PresetStore,
+    compiled_presets: CompiledPresets | None = None,
+    ambiguity_policy: AmbiguityPolicy = "prompt",
+) -> InputArgs:
+    """入力をInputArgsにする。"save"、"del"は受け付けず、補完や展開はしない。"""
+    input_args = _make_input_args_from_str(
+        input_str, all_data, preset_store, compiled_presets, ambiguity_policy, allow_preset_commands=False
+    )
+    assert input_args is not None
+    return input_args
 
 
-def _process_defender_nouryokuchi(input_args_list: list[InputArgs], all_data: AllData) -> list[InputArgs]:
-    processed_input_args_list: list[InputArgs] = []
-    for input_args in input_args_list:
-        if input_args.defender.doryokuchi is None:
-            new_args = input_args.copy()
-            new_args.defender.doryokuchi = 0
-            new_args.defender.kotaichi = 31
-            new_args.defender.seikaku_hosei = 1
-            new_args.hp_doryokuchi = 0
-            new_args.hp_kotaichi = 31
-            processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.defender.doryokuchi = 0
-            new_args.defender.kotaichi = 31
-            new_args.defender.seikaku_hosei = 1
-            new_args.hp_doryokuchi = 252
-            new_args.hp_kotaichi = 31
-            processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.defender.doryokuchi = 252
-            new_args.defender.kotaichi = 31
-            new_args.defender.seikaku_hosei = 1.1
-            new_args.hp_doryokuchi = 0
-            new_args.hp_kotaichi = 31
-            processed_input_args_list.append(new_args)
-
-            new_args = input_args.copy()
-            new_args.defender.doryokuchi = 252
-            new_args.defender.kotaichi = 31
-            new_args.defender.seikaku_hosei = 1.1
-            new_args.hp_doryokuchi = 252
-            new_args.hp_kotaichi = 31
-            processed_input_args_list.append(new_args)
-
-            assert input_args.move is not None
-            if input_args.defender.item is None and input_args.move.data.damage_class == "special":
-                new_args = input_args.copy()
-                new_args.defender.doryokuchi = 252
-                new_args.defender.kotaichi = 31
-                new_args.defender.seikaku_hosei = 1.1
-                new_args.defender.item = all_data.items["とつげきチョッキ"]
-                new_args.hp_doryokuchi = 252
-                new_args.hp_kotaichi = 31
-                processed_input_args_list.append(new_args)
-        else:
-            processed_input_args_list.append(input_args)
-    return processed_input_args_list
+def complete_input_args(input_args: InputArgs, all_data: AllData) -> None:
+    """特定のポケモンの持ち物等と、無入力の特性を補完する。"""
+    _process_specific_settings([input_args], all_data)
+    _process_ability([input_args], all_data)
+
+
+def iter_inputs(input_args: InputArgs, all_data: AllData, spread_profile: SpreadProfile) -> Iterator[Input]:
+    """input_argsを展開したInputを順に作って返す。
+
+    展開はinput_argsに対する上書きの組の直積で表す。BattlePokemonは上書きの組ごとに1つだけ作り、各Inputで共有する。
+    input_argsは特性などの補完のために書き換えられる。
+    """
+    complete_input_args(input_args, all_data)
+    replaced: dict[int, BattlePokemonArgs] = {}
+    attackers = [
+        replaced.setdefault(id(override), dataclasses.replace(input_args.attacker, **override))
+        for override in spread_profile.attacker_overrides(input_args)
+    ]
+    replaced = {}
+    defenders = [
+        (replaced.setdefault(id(override), dataclasses.replace(input_args.defender, **override)), hp_override)
+        for override, hp_override in spread_profile.defender_overrides(input_args)
+    ]
+    battle_pokemons: dict[int, BattlePokemon] = {}
+    for attacker in attackers:
+        for defender, hp_override in defenders:
+            hp_doryokuchi = hp_override.get("hp_doryokuchi", input_args.hp_doryokuchi)
+            hp_kotaichi = hp_override.get("hp_kotaichi", input_args.hp_kotaichi)
+            check_args_set(
+                InputArgs(attacker, defender, input_args.move, input_args.states, hp_doryokuchi, hp_kotaichi)
+            )
+            assert input_args.move is not None and hp_doryokuchi is not None
+            for battle_pokemon_args in (attacker, defender):
+                if id(battle_pokemon_args) not in battle_pokemons:
+                    battle_pokemons[id(battle_pokemon_args)] = battle_pokemon_args.make_battle_pokemon()
+            yield Input(
+                battle_pokemons[id(attacker)],
+                battle_pokemons[id(defender)],
+                input_args.move,
+                input_args.states,
+                hp_doryokuchi,
+                hp_kotaichi,
+            )
 
 
 def check_args_set(input_args: InputArgs) -> InputArgs:
     # InputArgs.make_input(), BattlePokemonArgs.make_battle_pokemon()でエラーが出る状態であるとき、ここでInvalidInputを出して再入力させる
     if input_args.move is None:
         raise InvalidInput("no move")
+    if input_args.move.data.damage_class == "status":
+        raise InvalidInput(f"not a damaging move: {input_args.move.display_name}")
     if input_args.hp_doryokuchi is None:
         raise InvalidInput("no hp doryokuchi")
     if input_args.attacker.pokemon is None:
@@ -440,10 +830,20 @@ def check_args_set(input_args: InputArgs) -> InputArgs:
     return input_args
 
 
-def get_inputs_to_calculate(all_data: AllData, preset_filepath: PathLike | str) -> list[Input] | None:
+def get_inputs_from_str(
+    input_str: str,
+    all_data: AllData,
+    preset_store: PresetStore,
+    spread_profile: SpreadProfile,
+    compiled_presets: CompiledPresets | None = None,
+    ambiguity_policy: AmbiguityPolicy = "prompt",
+    allow_preset_commands: bool = True,
+    history: QueryHistory | None = None,
+) -> list[Input] | None:
     """入力が"save"や"del"などのコマンドのとき、Noneを返す。"""
-    input_str = get_input()
-    input_args = _make_input_args_from_str(input_str, all_data, preset_filepath)
+    input_args = _make_input_args_from_str(
+        input_str, all_data, preset_store, compiled_presets, ambiguity_policy, allow_preset_commands, history
+    )
     if input_args is None:
         return None
     if input_args.attacker is None:
@@ -452,9 +852,46 @@ def get_inputs_to_calculate(all_data: AllData, preset_filepath: PathLike | str)
         raise InvalidInput("no defender")
     if input_args.move is None:
         raise InvalidInput("no move")
-    input_args_list: list[InputArgs] = [input_args]
-    input_args_list = _process_specific_settings(input_args_list, all_data)
-    input_args_list = _process_ability(input_args_list, all_data)
-    input_args_list = _process_attacker_nouryokuchi(input_args_list, all_data)
-    input_args_list = _process_defender_nouryokuchi(input_args_list, all_data)
-    return [check_args_set(input_args).make_input() for input_args in input_args_list]
+    return list(iter_inputs(input_args, all_data, spread_profile))
+
+
+def get_inputs_to_calculate(
+    all_data: AllData,
+    preset_store: PresetStore,
+    spread_profile: SpreadProfile,
+    compiled_presets: CompiledPresets | None = None,
+    history: QueryHistory | None = None,
+) -> list[Input] | None:
+    """入力が"save"や"del"などのコマンドのとき、Noneを返す。"""
+    return get_inputs_from_str(get_input(), all_data, preset_store, spread_profile, compiled_presets, history=history)
+
+
+@dataclasses.dataclass(eq=False)
+class QueryContext:
+    """クエリの評価に使うもの一式"""
+
+    converter: pokemon_data.JpToRomaji
+    all_data: AllData
+    preset_store: PresetStore
+    compiled_presets: CompiledPresets
+    spread_profile: SpreadProfile
+
+
+def load_query_context(input_filepaths: InputFilepaths) -> QueryContext:
+    """各ツールの起動時に呼ぶ。"""
+    converter = pokemon_data.JpToRomaji(input_filepaths.replacement_filepath)
+    all_data = pokemon_data.load_all_data(
+        input_filepaths.pokeapi_filepaths, input_filepaths.names_filepaths, converter, input_filepaths.metagame_filepath
+    )
+    compiled_presets = CompiledPresets(
+        all_data,
+        [*vars(input_filepaths.names_filepaths).values(), input_filepaths.replacement_filepath],
+        f"{os.fspath(input_filepaths.preset_filepath)}.compiled.json",
+    )
+    return QueryContext(
+        converter,
+        all_data,
+        PresetStore(input_filepaths.preset_filepath),
+        compiled_presets,
+        SpreadProfile(all_data, input_filepaths.spread_profile_filepath),
+    )
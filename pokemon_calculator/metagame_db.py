@@ -0,0 +1,219 @@
+"""ポケモンごとによく使われる型（metagame.json）を、ポケモンのnameで引けるSQLiteのファイルにしたもの。
+
+    python metagame_db.py
+
+metagame.jsonの書式はファイルのコメントを参照。SQLiteのファイル（metagame.json.sqlite3）は、metagame.jsonの更新時刻とサイズが
+作ったときと変わっていれば、開くときに作り直す。data_build.pyでも作る。
+
+input_processorは、これを次のことに使う。
+- 特性が無入力のとき、"sets"の使用率の合計が最も高い特性にする
+- 努力値が無入力のとき、spread_profile.jsonの組の代わりに、使用率の高い"sets"の努力値、性格補正、持ち物を試す
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from os import PathLike
+import json
+import os
+import sqlite3
+
+import jsonc
+
+import pokemon_data
+from input_filepaths import default_input_filepaths
+
+# テーブルの定義を変えたときに上げる
+SCHEMA_VERSION = 2
+# 努力値が無入力のときに試すsetsの数の上限と、使用率の合計がこれに達したら打ち切る値
+MAX_SETS = 4
+SETS_COVERAGE = 0.8
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE sets (
+    pokemon TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    usage REAL NOT NULL,
+    ability TEXT,
+    item TEXT,
+    terasu_type TEXT,
+    h INTEGER NOT NULL,
+    a INTEGER NOT NULL,
+    b INTEGER NOT NULL,
+    c INTEGER NOT NULL,
+    d INTEGER NOT NULL,
+    s INTEGER NOT NULL,
+    seikaku_up TEXT NOT NULL,
+    seikaku_down TEXT NOT NULL,
+    PRIMARY KEY (pokemon, rank)
+);
+"""
+
+
+@dataclass(eq=False)
+class MetagameSet:
+    usage: float
+    ability: str | None
+    item: str | None
+    terasu_type: str | None
+    doryokuchi: pokemon_data.Stats
+    seikaku_up: str
+    """ "a", "b", "c", "d", "s" または無補正の"*" """
+    seikaku_down: str
+
+    def seikaku_hosei(self, stat: str) -> float:
+        if self.seikaku_up == stat and self.seikaku_down != stat:
+            return 1.1
+        if self.seikaku_down == stat and self.seikaku_up != stat:
+            return 0.9
+        return 1
+
+
+def database_filepath(source_filepath: PathLike | str) -> str:
+    return f"{os.fspath(source_filepath)}.sqlite3"
+
+
+def get_fingerprint(source_filepath: PathLike | str) -> list:
+    stat = os.stat(source_filepath)
+    return [SCHEMA_VERSION, os.fspath(source_filepath), stat.st_mtime_ns, stat.st_size]
+
+
+def _parse_set(pokemon: str, metagame_set: dict) -> tuple:
+    doryokuchi = metagame_set["d6"].split("-")
+    seikaku = metagame_set.get("seikaku", "*-*").split("-")
+    if len(doryokuchi) != 6 or len(seikaku) != 2 or not set(seikaku) <= set("abcds*"):
+        raise ValueError(f"invalid set of {pokemon}: {metagame_set}")
+    return (
+        float(metagame_set["usage"]),
+        metagame_set.get("ability"),
+        metagame_set.get("item"),
+        metagame_set.get("terasu_type"),
+        *map(int, doryokuchi),
+        *seikaku,
+    )
+
+
+def build(source_filepath: PathLike | str, output_filepath: PathLike | str | None = None) -> None:
+    if output_filepath is None:
+        output_filepath = database_filepath(source_filepath)
+    fingerprint = get_fingerprint(source_filepath)
+    with open(source_filepath, encoding="utf-8") as f:
+        source: dict[str, dict] = jsonc.load(f)
+    set_rows = []
+    for pokemon, entry in source.items():
+        rows = [_parse_set(pokemon, metagame_set) for metagame_set in entry.get("sets", [])]
+        # 使用率の高い順
+        rows.sort(key=lambda row: -row[0])
+        set_rows += [(pokemon, rank, *row) for rank, row in enumerate(rows)]
+
+    # 同時に作る別のプロセスと一時ファイルが重ならないようにする
+    temp_filepath = f"{os.fspath(output_filepath)}.{os.getpid()}.tmp"
+    if os.path.exists(temp_filepath):
+        os.remove(temp_filepath)
+    connection = sqlite3.connect(temp_filepath)
+    try:
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (json.dumps(fingerprint),))
+            connection.executemany(f"INSERT INTO sets VALUES ({', '.join('?' * 14)})", set_rows)
+    finally:
+        connection.close()
+    os.replace(temp_filepath, output_filepath)
+
+
+class MetagameDB:
+    """ポケモンごとの結果はメモリ上にも保持し、同じポケモンについては2回目から問い合わせない。
+
+    SQLiteの接続はforkした子プロセスで使えないため、batch_calc.pyのワーカーなどでは、プロセスごとに開き直す。
+    """
+
+    def __init__(self, source_filepath: PathLike | str = default_input_filepaths.metagame_filepath) -> None:
+        filepath = database_filepath(source_filepath)
+        fingerprint = get_fingerprint(source_filepath)
+        if self._read_fingerprint(filepath) != fingerprint:
+            build(source_filepath, filepath)
+        self.filepath = filepath
+        self.pid = os.getpid()
+        self.connection = self._connect()
+        self._sets: dict[str, list[MetagameSet]] = {}
+        self._abilities: dict[str, list[str]] = {}
+
+    @staticmethod
+    def _read_fingerprint(filepath: str) -> list | None:
+        if not os.path.exists(filepath):
+            return None
+        try:
+            connection = sqlite3.connect(f"file:{filepath}?mode=ro", uri=True)
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row is not None else None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.filepath}?mode=ro", uri=True, check_same_thread=False)
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.connection = self._connect()
+        return self.connection.execute(sql, parameters)
+
+    def abilities(self, pokemon: str) -> list[str]:
+        """setsの特性を、使用率の合計の高い順に返す。"""
+        if pokemon not in self._abilities:
+            self._abilities[pokemon] = [
+                ability
+                for (ability,) in self._execute(
+                    "SELECT ability FROM sets WHERE pokemon = ? AND ability IS NOT NULL"
+                    " GROUP BY ability ORDER BY SUM(usage) DESC, MIN(rank)",
+                    (pokemon,),
+                )
+            ]
+        return self._abilities[pokemon]
+
+    def sets(self, pokemon: str) -> list[MetagameSet]:
+        """努力値が無入力のときに試すsets。使用率の高い順に、合計がSETS_COVERAGEに達するまで、最大MAX_SETS個。"""
+        if pokemon not in self._sets:
+            rows = self._execute(
+                "SELECT usage, ability, item, terasu_type, h, a, b, c, d, s, seikaku_up, seikaku_down"
+                " FROM sets WHERE pokemon = ? ORDER BY rank LIMIT ?",
+                (pokemon, MAX_SETS),
+            )
+            sets: list[MetagameSet] = []
+            coverage = 0.0
+            for usage, ability, item, terasu_type, *doryokuchi, seikaku_up, seikaku_down in rows:
+                if coverage >= SETS_COVERAGE:
+                    break
+                sets.append(
+                    MetagameSet(
+                        usage, ability, item, terasu_type, pokemon_data.Stats(*doryokuchi), seikaku_up, seikaku_down
+                    )
+                )
+                coverage += usage
+            self._sets[pokemon] = sets
+        return self._sets[pokemon]
+
+    def references(self) -> list[tuple[str, str, str]]:
+        """(ポケモンのname, AllDataのメンバ名, name) の組。data_validatorで存在しないものを見つけるのに使う。"""
+        return self._execute(
+            "SELECT pokemon, 'pokemons', pokemon FROM sets"
+            " UNION SELECT pokemon, 'abilities', ability FROM sets WHERE ability IS NOT NULL"
+            " UNION SELECT pokemon, 'items', item FROM sets WHERE item IS NOT NULL"
+            " UNION SELECT pokemon, 'types', terasu_type FROM sets WHERE terasu_type IS NOT NULL"
+        ).fetchall()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def load_if_exists(source_filepath: PathLike | str) -> MetagameDB | None:
+    if not os.path.exists(source_filepath):
+        return None
+    return MetagameDB(source_filepath)
+
+
+if __name__ == "__main__":
+    build(default_input_filepaths.metagame_filepath)
@@ -0,0 +1,78 @@
+"""attackerが覚えるすべての攻撃技のダメージを計算し、ひんしにする確率とダメージの大きい順に並べる。
+
+    python move_ranking.py gabu d 252 s a kai h 252 d 4
+クエリは対話モードと同じ書式で、技は入力しない。努力値は1つのInputになるように入力する。
+"""
+
+from __future__ import annotations
+import argparse
+import dataclasses
+
+import input_processor
+from pokemon_data import AllData, Move, NameExtended, Pokemon
+from pokemon_calc import Input, InputArgs, Output, OutputTable, calc_damages
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import InvalidInput
+
+
+def damaging_moves(pokemon: NameExtended[Pokemon], all_data: AllData) -> list[NameExtended[Move]]:
+    """pokemonが覚える技のうち、変化技と威力のない技（固定ダメージの技など）を除いたもの。"""
+    return [
+        move
+        for name in pokemon.data.move_names
+        if (move := all_data.moves.get(name)) is not None
+        and move.data.damage_class != "status"
+        and move.data.power
+        and move.data.type_name in all_data.types
+    ]
+
+
+def rank_moves(input_args: InputArgs, all_data: AllData) -> list[Output]:
+    """input_argsの技をattackerが覚える攻撃技のそれぞれに替えて計算し、ひんしにする確率、平均ダメージの大きい順に返す。
+
+    attacker、defender、状態は全ての技で同じオブジェクトを使う。input_argsは特性などの補完のために書き換えられる。
+    """
+    assert input_args.attacker.pokemon is not None
+    moves = damaging_moves(input_args.attacker.pokemon, all_data)
+    if len(moves) == 0:
+        raise InvalidInput("no damaging move")
+    input_processor.complete_input_args(input_args, all_data)
+    input_processor.check_args_set(dataclasses.replace(input_args, move=moves[0]))
+    assert input_args.hp_doryokuchi is not None
+    attacker = input_args.attacker.make_battle_pokemon()
+    defender = input_args.defender.make_battle_pokemon()
+    outputs = calc_damages(
+        (
+            Input(attacker, defender, move, input_args.states, input_args.hp_doryokuchi, input_args.hp_kotaichi)
+            for move in moves
+        ),
+        all_data,
+    )
+    return sorted(outputs, key=lambda output: (output.ko_probability, output.damage.average), reverse=True)
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", nargs="+", help="技を除いた、対話モードと同じ書式のクエリ")
+    parser.add_argument("-n", "--top", type=int, default=None, help="上位n個だけを表示する")
+    args = parser.parse_args()
+
+    context = input_processor.load_query_context(input_filepaths)
+    all_data, preset_store, compiled_presets = context.all_data, context.preset_store, context.compiled_presets
+    try:
+        input_args = input_processor.make_input_args_from_str(
+            " ".join(args.query), all_data, preset_store, compiled_presets
+        )
+        if input_args.move is not None:
+            raise InvalidInput("do not enter a move")
+        outputs = rank_moves(input_args, all_data)[: args.top]
+    except (InvalidInput, IndexError, ValueError) as e:
+        print(e)
+        return
+    print(outputs[0].header_str())
+    for output, row_str in zip(outputs, OutputTable(outputs).row_strs()):
+        print(f"{row_str} {output.input.move.display_name} ひんし{output.ko_probability * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
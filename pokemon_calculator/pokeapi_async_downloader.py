@@ -0,0 +1,443 @@
+"""PokeAPIのリソースを並行して取得し、pokeapi_downloaderと同じJSONファイルを作る。
+
+pokeapi_downloaderはpokebaseで1件ずつ順に取得するため、すべてを取得するのに数時間かかる。
+ここではpokemon-speciesから辿るpokemon、pokemon-formもasyncioで並行して取得し、取得したJSONを属性で読めるResourceで包んで、
+pokeapi_downloaderの*_dict()で同じ辞書に変換する。
+
+HTTPは標準ライブラリのhttp.clientで行う。同時に行うリクエストの数をセマフォで、ホストごとのリクエストの間隔をRateLimiterで制限し、
+接続はホストごとに使い回す。--base-urlに記録したレスポンスを返すローカルのサーバーを指定すれば、PokeAPIに接続せずに動作を確かめられる。
+
+同じURLは1回の実行で1回だけ取得し、取得したものはディスク上のキャッシュ（ResourceCache）に保存する。
+次に実行するときは、キャッシュにあるURLを条件付きリクエストで取得し、変わっていなければ取得し直さない。
+中断したときはpokeapi_downloaderと同じジャーナルから続きを取得する。
+
+--refreshでは、今あるダンプに増えたものと変わったものだけを書き込み、*_names.jsonにはそれらのエントリーだけを追加、更新する。
+"""
+
+from __future__ import annotations
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from email.message import Message
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from os import PathLike
+from pathlib import Path
+from typing import Any
+from urllib.parse import urljoin, urlsplit
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+
+import pokeapi_downloader
+import pokemon_data
+from input_filepaths import default_input_filepaths, NamesFilepaths, PokeapiFilepaths
+
+DEFAULT_BASE_URL = "https://pokeapi.co/api/v2/"
+default_cache_dir = Path(default_input_filepaths.pokeapi_filepaths.pokeapi_moves_filepath).parent / "cache"
+# このステータスのときは時間をおいて再試行する
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class PokeapiError(Exception):
+    pass
+
+
+class Resource:
+    """PokeAPIのJSONを、pokebaseのオブジェクトと同じように属性で読めるようにする。"""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict) -> None:
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+        return _wrap(value)
+
+
+def _wrap(value: Any) -> Any:
+    if isinstance(value, dict):
+        return Resource(value)
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+
+class RateLimiter:
+    """リクエストを始める間隔を1 / requests_per_second秒以上にする。"""
+
+    def __init__(self, requests_per_second: float) -> None:
+        self.min_interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.next_time > now:
+                await asyncio.sleep(self.next_time - now)
+                now = self.next_time
+            self.next_time = now + self.min_interval
+
+
+@dataclass(eq=False)
+class CacheEntry:
+    url: str
+    content: str
+    """ 本体のsha256。objects/<content>.json に保存される。 """
+    etag: str | None
+    last_modified: str | None
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, mode="wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class ResourceCache:
+    """URLからJSONを引くディスク上のキャッシュ。
+
+    本体は内容のsha256をファイル名にして objects/ に保存し、同じ内容は1つのファイルにまとめる。
+    URLごとに urls/<URLのsha256>.json に本体の名前とETag、Last-Modifiedを記録し、次に取得するときの条件付きリクエストに使う。
+    """
+
+    def __init__(self, cache_dir: PathLike | str) -> None:
+        self.objects_dir = Path(cache_dir) / "objects"
+        self.urls_dir = Path(cache_dir) / "urls"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.urls_dir.mkdir(parents=True, exist_ok=True)
+
+    def _url_path(self, url: str) -> Path:
+        return self.urls_dir / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> CacheEntry | None:
+        """本体が失われているときもNoneを返す。"""
+        try:
+            with open(self._url_path(url), encoding="utf-8") as f:
+                entry = CacheEntry(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+        if entry.url != url or not (self.objects_dir / f"{entry.content}.json").exists():
+            return None
+        return entry
+
+    def load(self, entry: CacheEntry) -> bytes:
+        with open(self.objects_dir / f"{entry.content}.json", mode="rb") as f:
+            return f.read()
+
+    def store(self, url: str, body: bytes, etag: str | None, last_modified: str | None) -> None:
+        content = hashlib.sha256(body).hexdigest()
+        if not (object_path := self.objects_dir / f"{content}.json").exists():
+            _write_atomically(object_path, body)
+        entry = CacheEntry(url, content, etag, last_modified)
+        _write_atomically(self._url_path(url), json.dumps(vars(entry), ensure_ascii=False).encode("utf-8"))
+
+
+class PokeapiClient:
+    """GETしたJSONを返す。http.clientの呼び出しはスレッドで行い、使い終わった接続は(scheme, host)ごとに取っておく。
+
+    取得中のURLを求められたときは、もう一度取得せずにその結果を待つ。取得を終えたURLの本体はClientに残さない。
+    cacheを指定したときは、キャッシュにあるURLをETag、Last-Modifiedによる条件付きリクエストで取得し、304ならキャッシュの本体を使う。
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        concurrency: int = 16,
+        requests_per_second: float = 20,
+        retries: int = 3,
+        timeout: float = 30,
+        cache: ResourceCache | None = None,
+    ) -> None:
+        if retries < 0:
+            raise ValueError(f"retries must be 0 or more: {retries}")
+        self.base_url = base_url
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests_per_second = requests_per_second
+        self.retries = retries
+        self.timeout = timeout
+        self.cache = cache
+        self.idle_connections: dict[tuple[str, str], list[HTTPConnection]] = {}
+        self.rate_limiters: dict[str, RateLimiter] = {}
+        # 取得中のURLのタスク。終わったタスクは取り除く
+        self.pending: dict[str, asyncio.Task[bytes]] = {}
+        # "downloaded"（200）、"not_modified"（304）、"shared"（取得中のものを待った）の回数
+        self.counts: Counter[str] = Counter()
+
+    def close(self) -> None:
+        for connections in self.idle_connections.values():
+            for connection in connections:
+                connection.close()
+        self.idle_connections.clear()
+
+    def _connection(self, scheme: str, netloc: str) -> HTTPConnection:
+        if idle := self.idle_connections.get((scheme, netloc)):
+            return idle.pop()
+        if scheme == "https":
+            return HTTPSConnection(netloc, timeout=self.timeout)
+        return HTTPConnection(netloc, timeout=self.timeout)
+
+    @staticmethod
+    def _get(connection: HTTPConnection, path: str, headers: dict[str, str]) -> tuple[int, Message, bytes]:
+        connection.request(
+            "GET", path, headers={"Accept": "application/json", "Connection": "keep-alive", **headers}
+        )
+        response = connection.getresponse()
+        # 接続を使い回すため、ステータスによらず最後まで読む
+        return response.status, response.headers, response.read()
+
+    async def get_json(self, url: str) -> Any:
+        """urlはbase_urlからの相対パスか、PokeAPIのレスポンスに含まれる絶対URL。
+
+        取得した本体は共有せず、呼び出しごとに新しいオブジェクトを返す。
+        """
+        if url.startswith(DEFAULT_BASE_URL):
+            # 記録したレスポンスを返すサーバーを使うときも、レスポンス中のURLはそのサーバーで解決する
+            url = url.removeprefix(DEFAULT_BASE_URL)
+        url = urljoin(self.base_url, url)
+        if (task := self.pending.get(url)) is None:
+            task = self.pending[url] = asyncio.create_task(self._fetch(url))
+            task.add_done_callback(lambda _: self.pending.pop(url, None))
+        else:
+            self.counts["shared"] += 1
+        return json.loads(await task)
+
+    async def _fetch(self, url: str) -> bytes:
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        entry = self.cache.get(url) if self.cache is not None else None
+        headers: dict[str, str] = {}
+        if entry is not None and entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+        rate_limiter = self.rate_limiters.setdefault(parts.netloc, RateLimiter(self.requests_per_second))
+        for attempt in range(self.retries + 1):
+            async with self.semaphore:
+                await rate_limiter.wait()
+                connection = self._connection(parts.scheme, parts.netloc)
+                try:
+                    status, response_headers, body = await asyncio.to_thread(self._get, connection, path, headers)
+                except (OSError, HTTPException) as e:
+                    connection.close()
+                    error = PokeapiError(f"{url}: {e!r}")
+                else:
+                    self.idle_connections.setdefault((parts.scheme, parts.netloc), []).append(connection)
+                    if status == 304 and entry is not None and self.cache is not None:
+                        self.counts["not_modified"] += 1
+                        return self.cache.load(entry)
+                    if status == 200:
+                        self.counts["downloaded"] += 1
+                        if self.cache is not None:
+                            self.cache.store(url, body, response_headers["ETag"], response_headers["Last-Modified"])
+                        return body
+                    error = PokeapiError(f"{url}: HTTP {status}")
+                    if status not in RETRY_STATUSES:
+                        raise error
+            if attempt < self.retries:
+                # 待っている間は、ほかのURLの取得が同時接続数の枠を使えるようにする
+                await asyncio.sleep(2**attempt)
+        raise error
+
+
+async def fetch_names(client: PokeapiClient, endpoint: str) -> list[str]:
+    """pokebase.APIResourceList(endpoint).namesと同じ順の名前。"""
+    resource_list = await client.get_json(f"{endpoint}/?limit=100000")
+    return [result["name"] for result in resource_list["results"]]
+
+
+async def fetch_pokemon_species(client: PokeapiClient, name: str) -> dict:
+    pokemon_species = await client.get_json(f"pokemon-species/{name}/")
+    pokemons = await asyncio.gather(
+        *(_fetch_pokemon(client, variety["pokemon"]["url"]) for variety in pokemon_species["varieties"])
+    )
+    # pokebaseでは、NamedAPIResourceのname、url以外の属性を読むと取得される。それと同じになるように取得したもので置き換える
+    for variety, pokemon in zip(pokemon_species["varieties"], pokemons):
+        variety["pokemon"] = pokemon
+    return pokeapi_downloader.pokemon_species_dict(Resource(pokemon_species))
+
+
+async def _fetch_pokemon(client: PokeapiClient, url: str) -> dict:
+    pokemon = await client.get_json(url)
+    pokemon["forms"] = list(await asyncio.gather(*(client.get_json(form["url"]) for form in pokemon["forms"])))
+    return pokemon
+
+
+async def fetch_move(client: PokeapiClient, name: str) -> dict:
+    return pokeapi_downloader.move_dict(Resource(await client.get_json(f"move/{name}/")))
+
+
+async def fetch_type(client: PokeapiClient, name: str) -> dict:
+    return pokeapi_downloader.type_dict(Resource(await client.get_json(f"type/{name}/")))
+
+
+async def fetch_ability(client: PokeapiClient, name: str) -> dict:
+    return pokeapi_downloader.ability_dict(Resource(await client.get_json(f"ability/{name}/")))
+
+
+async def download_all(
+    client: PokeapiClient,
+    endpoint: str,
+    fetch: Callable[[PokeapiClient, str], Awaitable[dict]],
+    output_filepath: PathLike | str,
+) -> None:
+    """pokeapi_downloader.download_all()と同じ。取得した順にジャーナルに追記し、中断したときは次に呼んだときに続きから取得する。"""
+    names = await fetch_names(client, endpoint)
+    records, journal = pokeapi_downloader.open_journal(output_filepath)
+
+    async def fetch_one(i: int, name: str) -> None:
+        records[name] = await fetch(client, name)
+        pokeapi_downloader.append_to_journal(journal, name, records[name])
+        print(f"{i}: {name} downloaded", flush=True)
+
+    with journal:
+        try:
+            # 1つでも失敗したら残りを取り消してから閉じる
+            async with asyncio.TaskGroup() as task_group:
+                for i, name in enumerate(names, 1):
+                    if name not in records:
+                        task_group.create_task(fetch_one(i, name))
+        finally:
+            if len(records) < len(names):
+                print(f"{endpoint}: {len(records)}/{len(names)} downloaded. Run again to resume", flush=True)
+    pokeapi_downloader.save_to_json_atomically([records[name] for name in names], output_filepath)
+
+
+async def download_everything(client: PokeapiClient, pokeapi_filepaths: PokeapiFilepaths) -> None:
+    try:
+        await download_all(
+            client, "pokemon-species", fetch_pokemon_species, pokeapi_filepaths.pokeapi_pokemon_species_filepath
+        )
+        await download_all(client, "move", fetch_move, pokeapi_filepaths.pokeapi_moves_filepath)
+        await download_all(client, "type", fetch_type, pokeapi_filepaths.pokeapi_types_filepath)
+        await download_all(client, "ability", fetch_ability, pokeapi_filepaths.pokeapi_abilities_filepath)
+        pokeapi_downloader.remove_journals(vars(pokeapi_filepaths).values())
+    finally:
+        client.close()
+        print(", ".join(f"{key}: {count}" for key, count in sorted(client.counts.items())), flush=True)
+
+
+async def refresh_all(
+    client: PokeapiClient,
+    endpoint: str,
+    fetch: Callable[[PokeapiClient, str], Awaitable[dict]],
+    output_filepath: PathLike | str,
+    revalidate: bool = True,
+) -> tuple[dict[str, dict], dict[str, dict]]:
+    """output_filepathのダンプにPokeAPIの今の内容を反映し、(書き換える前のもの, 増えたものと変わったもの)をnameから引く辞書で返す。
+
+    APIResourceListにあってダンプにないものを取得する。revalidateのときはダンプにあるものも取得し直して比べる。
+    キャッシュにあるものは条件付きリクエストで確かめるだけで済む。APIResourceListからなくなったものはダンプに残す。
+    """
+    names = await fetch_names(client, endpoint)
+    previous_records = {record["name"]: record for record in pokeapi_downloader.load_pokeapi_data_json(output_filepath)}
+    fetched: dict[str, dict] = {}
+
+    async def fetch_one(name: str) -> None:
+        fetched[name] = await fetch(client, name)
+
+    async with asyncio.TaskGroup() as task_group:
+        for name in names:
+            if revalidate or name not in previous_records:
+                task_group.create_task(fetch_one(name))
+    updated = {name: record for name, record in fetched.items() if record != previous_records.get(name)}
+    removed_names = [name for name in previous_records if name not in fetched and name not in names]
+    if len(updated) > 0:
+        pokeapi_downloader.save_to_json_atomically(
+            [
+                *(fetched.get(name) or previous_records[name] for name in names),
+                *(previous_records[name] for name in removed_names),
+            ],
+            output_filepath,
+        )
+    added_count = sum(name not in previous_records for name in updated)
+    print(
+        f"{endpoint}: {added_count} added, {len(updated) - added_count} changed,",
+        f"{len(removed_names)} removed from PokeAPI",
+        flush=True,
+    )
+    return previous_records, updated
+
+
+def refresh_names_file(
+    endpoint: str, previous_records: dict[str, dict], updated: dict[str, dict], names_filepath: PathLike | str
+) -> None:
+    """updatedのうち、names_filepathにないものを追加し、手で編集されていないものを作り直す。"""
+    data: list[pokemon_data.NameExtended] = []
+    previous_data: list[pokemon_data.NameExtended] = []
+    for name, record in updated.items():
+        if record["jp_name"] is None:
+            print(f"{names_filepath}: {name} has no japanese name. Add it by hand", flush=True)
+            continue
+        data += pokemon_data.initial_name_extended_data(endpoint, record)
+        if (previous_record := previous_records.get(name)) is not None and previous_record["jp_name"] is not None:
+            previous_data += pokemon_data.initial_name_extended_data(endpoint, previous_record)
+    for name in pokemon_data.patch_names_file(names_filepath, data, previous_data):
+        print(f"{names_filepath}: {name} is edited by hand and left as is", flush=True)
+
+
+async def refresh_everything(
+    client: PokeapiClient,
+    pokeapi_filepaths: PokeapiFilepaths,
+    names_filepaths: NamesFilepaths,
+    revalidate: bool = True,
+) -> None:
+    targets = [
+        (
+            "pokemon-species",
+            fetch_pokemon_species,
+            pokeapi_filepaths.pokeapi_pokemon_species_filepath,
+            names_filepaths.pokemon_names_filepath,
+        ),
+        ("move", fetch_move, pokeapi_filepaths.pokeapi_moves_filepath, names_filepaths.move_names_filepath),
+        ("type", fetch_type, pokeapi_filepaths.pokeapi_types_filepath, names_filepaths.type_names_filepath),
+        (
+            "ability",
+            fetch_ability,
+            pokeapi_filepaths.pokeapi_abilities_filepath,
+            names_filepaths.ability_names_filepath,
+        ),
+    ]
+    try:
+        for endpoint, fetch, output_filepath, names_filepath in targets:
+            previous_records, updated = await refresh_all(client, endpoint, fetch, output_filepath, revalidate)
+            refresh_names_file(endpoint, previous_records, updated, names_filepath)
+    finally:
+        client.close()
+        print(", ".join(f"{key}: {count}" for key, count in sorted(client.counts.items())), flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="同時に行うリクエストの数")
+    parser.add_argument("--rps", type=float, default=20, help="ホストごとの1秒あたりのリクエストの数。0で制限しない")
+    parser.add_argument("--cache-dir", default=default_cache_dir, help="ディスク上のキャッシュの場所")
+    parser.add_argument("--no-cache", action="store_true", help="ディスク上のキャッシュを使わない")
+    parser.add_argument("--refresh", action="store_true", help="今あるダンプと*_names.jsonに、増えたものと変わったものを反映する")
+    parser.add_argument("--new-only", action="store_true", help="--refreshで、ダンプにあるものを取得し直さない")
+    args = parser.parse_args()
+    cache = ResourceCache(args.cache_dir) if not args.no_cache else None
+    client = PokeapiClient(args.base_url, args.concurrency, args.rps, cache=cache)
+    if args.refresh:
+        asyncio.run(
+            refresh_everything(
+                client,
+                default_input_filepaths.pokeapi_filepaths,
+                default_input_filepaths.names_filepaths,
+                revalidate=not args.new_only,
+            )
+        )
+    else:
+        asyncio.run(download_everything(client, default_input_filepaths.pokeapi_filepaths))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,20 @@ from input_filepaths import default_input_filepaths
 # NamedAPIResource (Pokemon) などは、pokebaseの出力ではPokemonと同じメンバをもつオブジェクトとして使える。nameとurlはapiアクセス無しで読み出せて、他のメンバはapiアクセスして読み出すと思われる。（ただしAPIResourceListでイテレートできる対象は、NamedAPIResourceではなく、nameとidのみ取り出せる）
 
 def download_pokemon_species(pokemon_species_name) -> dict:
-    pokemon_species = pokebase.pokemon_species(pokemon_species_name)
+    return pokemon_species_dict(pokebase.pokemon_species(pokemon_species_name))
+
+def download_move(move_name) -> dict:
+    return move_dict(pokebase.move(move_name))
+
+def download_type(type_name) -> dict:
+    return type_dict(pokebase.type_(type_name))
+
+def download_ability(ability_name) -> dict:
+    return ability_dict(pokebase.ability(ability_name))
+
+# 以下の*_dict()はpokebaseのオブジェクトの属性だけを読むため、同じ属性を持つオブジェクト（pokeapi_async_downloader.Resource）にも使える。
+
+def pokemon_species_dict(pokemon_species) -> dict:
     return {
         "id": pokemon_species.id,
         "name": pokemon_species.name,
@@ -23,8 +36,7 @@ def download_pokemon_species(pokemon_species_name) -> dict:
         "varieties": list(map(pokemon_species_variety_dict, pokemon_species.varieties))
     }
 
-def download_move(move_name) -> dict:
-    move = pokebase.move(move_name)
+def move_dict(move) -> dict:
     return {
         "id": move.id,
         "name": move.name,
@@ -37,8 +49,7 @@ def download_move(move_name) -> dict:
         "type.name": move.type.name
     }
 
-def download_type(type_name) -> dict:
-    type_ = pokebase.type_(type_name)
+def type_dict(type_) -> dict:
     return {
         "id": type_.id,
         "name": type_.name,
@@ -46,8 +57,7 @@ def download_type(type_name) -> dict:
         "jp_name": get_jp_name(type_.names)
     }
 
-def download_ability(ability_name) -> dict:
-    ability = pokebase.ability(ability_name)
+def ability_dict(ability) -> dict:
     return {
         "id": ability.id,
         "name": ability.name,
@@ -134,58 +144,63 @@ def type_relations_dict(type_relations) -> dict:
 
 # APIResourceListの引数は https://pokeapi.co/docs/v2#pokemon-species のGETのところに書かれているURL内のendopointを表す文字列である。
 def download_all_pokemon_species(output_filepath, start_from=1) -> None:
-    if os.path.exists(output_filepath):
-        raise Exception
-    data = []
-    try:
-        for i, name in enumerate(pokebase.APIResourceList("pokemon-species").names, 1):
-            if i < start_from:
-                continue
-            print(f"{i}: {name} ", end="", flush=True)
-            data.append(download_pokemon_species(name))
-            print("downloaded", flush=True)
-    finally:
-        save_to_json(data, output_filepath)
+    download_all("pokemon-species", download_pokemon_species, output_filepath, start_from)
 
 def download_all_moves(output_filepath, start_from=1) -> None:
-    if os.path.exists(output_filepath):
-        raise Exception
-    data = []
-    try:
-        for i, name in enumerate(pokebase.APIResourceList("move").names, 1):
-            if i < start_from:
-                continue
-            print(f"{i}: {name} ", end="", flush=True)
-            data.append(download_move(name))
-            print("downloaded", flush=True)
-    finally:
-        save_to_json(data, output_filepath)
+    download_all("move", download_move, output_filepath, start_from)
 
 def download_all_types(output_filepath) -> None:
-    if os.path.exists(output_filepath):
-        raise Exception
-    data = []
-    try:
-        for i, name in enumerate(pokebase.APIResourceList("type").names):
-            print(f"{i}: {name} ", end="", flush=True)
-            data.append(download_type(name))
-            print("downloaded", flush=True)
-    finally:
-        save_to_json(data, output_filepath)
+    download_all("type", download_type, output_filepath)
 
 def download_all_abilities(output_filepath, start_from=1) -> None:
-    if os.path.exists(output_filepath):
-        raise Exception
-    data = []
-    try:
-        for i, name in enumerate(pokebase.APIResourceList("ability").names, 1):
-            if i < start_from:
+    download_all("ability", download_ability, output_filepath, start_from)
+
+# 取得したものは1件ずつジャーナル（<出力先>.journal.jsonl）に追記する。中断したときは同じ関数をもう一度呼べば、ジャーナルにあるものを飛ばして続きから取得する。
+# すべて取得できたら一時ファイルに書いてから出力先に置き換えるため、出力先が途中までの内容になることはない。
+# start_fromより前の番号のものは取得せず、出力先にも含めない。
+# ジャーナルはmain()の最後にremove_journals()で消す。それまでは書き出し済みのファイルのジャーナルも残し、中断したmain()をやり直したときに取得し直さないようにする。
+
+def download_all(endpoint, download, output_filepath, start_from=1) -> None:
+    names = pokebase.APIResourceList(endpoint).names
+    records, journal = open_journal(output_filepath)
+    with journal:
+        for i, name in enumerate(names, 1):
+            if i < start_from or name in records:
                 continue
             print(f"{i}: {name} ", end="", flush=True)
-            data.append(download_ability(name))
+            records[name] = download(name)
+            append_to_journal(journal, name, records[name])
             print("downloaded", flush=True)
-    finally:
-        save_to_json(data, output_filepath)
+    save_to_json_atomically([records[name] for name in names[start_from - 1:]], output_filepath)
+
+def journal_filepath(output_filepath: PathLike | str) -> str:
+    return f"{os.fspath(output_filepath)}.journal.jsonl"
+
+def open_journal(output_filepath: PathLike | str):
+    """ジャーナルを読んで追記用に開き、(nameから取得済みのものへの辞書, ファイル)を返す。書き込みの途中で中断した最後の行は捨てる。"""
+    filepath = journal_filepath(output_filepath)
+    records = {}
+    size = 0
+    if os.path.exists(filepath):
+        with open(filepath, mode="rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                records[entry["name"]] = entry["record"]
+                size += len(line)
+    journal = open(filepath, mode="ab")
+    journal.truncate(size)
+    return records, journal
+
+def append_to_journal(journal, name: str, record: dict) -> None:
+    journal.write(json.dumps({"name": name, "record": record}, ensure_ascii=False).encode("utf-8") + b"\n")
+    journal.flush()
+
+def remove_journals(output_filepaths) -> None:
+    for output_filepath in output_filepaths:
+        if os.path.exists(filepath := journal_filepath(output_filepath)):
+            os.remove(filepath)
 
 def get_jp_name(names) -> dict | None:
     # "ja-Hrkt" はひらがなカタカナ、"ja" は漢字？
@@ -201,6 +216,11 @@ def save_to_json(data, output_filepath: PathLike | str) -> None:
     with open(output_filepath, mode="w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
+def save_to_json_atomically(data, output_filepath: PathLike | str) -> None:
+    temp_filepath = f"{os.fspath(output_filepath)}.tmp"
+    save_to_json(data, temp_filepath)
+    os.replace(temp_filepath, output_filepath)
+
 def load_pokeapi_data_json(input_filepath: PathLike | str) -> list[dict]:
     with open(input_filepath, encoding="utf-8") as f:
         return json.load(f)
@@ -210,6 +230,7 @@ def main() -> None:
     download_all_moves(default_input_filepaths.pokeapi_filepaths.pokeapi_moves_filepath)
     download_all_types(default_input_filepaths.pokeapi_filepaths.pokeapi_types_filepath)
     download_all_abilities(default_input_filepaths.pokeapi_filepaths.pokeapi_abilities_filepath)
+    remove_journals(vars(default_input_filepaths.pokeapi_filepaths).values())
 
 if __name__ == "__main__":
     main()
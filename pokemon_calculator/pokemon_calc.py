@@ -1,12 +1,17 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from pokemon_data import Pokemon, Move, Ability, Type, Item, State, NameExtended, AllData, Stats
-from typing import Iterable, Self, Literal, Protocol
+from typing import Iterable, Iterator, Self, Literal, Protocol, TextIO
+from array import array
+import argparse
+import csv
+import json
 import math
 import copy
 
-import pokemon_data
 import input_processor
+import profiler
+import query_history
 from input_filepaths import default_input_filepaths, InputFilepaths
 
 
@@ -117,14 +122,74 @@ class InputArgs:
 
 
 class Damage:
+    __slots__ = ("damages",)
+
     def __init__(self, damages: Iterable[int]) -> None:
-        self.damages: list[int] = list(damages)
-        self.min: int = self.damages[0]
-        self.max: int = self.damages[-1]
-        self.average: float = sum(self.damages) / len(self.damages)
+        self.damages: tuple[int, ...] = tuple(damages)
+
+    @property
+    def min(self) -> int:
+        return self.damages[0]
+
+    @property
+    def max(self) -> int:
+        return self.damages[-1]
+
+    @property
+    def average(self) -> float:
+        return sum(self.damages) / len(self.damages)
+
+
+# Output.to_dict()のキーの順
+OUTPUT_FIELDNAMES = [
+    "attacker",
+    "attacker_ability",
+    "attacker_item",
+    "attacker_rank",
+    "attacker_terasu_type",
+    "attacker_attack",
+    "attacker_doryokuchi",
+    "attacker_kotaichi",
+    "attacker_seikaku_hosei",
+    "move",
+    "defender",
+    "defender_ability",
+    "defender_item",
+    "defender_rank",
+    "defender_terasu_type",
+    "defender_defense",
+    "defender_doryokuchi",
+    "defender_kotaichi",
+    "defender_seikaku_hosei",
+    "defender_hp",
+    "defender_hp_doryokuchi",
+    "defender_hp_kotaichi",
+    "states",
+    "damages",
+    "min_damage_ratio",
+    "max_damage_ratio",
+]
 
 
 class Output:
+    """calc_damage()の結果。割合や文字列は必要になったときに計算する。"""
+
+    __slots__ = (
+        "damage",
+        "attacker_attack",
+        "attacker_doryokuchi",
+        "attacker_kotaichi",
+        "attacker_seikaku_hosei",
+        "defender_defense",
+        "defender_doryokuchi",
+        "defender_kotaichi",
+        "defender_seikaku_hosei",
+        "defender_hp",
+        "defender_hp_doryokuchi",
+        "defender_hp_kotaichi",
+        "input",
+    )
+
     def __init__(
         self,
         damage: Damage,
@@ -153,48 +218,62 @@ class Output:
         self.defender_hp: int = defender_hp
         self.defender_hp_doryokuchi: int = defender_hp_doryokuchi
         self.defender_hp_kotaichi: int = defender_hp_kotaichi
-        self.min_damage_ratio: float = self.damage.min / self.defender_hp
-        self.max_damage_ratio: float = self.damage.max / self.defender_hp
-        self.average_damage_ratio: float = self.damage.average / self.defender_hp
         self.input: Input = input
 
-    def _seikaku_hosei_to_sign(self, seikaku_hosei: float) -> str:
-        if seikaku_hosei == 1.1:
-            return "+"
-        elif seikaku_hosei == 0.9:
-            return "-"
-        else:
-            return "."
+    @property
+    def min_damage_ratio(self) -> float:
+        return self.damage.min / self.defender_hp
+
+    @property
+    def max_damage_ratio(self) -> float:
+        return self.damage.max / self.defender_hp
+
+    @property
+    def average_damage_ratio(self) -> float:
+        return self.damage.average / self.defender_hp
+
+    @property
+    def ko_probability(self) -> float:
+        """満タンのdefenderを1発でひんしにする確率"""
+        damages = self.damage.damages
+        return sum(damage >= self.defender_hp for damage in damages) / len(damages)
 
     def to_str(self) -> str:
-        return " ".join(
-            [
-                f"{self.attacker_attack:>3d}({self.attacker_doryokuchi:>3d}{self._seikaku_hosei_to_sign(self.attacker_seikaku_hosei)})",
-                f"{self.defender_hp:>3d}({self.defender_hp_doryokuchi:>3d})",
-                f"{self.defender_defense:>3d}({self.defender_doryokuchi:>3d}{self._seikaku_hosei_to_sign(self.defender_seikaku_hosei)})",
-                *(f"{damage:>3d}" for damage in reversed(self.damage.damages)),
-                f"{self.max_damage_ratio * 100:>5.1f}~{self.min_damage_ratio * 100:>5.1f}%",
-                f"{self.input.attacker.ability.display_name}@{self.input.attacker.item.display_name if self.input.attacker.item is not None else '*'}{self.input.attacker.rank:>+2d}t{t.display_name if (t := self.input.attacker.terasu_type) is not None else '*'}",
-                f"{self.input.defender.ability.display_name}@{self.input.defender.item.display_name if self.input.defender.item is not None else '*'}{self.input.defender.rank:>+2d}t{t.display_name if (t := self.input.defender.terasu_type) is not None else '*'}",
-                *(f"{state.display_name}" for state in self.input.states),
-            ]
-        )
+        return OutputTable([self]).row_strs()[0]
 
     def hp_bar_str(self) -> str:
-        min_damage_percent = self.min_damage_ratio * 100
-        max_damage_percent = self.max_damage_ratio * 100
-        line_change_points: list[float] = [-1, -1]
-        line_change_points[0] = 100 - max_damage_percent if max_damage_percent < 100 else 0
-        line_change_points[1] = 100 - min_damage_percent if min_damage_percent < 100 else 0
-        line_change_len: list[int] = [
-            round_5_to_up(1 if 0 < point < 1 else point) for point in line_change_points
-        ]  # round_5_to_upはdownよりもダメージを少なく見積もる
-        return (
-            " " * 49
-            + "=" * line_change_len[0]
-            + "-" * (line_change_len[1] - line_change_len[0])
-            + "_" * (100 - line_change_len[1])
-        )
+        return OutputTable([self]).hp_bar_strs()[0]
+
+    def to_dict(self) -> dict:
+        """json等に書き出すための辞書。ポケモン等はdisplay_nameではなくdata.nameで表す。"""
+        return {
+            "attacker": self.input.attacker.pokemon.data.name,
+            "attacker_ability": self.input.attacker.ability.data.name,
+            "attacker_item": self.input.attacker.item.data.name if self.input.attacker.item is not None else None,
+            "attacker_rank": self.input.attacker.rank,
+            "attacker_terasu_type": t.data.name if (t := self.input.attacker.terasu_type) is not None else None,
+            "attacker_attack": self.attacker_attack,
+            "attacker_doryokuchi": self.attacker_doryokuchi,
+            "attacker_kotaichi": self.attacker_kotaichi,
+            "attacker_seikaku_hosei": self.attacker_seikaku_hosei,
+            "move": self.input.move.data.name,
+            "defender": self.input.defender.pokemon.data.name,
+            "defender_ability": self.input.defender.ability.data.name,
+            "defender_item": self.input.defender.item.data.name if self.input.defender.item is not None else None,
+            "defender_rank": self.input.defender.rank,
+            "defender_terasu_type": t.data.name if (t := self.input.defender.terasu_type) is not None else None,
+            "defender_defense": self.defender_defense,
+            "defender_doryokuchi": self.defender_doryokuchi,
+            "defender_kotaichi": self.defender_kotaichi,
+            "defender_seikaku_hosei": self.defender_seikaku_hosei,
+            "defender_hp": self.defender_hp,
+            "defender_hp_doryokuchi": self.defender_hp_doryokuchi,
+            "defender_hp_kotaichi": self.defender_hp_kotaichi,
+            "states": [state.data.name for state in self.input.states],
+            "damages": list(self.damage.damages),
+            "min_damage_ratio": self.min_damage_ratio,
+            "max_damage_ratio": self.max_damage_ratio,
+        }
 
     def header_str(self) -> str:
         return " ".join(
@@ -210,6 +289,168 @@ class Output:
         )
 
 
+class OutputTable:
+    """複数のOutputを列ごとに持つ。多くの行をまとめて整形したり、JSON LinesやCSVに書き出したりするときに使う。
+
+    数値の列はarrayで持ち、文字列は行を整形するときに初めて作る。同じBattlePokemonやダメージの組から作る文字列は一度だけ作る。
+    """
+
+    __slots__ = (
+        "damages",
+        "attacker_attack",
+        "attacker_doryokuchi",
+        "attacker_kotaichi",
+        "attacker_seikaku_hosei",
+        "defender_defense",
+        "defender_doryokuchi",
+        "defender_kotaichi",
+        "defender_seikaku_hosei",
+        "defender_hp",
+        "defender_hp_doryokuchi",
+        "defender_hp_kotaichi",
+        "inputs",
+    )
+
+    def __init__(self, outputs: Iterable[Output]) -> None:
+        outputs = list(outputs)
+        self.damages: list[tuple[int, ...]] = [output.damage.damages for output in outputs]
+        self.attacker_attack = array("i", (output.attacker_attack for output in outputs))
+        self.attacker_doryokuchi = array("i", (output.attacker_doryokuchi for output in outputs))
+        self.attacker_kotaichi = array("i", (output.attacker_kotaichi for output in outputs))
+        self.attacker_seikaku_hosei = array("d", (output.attacker_seikaku_hosei for output in outputs))
+        self.defender_defense = array("i", (output.defender_defense for output in outputs))
+        self.defender_doryokuchi = array("i", (output.defender_doryokuchi for output in outputs))
+        self.defender_kotaichi = array("i", (output.defender_kotaichi for output in outputs))
+        self.defender_seikaku_hosei = array("d", (output.defender_seikaku_hosei for output in outputs))
+        self.defender_hp = array("i", (output.defender_hp for output in outputs))
+        self.defender_hp_doryokuchi = array("i", (output.defender_hp_doryokuchi for output in outputs))
+        self.defender_hp_kotaichi = array("i", (output.defender_hp_kotaichi for output in outputs))
+        self.inputs: list[Input] = [output.input for output in outputs]
+
+    def __len__(self) -> int:
+        return len(self.inputs)
+
+    def __getitem__(self, i: int) -> Output:
+        return Output(
+            Damage(self.damages[i]),
+            self.attacker_attack[i],
+            self.attacker_doryokuchi[i],
+            self.attacker_kotaichi[i],
+            self.attacker_seikaku_hosei[i],
+            self.defender_defense[i],
+            self.defender_doryokuchi[i],
+            self.defender_kotaichi[i],
+            self.defender_seikaku_hosei[i],
+            self.defender_hp[i],
+            self.defender_hp_doryokuchi[i],
+            self.defender_hp_kotaichi[i],
+            self.inputs[i],
+        )
+
+    def row_strs(self, rows: Iterable[int] | None = None) -> list[str]:
+        """Output.to_str()と同じ文字列を、rowsで指定した行（省略時はすべての行）について返す。"""
+        signs = {1.1: "+", 0.9: "-"}
+        damages_formats: dict[int, str] = {}
+        battle_pokemon_strs: dict[int, str] = {}
+        state_strs: dict[int, str] = {}
+
+        def battle_pokemon_str(battle_pokemon: BattlePokemon) -> str:
+            # 展開された入力の多くは同じBattlePokemonを共有している
+            if (s := battle_pokemon_strs.get(id(battle_pokemon))) is None:
+                item = battle_pokemon.item.display_name if battle_pokemon.item is not None else "*"
+                terasu_type = t.display_name if (t := battle_pokemon.terasu_type) is not None else "*"
+                s = f"{battle_pokemon.ability.display_name}@{item}{battle_pokemon.rank:>+2d}t{terasu_type}"
+                battle_pokemon_strs[id(battle_pokemon)] = s
+            return s
+
+        strs: list[str] = []
+        for i in range(len(self)) if rows is None else rows:
+            input = self.inputs[i]
+            damages = self.damages[i]
+            if (damages_format := damages_formats.get(len(damages))) is None:
+                damages_format = damages_formats[len(damages)] = " ".join(["%3d"] * len(damages))
+            if (states_str := state_strs.get(id(input.states))) is None:
+                states_str = state_strs[id(input.states)] = "".join(
+                    f" {state.display_name}" for state in input.states
+                )
+            hp = self.defender_hp[i]
+            strs.append(
+                "%3d(%3d%s) %3d(%3d) %3d(%3d%s) %s %5.1f~%5.1f%% %s %s%s"
+                % (
+                    self.attacker_attack[i],
+                    self.attacker_doryokuchi[i],
+                    signs.get(self.attacker_seikaku_hosei[i], "."),
+                    hp,
+                    self.defender_hp_doryokuchi[i],
+                    self.defender_defense[i],
+                    self.defender_doryokuchi[i],
+                    signs.get(self.defender_seikaku_hosei[i], "."),
+                    damages_format % damages[::-1],
+                    damages[-1] / hp * 100,
+                    damages[0] / hp * 100,
+                    battle_pokemon_str(input.attacker),
+                    battle_pokemon_str(input.defender),
+                    states_str,
+                )
+            )
+        return strs
+
+    def hp_bar_strs(self, rows: Iterable[int] | None = None) -> list[str]:
+        """Output.hp_bar_str()と同じ文字列を、rowsで指定した行（省略時はすべての行）について返す。"""
+        hp_bar_strs: dict[tuple[int, int, int], str] = {}
+        strs: list[str] = []
+        for i in range(len(self)) if rows is None else rows:
+            key = (self.damages[i][0], self.damages[i][-1], self.defender_hp[i])
+            if (s := hp_bar_strs.get(key)) is None:
+                min_damage_percent = key[0] / key[2] * 100
+                max_damage_percent = key[1] / key[2] * 100
+                line_change_points: list[float] = [-1, -1]
+                line_change_points[0] = 100 - max_damage_percent if max_damage_percent < 100 else 0
+                line_change_points[1] = 100 - min_damage_percent if min_damage_percent < 100 else 0
+                line_change_len: list[int] = [
+                    round_5_to_up(1 if 0 < point < 1 else point) for point in line_change_points
+                ]  # round_5_to_upはdownよりもダメージを少なく見積もる
+                s = hp_bar_strs[key] = (
+                    " " * 49
+                    + "=" * line_change_len[0]
+                    + "-" * (line_change_len[1] - line_change_len[0])
+                    + "_" * (100 - line_change_len[1])
+                )
+            strs.append(s)
+        return strs
+
+    def render(self, rows: Iterable[int] | None = None, hp_bar: bool = True) -> str:
+        """対話モードで表示する文字列（ヘッダーを除く）。"""
+        rows = range(len(self)) if rows is None else list(rows)
+        row_strs = self.row_strs(rows)
+        if not hp_bar:
+            return "\n".join(row_strs)
+        return "\n".join(s for pair in zip(row_strs, self.hp_bar_strs(rows)) for s in pair)
+
+    def to_dicts(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self[i].to_dict()
+
+    def write_json_lines(self, f: TextIO) -> None:
+        write_json_lines(self.to_dicts(), f)
+
+    def write_csv(self, f: TextIO) -> None:
+        write_csv(self.to_dicts(), f, OUTPUT_FIELDNAMES)
+
+
+def write_json_lines(records: Iterable[dict], f: TextIO) -> None:
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_csv(records: Iterable[dict], f: TextIO, fieldnames: list[str]) -> None:
+    """リストの値（damages、statesなど）は空白区切りの1列にする。recordにないキーの列は空欄になる。"""
+    writer = csv.DictWriter(f, fieldnames, lineterminator="\n")
+    writer.writeheader()
+    for record in records:
+        writer.writerow({key: " ".join(map(str, v)) if isinstance(v, list) else v for key, v in record.items()})
+
+
 def calc_nouryokuchi(shuzokuchi: int, doryokuchi: int, kotaichi: int, seikaku_hosei: float, level: int) -> int:
     return math.floor(
         math.floor(math.floor(shuzokuchi * 2 + kotaichi + doryokuchi / 4) * level / 100 + 5) * seikaku_hosei
@@ -294,11 +535,16 @@ def get_seikaku_hosei(seikaku_hosei: SeikakuHosei, stat_str: Literal["a", "b", "
         return 1
 
 
+# 特殊技だが、defenderのぼうぎょで計算する技（サイコショック、サイコブレイク、しんぴのつるぎ）
+PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES = ["psyshock", "psystrike", "secret-sword"]
+
+
 # fmt: off
 def calc_damage(input: Input, all_data: AllData) -> Output:
     # この関数は以下のページの計算の再現である。ページの内容との対応関係を明確にする、かつ、計算の自由度を最大限に保つ（例えば、防御側のこうげき値を使ってダメージを計算する技、イカサマがある）ため、意図的に関数への分離や抽象化を行っていない。
     # https://latest.pokewiki.net/%E3%83%80%E3%83%A1%E3%83%BC%E3%82%B8%E8%A8%88%E7%AE%97%E5%BC%8F
 
+    lap = profiler.lap_timer("calc_damage")  # 無効のときは何もしない
     attacker: BattlePokemon = input.attacker
     defender: BattlePokemon = input.defender
     move: Move = input.move.data
@@ -343,8 +589,9 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
         move_type_damgage_multiplier: float = all_data.types[move_type_name].data.damage_multiplier_to(defender_type_names)
     else:
         move_type_damgage_multiplier: float = 2
+    lap("type")
 
-    if move_name == "psyshock": # サイコショック
+    if move_name in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES: # サイコショックなど
         attacker_shuzokuchi = attacker.pokemon.data.stats.c
         attacker_doryokuchi = attacker.doryokuchi if attacker.all_doryokuchi is None else attacker.all_doryokuchi.c
         attacker_kotaichi = attacker.kotaichi if attacker.all_kotaichi is None else attacker.all_kotaichi.c
@@ -393,6 +640,7 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
         raise Exception(f"Invalid damage_class: {move_damage_class}")
     attacker_attack: int = calc_nouryokuchi(attacker_shuzokuchi, attacker_doryokuchi, attacker_kotaichi, attacker_seikaku_hosei, attacker.level)
     defender_defense: int = calc_nouryokuchi(defender_shuzokuchi, defender_doryokuchi, defender_kotaichi, defender_seikaku_hosei, defender.level)
+    lap("stat")
 
     iryoku_hoseichi = Hoseichi()
     if defender_ability_name == "aura-break" and attacker_ability_name == "dark-aura" and move_type_name == "dark": # オーラブレイク
@@ -537,10 +785,11 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
     if move_name == "infernal-parade" and "ひゃっきやこう強化" in state_names: # ひゃっきやこうもwikiに記載なし
         move_power *= 2
 
-    final_iryoku = round_5_to_down(move_power * iryoku_hoseichi.hoseichi / 4096)
+    final_iryoku = mul_round_5_to_down(move_power, iryoku_hoseichi.hoseichi)
     if final_iryoku < 1:
         final_iryoku = 1
     # テラスタル時の威力60未満補正が適用されない技は、連続技と元から優先度が1以上の技（らしい）。これを実装するにはmove["meta"]の不足分の追記と優先度のデータ取得が必要。
+    lap("iryoku_hoseichi")
 
     attack_hoseichi = Hoseichi()
     if attacker_ability_name == "slow-start" and "スロースタート中" in state_names and move_damage_class == "physical":
@@ -616,15 +865,16 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
 
     final_attack = math.floor(attacker_attack * rank_multiplier(attacker.rank))
     if attacker_ability_name == "hustle": # はりきり
-        final_attack = math.floor(final_attack * 6144 / 4096)
-    final_attack = round_5_to_down(final_attack * attack_hoseichi.hoseichi / 4096)
+        final_attack = final_attack * 6144 >> 12
+    final_attack = mul_round_5_to_down(final_attack, attack_hoseichi.hoseichi)
     if final_attack < 1:
         final_attack = 1
+    lap("attack_hoseichi")
 
     defense_hoseichi = Hoseichi()
-    if attacker_ability_name == "beads-of-ruin" and move_damage_class == "special" and move_name != "psyshock": # わざわいのたま
+    if attacker_ability_name == "beads-of-ruin" and move_damage_class == "special" and move_name not in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES: # わざわいのたま
         defense_hoseichi.hosei(3072)
-    if attacker_ability_name == "sword-of-ruin" and move_damage_class == "physical" or move_name == "psyshock": # わざわいのつるぎ
+    if attacker_ability_name == "sword-of-ruin" and (move_damage_class == "physical" or move_name in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES): # わざわいのつるぎ
         defense_hoseichi.hosei(3072)
     if "ブーストエナジー等耐久強化" in state_names and defender_ability_name in ["quark-drive", "protosynthesis"]: # クォークチャージ、こだいかっせい
         defense_hoseichi.hosei(5325)
@@ -638,7 +888,7 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
         defense_hoseichi.hosei(8192)
     if defender_item_name == "しんかのきせき":
         defense_hoseichi.hosei(6144)
-    if defender_item_name == "とつげきチョッキ" and move_damage_class == "special" and move_name != "psyshock":
+    if defender_item_name == "とつげきチョッキ" and move_damage_class == "special" and move_name not in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES:
         defense_hoseichi.hosei(6144)
     if defender_item_name == "しんかいのウロコ" and move_damage_class == "special":
         defense_hoseichi.hosei(8192)
@@ -646,13 +896,14 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
         defense_hoseichi.hosei(8192)
 
     final_defense = math.floor(defender_defense * rank_multiplier(defender.rank))
-    if "すなあらし" in state_names and "rock" in defender_type_names and move_damage_class == "special" and move_name != "psyshock":
-        final_defense = math.floor(final_defense * 6144 / 4096)
+    if "すなあらし" in state_names and "rock" in defender_type_names and move_damage_class == "special" and move_name not in PHYSICAL_DEFENSE_SPECIAL_MOVE_NAMES:
+        final_defense = final_defense * 6144 >> 12
     if "ゆき" in state_names and "ice" in defender_type_names and move_damage_class == "physical":
-        final_defense = math.floor(final_defense * 6144 / 4096)
-    final_defense = round_5_to_down(final_defense * defense_hoseichi.hoseichi / 4096)
+        final_defense = final_defense * 6144 >> 12
+    final_defense = mul_round_5_to_down(final_defense, defense_hoseichi.hoseichi)
     if final_defense < 1:
         final_defense = 1
+    lap("defense_hoseichi")
 
     damage_hoseichi = Hoseichi()
     if "壁" in state_names:
@@ -713,6 +964,7 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
         damage_hoseichi.hosei(8192)
     if "ダイビング" in state_names and move_name == "surf":
         damage_hoseichi.hosei(8192)
+    lap("damage_hoseichi")
 
     final_damage = math.floor(attacker.level * 2 / 5 + 2)
     final_damage = math.floor(final_damage * final_iryoku * final_attack / final_defense)
@@ -794,11 +1046,47 @@ def calc_damage(input: Input, all_data: AllData) -> Output:
     defender_hp_doryokuchi = input.hp_doryokuchi if defender.all_doryokuchi is None else defender.all_doryokuchi.h
     defender_hp_kotaichi = input.hp_kotaichi if defender.all_kotaichi is None else defender.all_kotaichi.h
     defender_hp = calc_hp(defender.pokemon.data.stats.h, defender_hp_doryokuchi, defender_hp_kotaichi, defender.level)
+    lap("rolls")
     return Output(Damage(final_damages), attacker_attack, attacker_doryokuchi, attacker_kotaichi, attacker_seikaku_hosei, defender_defense, defender_doryokuchi, defender_kotaichi, defender_seikaku_hosei, defender_hp, defender_hp_doryokuchi, defender_hp_kotaichi, input)
 
 # fmt: on
 
 
+def calc_damages(inputs: Iterable[Input], all_data: AllData) -> list[Output]:
+    """各inputのcalc_damage()の結果を返す。
+
+    ダメージはHPの努力値、個体値によらないため、attacker、defender、move、statesが同じオブジェクトであるinputについては、ダメージを1回だけ計算してHPだけを計算し直す。
+    """
+    outputs: list[Output] = []
+    # outputsがinputへの参照を持つため、keyのidが使い回されることはない
+    calculated: dict[tuple[int, int, int, int], Output] = {}
+    for input in inputs:
+        key = (id(input.attacker), id(input.defender), id(input.move), id(input.states))
+        if (output := calculated.get(key)) is None:
+            output = calculated[key] = calc_damage(input, all_data)
+        else:
+            defender = input.defender
+            hp_doryokuchi = input.hp_doryokuchi if defender.all_doryokuchi is None else defender.all_doryokuchi.h
+            hp_kotaichi = input.hp_kotaichi if defender.all_kotaichi is None else defender.all_kotaichi.h
+            output = Output(
+                output.damage,
+                output.attacker_attack,
+                output.attacker_doryokuchi,
+                output.attacker_kotaichi,
+                output.attacker_seikaku_hosei,
+                output.defender_defense,
+                output.defender_doryokuchi,
+                output.defender_kotaichi,
+                output.defender_seikaku_hosei,
+                calc_hp(defender.pokemon.data.stats.h, hp_doryokuchi, hp_kotaichi, defender.level),
+                hp_doryokuchi,
+                hp_kotaichi,
+                input,
+            )
+        outputs.append(output)
+    return outputs
+
+
 def rank_multiplier(rank: int) -> float:
     if rank >= 0:
         return (2 + rank) / 2
@@ -1187,8 +1475,8 @@ def is_hadou(move: Move) -> bool:
 class Hoseichi:
     hoseichi: int = 4096
 
-    def hosei(self, value) -> None:
-        self.hoseichi = round_5_to_up(self.hoseichi * value / 4096)
+    def hosei(self, value: int) -> None:
+        self.hoseichi = mul_round_5_to_up(self.hoseichi, value)
 
 
 @dataclass
@@ -1197,13 +1485,13 @@ class FinalDamageCalc:
 
     def hosei(self, value: int) -> None:
         if isinstance(self.damage, int):
-            self.damage = round_5_to_down(self.damage * value / 4096)
+            self.damage = mul_round_5_to_down(self.damage, value)
         else:
-            self.damage = [round_5_to_down(damage * value / 4096) for damage in self.damage]
+            self.damage = mul_round_5_to_down_list(self.damage, value)
 
     def ransuu(self) -> None:
         if isinstance(self.damage, int):
-            self.damage = [math.floor(self.damage * r / 100) for r in range(85, 101)]
+            self.damage = [self.damage * r // 100 for r in range(85, 101)]
         else:
             raise Exception
 
@@ -1230,25 +1518,59 @@ def round_5_to_down(x) -> int:
         return floor_x + 1
 
 
+def mul_round_5_to_up(x: int, value: int) -> int:
+    """round_5_to_up(x * value / 4096) を整数演算だけで求める。"""
+    return (x * value + 2048) >> 12
+
+
+def mul_round_5_to_down(x: int, value: int) -> int:
+    """round_5_to_down(x * value / 4096) を整数演算だけで求める。"""
+    return (x * value + 2047) >> 12
+
+
+def mul_round_5_to_down_list(xs: list[int], value: int) -> list[int]:
+    """xsのそれぞれにmul_round_5_to_down()を適用する。"""
+    return [mul_round_5_to_down(x, value) for x in xs]
+
+
 def main(input_filepaths: InputFilepaths) -> None:
-    all_data = pokemon_data.load_all_data(
-        input_filepaths.pokeapi_filepaths,
-        input_filepaths.names_filepaths,
-        pokemon_data.JpToRomaji(input_filepaths.replacement_filepath),
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true", help="読み込みと計算のたびに、段階ごとの時間を表示する")
+    parser.add_argument(
+        "--auto-select-share",
+        type=float,
+        default=0.8,
+        help="候補のうち、選ばれた記録のスコアがこの割合以上を占めるものは入力を求めずに選ぶ。1より大きくすると常に選ばせる",
     )
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable()
+
+    context = input_processor.load_query_context(input_filepaths)
+    all_data, preset_store, spread_profile = context.all_data, context.preset_store, context.spread_profile
+    compiled_presets = context.compiled_presets
+    history = query_history.QueryHistory(
+        query_history.default_filepath(input_filepaths.preset_filepath), args.auto_select_share
+    )
+    if args.profile:
+        print(profiler.report())
+        profiler.reset()
     while True:
         try:
-            inputs = input_processor.get_inputs_to_calculate(all_data, input_filepaths.preset_filepath)
+            inputs = input_processor.get_inputs_to_calculate(
+                all_data, preset_store, spread_profile, compiled_presets, history
+            )
             if inputs is None:
                 continue
         except input_processor.InvalidInput as e:
             print(e)
             continue
-        outputs = [calc_damage(e, all_data) for e in inputs]
+        outputs = calc_damages(inputs, all_data)
         print(outputs[0].header_str())
-        for output in outputs:
-            print(output.to_str())
-            print(output.hp_bar_str())
+        print(OutputTable(outputs).render())
+        if args.profile:
+            print(profiler.report())
+            profiler.reset()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,24 @@
 from __future__ import annotations
 from collections.abc import Iterable
 from typing import Self, Protocol, Literal
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import itertools
+import heapq
+from bisect import bisect_left
 import os
 import os.path
 from os import PathLike
 import jsonc
 import json
+import hashlib
+import pickle
+import re
+import sys
 from abc import ABC, abstractmethod
 
+import metagame_db
 import pokeapi_downloader
+import profiler
 from input_filepaths import PokeapiFilepaths, NamesFilepaths, default_input_filepaths
 
 
@@ -58,6 +66,139 @@ def retrieve_data[T](data_dict: dict[str, NameExtended[T]], query: str) -> list[
     return [data for data in data_dict.values() if data.match(query)]
 
 
+class NGramIndex[T]:
+    """retrieval_namesのn-gram転置インデックス。前方一致で見つからない入力（タイプミス）に近い候補を探すのに使う。
+
+    queryは名前の途中までしか入力されないことが多いため、距離はqueryと名前の接頭辞との編集距離の最小値で測る。"""
+
+    def __init__(self, data_dict: dict[str, NameExtended[T]], n: int = 2) -> None:
+        self.n = n
+        self.names: list[str] = list(data_dict)
+        self.data: list[NameExtended[T]] = list(data_dict.values())
+        # retrieval_nameごとに (dataの番号, retrieval_name) を持つ。postingsの値はこのリストの番号
+        self.retrieval_names: list[tuple[int, str]] = [
+            (i, retrieval_name) for i, data in enumerate(self.data) for retrieval_name in data.retrieval_names
+        ]
+        self.postings: dict[str, list[int]] = {}
+        for j, (_, retrieval_name) in enumerate(self.retrieval_names):
+            for gram in self._ngrams(retrieval_name):
+                self.postings.setdefault(gram, []).append(j)
+
+    def _ngrams(self, s: str) -> set[str]:
+        # 先頭を"^"で表して、先頭の文字の一致を重視する
+        padded = "^" + s
+        if len(padded) <= self.n:
+            return {padded}
+        return {padded[i : i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def search(self, query: str, k: int = 5, restriction: Iterable[str] | None = None) -> list[NameExtended[T]]:
+        """queryとの距離が最も近いものを最大k個返す。restrictionが指定されたとき、そのnameのデータだけを返す。"""
+        max_distance = max(1, len(query) // 4)
+        query_grams = self._ngrams(query)
+        restriction_set = set(restriction) if restriction is not None else None
+        shared_counts: dict[int, int] = {}
+        for gram in query_grams:
+            for j in self.postings.get(gram, ()):
+                shared_counts[j] = shared_counts.get(j, 0) + 1
+        # 1文字の誤りで一致しなくなるn-gramは高々n個
+        min_shared = len(query_grams) - self.n * max_distance
+        candidates = [
+            (shared, j)
+            for j, shared in shared_counts.items()
+            if shared >= min_shared
+            and (restriction_set is None or self.names[self.retrieval_names[j][0]] in restriction_set)
+        ]
+        # 編集距離は共有するn-gramが多い候補についてだけ計算する
+        best: dict[int, int] = {}
+        for shared, j in heapq.nlargest(4 * k, candidates):
+            i, retrieval_name = self.retrieval_names[j]
+            distance = prefix_edit_distance(query, retrieval_name, max_distance)
+            if distance <= max_distance and distance < best.get(i, max_distance + 1):
+                best[i] = distance
+        if not best:
+            return []
+        min_distance = min(best.values())
+        return [self.data[i] for i in sorted(i for i, distance in best.items() if distance == min_distance)[:k]]
+
+
+def prefix_edit_distance(query: str, name: str, max_distance: int | None = None) -> int:
+    """queryとnameの接頭辞との編集距離の最小値。max_distanceを超えることが確定した時点でmax_distance + 1を返す。"""
+    previous_row = list(range(len(name) + 1))
+    for i, query_char in enumerate(query, 1):
+        current_row = [i]
+        for j, name_char in enumerate(name, 1):
+            current_row.append(
+                min(
+                    previous_row[j] + 1,
+                    current_row[j - 1] + 1,
+                    previous_row[j - 1] + (query_char != name_char),
+                )
+            )
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return min(previous_row)
+
+
+class PrefixIndex[T]:
+    """retrieval_namesをソートしたリスト。retrieve_data()と同じ前方一致で、どの入力がどのデータに一致するかを調べるのに使う。
+
+    ある文字列で始まるretrieval_nameはリストの中で連続して並び、あるretrieval_nameとの共通接頭辞は、リストの中で離れるほど短くなる。
+    そのため、retrieval_nameを他のデータと区別できる最短の接頭辞は、前後で最も近い他のデータのretrieval_nameとの共通接頭辞から決まる。"""
+
+    def __init__(self, data_dict: dict[str, NameExtended[T]]) -> None:
+        self.names: list[str] = list(data_dict)
+        self.data: list[NameExtended[T]] = list(data_dict.values())
+        # (retrieval_name, dataの番号) をretrieval_nameの順に並べる
+        self.entries: list[tuple[str, int]] = sorted(
+            {(retrieval_name, i) for i, data in enumerate(self.data) for retrieval_name in data.retrieval_names}
+        )
+        self.keys: list[str] = [retrieval_name for retrieval_name, _ in self.entries]
+
+    def _range(self, prefix: str) -> range:
+        # prefixで始まる文字列は、prefixの後ろに最大の文字を付けたものより前に並ぶ
+        return range(bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + chr(sys.maxunicode)))
+
+    def candidates(self, prefix: str) -> list[int]:
+        """prefixで始まるretrieval_nameを持つデータの番号を、data_dictの順で返す。"""
+        return sorted({self.entries[j][1] for j in self._range(prefix)})
+
+    def _nearest_other(self, j: int, i: int, step: int) -> str | None:
+        while 0 <= j < len(self.entries):
+            if self.entries[j][1] != i:
+                return self.entries[j][0]
+            j += step
+        return None
+
+    def unique_prefix_length(self, retrieval_name: str, i: int) -> int | None:
+        """番号iのデータのretrieval_nameが、他のデータと区別できる最短の接頭辞の長さ。retrieval_name全体でも区別できないときNone。
+        retrieval_nameはインデックスにないもの（追加を検討している名前）でもよい。"""
+        j = bisect_left(self.entries, (retrieval_name, i))
+        common_length = 0
+        for other in (self._nearest_other(j - 1, i, -1), self._nearest_other(j, i, 1)):
+            if other is not None:
+                common_length = max(common_length, len(os.path.commonprefix([retrieval_name, other])))
+        return common_length + 1 if common_length < len(retrieval_name) else None
+
+    def shortest_unique_prefixes(self) -> list[str | None]:
+        """データごとに、そのデータだけに一致する最短の入力。どう入力しても他のデータも一致するときNone。"""
+        result: list[str | None] = [None] * len(self.data)
+        for retrieval_name, i in self.entries:
+            length = self.unique_prefix_length(retrieval_name, i)
+            if length is not None and ((shortest := result[i]) is None or length < len(shortest)):
+                result[i] = retrieval_name[:length]
+        return result
+
+    def ambiguous_prefixes(self) -> dict[str, list[int]]:
+        """複数のデータに一致する入力と、それに一致するデータの番号。"""
+        prefixes: set[str] = set()
+        for retrieval_name, i in self.entries:
+            length = self.unique_prefix_length(retrieval_name, i)
+            end = length if length is not None else len(retrieval_name) + 1
+            prefixes.update(retrieval_name[:k] for k in range(1, end))
+        return {prefix: self.candidates(prefix) for prefix in sorted(prefixes)}
+
+
 @dataclass
 class Pokemon:
     """PokeAPIのPokemonFormとそこから辿れるPokemon, PokemonSpeciesを表す。 nameはPokemonForm.name"""
@@ -209,6 +350,10 @@ class Converter(ABC):
     def convert(self, input_str: str) -> list[str]:
         raise NotImplementedError
 
+    def fingerprint(self) -> str | None:
+        """変換の内容が同じなら同じ文字列。Noneのときは変換結果をスナップショットに保存しない。"""
+        return None
+
 
 class JpToRomaji(Converter):
     def __init__(self, replacement_filepath: PathLike | str = default_input_filepaths.replacement_filepath) -> None:
@@ -221,6 +366,11 @@ class JpToRomaji(Converter):
         self.replacement = replacement
         self.max_key_length = max(map(len, replacement))
 
+    def fingerprint(self) -> str | None:
+        replacement_json = json.dumps(self.replacement, ensure_ascii=False, sort_keys=True)
+        return f"{type(self).__name__}:{hashlib.sha256(replacement_json.encode('utf-8')).hexdigest()}"
+
+    @profiler.timed("JpToRomaji.convert")
     def convert(self, input_str: str) -> list[str]:
         output_strs: list[str] = [""]
         current_position = 0
@@ -305,17 +455,6 @@ def change_duplicate_display_names[T: HasNameDisplayName](data: Iterable[T]) ->
             display_name_to_element[element.display_name] = element
 
 
-def check_duplicate_display_names[T: HasNameDisplayName](data_dict: dict[str, T]) -> None:
-    display_name_to_data: dict[str, T] = {}
-    for data in data_dict.values():
-        if data.display_name not in display_name_to_data:
-            display_name_to_data[data.display_name] = data
-        else:
-            print(
-                f"duplicate: {data.display_name} ({display_name_to_data[data.display_name].data.name}, {data.data.name})"
-            )
-
-
 def generate_initial_names_file[T: HasNameDisplayName](
     data: Iterable[T], output_filepath: PathLike | str, indent=4
 ) -> None:
@@ -324,11 +463,93 @@ def generate_initial_names_file[T: HasNameDisplayName](
         raise Exception(f"{output_filepath} exists.")
     output: dict = {}
     for element in data:
-        output[element.data.name] = {"display_name": element.display_name, "retrieval_names": [element.display_name]}
+        output[element.data.name] = initial_names(element)
     with open(output_filepath, encoding="utf-8", mode="w") as f:
         json.dump(output, f, ensure_ascii=False, indent=indent)
 
 
+def initial_names(element: HasNameDisplayName) -> dict:
+    return {"display_name": element.display_name, "retrieval_names": [element.display_name]}
+
+
+def _names_entry_lines(name: str, names: dict, comma: bool) -> list[str]:
+    lines = json.dumps({name: names}, ensure_ascii=False, indent=4).split("\n")[1:-1]
+    return [*lines[:-1], lines[-1] + ("," if comma else "")]
+
+
+def patch_names_file[T: HasNameDisplayName](
+    names_filepath: PathLike | str, data: Iterable[T], previous_data: Iterable[T] = ()
+) -> list[str]:
+    """dataのうちnames_filepathにないものを末尾に追加し、previous_dataから作ったときのままのエントリーをdataから作り直す。
+
+    エントリーはgenerate_initial_names_file()と同じ内容で、ファイルのほかの部分（コメントを含む）は変えない。
+    コメントアウトされたエントリーは意図して除いたものとみなして追加しない。手で編集されているため作り直さなかったもののnameを返す。
+    """
+    with open(names_filepath, encoding="utf-8", newline="") as f:
+        text = f.read()
+    newline = "\r\n" if "\r\n" in text else "\n"
+    lines = text.replace("\r\n", "\n").split("\n")
+    entry_starts: dict[str, int] = {}
+    commented_out_names: set[str] = set()
+    for i, line in enumerate(lines):
+        if m := re.match(r'    (//\s*)?"([^"]+)": \{', line):
+            if m[1] is None:
+                entry_starts[m[2]] = i
+            else:
+                commented_out_names.add(m[2])
+    display_names = {m[1] for line in lines if (m := re.search(r'"display_name": "([^"]*)"', line))}
+    previous_names = {element.data.name: initial_names(element) for element in previous_data}
+
+    added: list[T] = []
+    replacements: list[tuple[int, int, list[str]]] = []
+    edited_names: list[str] = []
+    for element in data:
+        name = element.data.name
+        if name in commented_out_names:
+            continue
+        if name not in entry_starts:
+            added.append(element)
+            continue
+        names = initial_names(element)
+        if previous_names.get(name, names) == names:
+            continue
+        start = entry_starts[name]
+        end = next((i for i in range(start + 1, len(lines)) if re.fullmatch(r"    \},?", lines[i])), None)
+        try:
+            current = end is not None and json.loads("{" + "\n".join(lines[start : end + 1]).rstrip(",") + "}")[name]
+        except json.JSONDecodeError:
+            # エントリーの中にコメントがある
+            current = None
+        if end is None or current != previous_names[name]:
+            edited_names.append(name)
+            continue
+        replacements.append((start, end, _names_entry_lines(name, names, lines[end].endswith(","))))
+    for start, end, entry_lines in sorted(replacements, reverse=True):
+        lines[start : end + 1] = entry_lines
+
+    if len(added) > 0:
+        change_duplicate_display_names(added)
+        for element in added:
+            if element.display_name in display_names:
+                element.display_name = f"{element.display_name}（{element.data.name}）"
+        root_end = max(i for i, line in enumerate(lines) if line.rstrip() == "}")
+        last = max(i for i in range(root_end) if lines[i].strip() != "" and not lines[i].lstrip().startswith("//"))
+        if lines[last].rstrip() != "{":
+            lines[last] = lines[last].replace("}", "},", 1)
+        lines[root_end:root_end] = [
+            line
+            for i, element in enumerate(added)
+            for line in _names_entry_lines(element.data.name, initial_names(element), i < len(added) - 1)
+        ]
+
+    if len(added) > 0 or len(replacements) > 0:
+        temp_filepath = f"{os.fspath(names_filepath)}.tmp"
+        with open(temp_filepath, encoding="utf-8", mode="w", newline="") as f:
+            f.write(newline.join(lines))
+        os.replace(temp_filepath, names_filepath)
+    return edited_names
+
+
 def generate_other_initial_names_file(output_names_filepaths: NamesFilepaths) -> None:
     """todo: 完成後のitem, stateの内容を反映していない。"""
     # https://latest.pokewiki.net/%E3%83%80%E3%83%A1%E3%83%BC%E3%82%B8%E8%A8%88%E7%AE%97%E5%BC%8F を上から見て必要なのを列挙する
@@ -394,6 +615,38 @@ def generate_other_initial_names_file(output_names_filepaths: NamesFilepaths) ->
     )
 
 
+def update_initial_names_file(endpoint: str, pokeapi_filepath: PathLike | str, names_filepath: PathLike | str) -> None:
+    """names_filepathがなければgenerate_initial_names_file()で作り、あればpatch_names_file()でないエントリーだけを追加する。"""
+    data = [
+        element
+        for pokeapi_data in pokeapi_downloader.load_pokeapi_data_json(pokeapi_filepath)
+        if pokeapi_data["jp_name"] is not None
+        for element in initial_name_extended_data(endpoint, pokeapi_data)
+    ]
+    change_duplicate_display_names(data)
+    if not os.path.exists(names_filepath):
+        generate_initial_names_file(data, names_filepath)
+    else:
+        patch_names_file(names_filepath, data)
+
+
+def initial_name_extended_data(endpoint: str, pokeapi_data: dict) -> list[NameExtended]:
+    """generate_initial_names_file_from_pokeapi_data()で、PokeAPIのendpointから取得した1件から作るもの。"""
+    match endpoint:
+        case "pokemon-species":
+            return pokemon_with_initial_display_name(pokeapi_data)
+        case "move":
+            return [move_with_initial_display_name(pokeapi_data)]
+        case "ability" | "type" if pokeapi_data["id"] >= 10000:
+            return []
+        case "ability":
+            return [ability_with_initial_display_name(pokeapi_data)]
+        case "type":
+            return [type_with_initial_display_name(pokeapi_data)]
+        case _:
+            raise ValueError(endpoint)
+
+
 def generate_initial_names_file_from_pokeapi_data(
     input_pokeapi_filepaths: PokeapiFilepaths, output_names_filepaths: NamesFilepaths
 ) -> None:
@@ -456,24 +709,161 @@ class AllData:
     types: dict[str, NameExtended[Type]]
     items: dict[str, NameExtended[Item]]
     states: dict[str, NameExtended[State]]
+    ngram_indexes: dict[str, NGramIndex] = field(default_factory=dict)
+    """ keyはこのクラスのメンバ名（"pokemons"など） """
+    metagame: metagame_db.MetagameDB | None = None
+    """ metagame.jsonがないときはNone """
+
+
+# AllDataのメンバ名からNamesFilepathsのメンバ名
+NAMES_FILEPATH_NAMES = {
+    "pokemons": "pokemon_names_filepath",
+    "moves": "move_names_filepath",
+    "abilities": "ability_names_filepath",
+    "types": "type_names_filepath",
+    "items": "item_names_filepath",
+    "states": "state_names_filepath",
+}
+# load_pokeapi_data()の返り値の順
+POKEAPI_DATA_KINDS = ["pokemons", "moves", "abilities", "types"]
+# NameExtendedなどのクラスを変更して、古いスナップショットを読めなくなったときに上げる
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_filepath(names_filepath: PathLike | str) -> str:
+    return f"{os.fspath(names_filepath)}.snapshot.pickle"
+
+
+def get_snapshot_fingerprint(
+    kind: str, pokeapi_filepaths: PokeapiFilepaths, names_filepaths: NamesFilepaths, converter: Converter
+) -> list | None:
+    """kindのスナップショットが依存するファイルとconverterのfingerprint。converterを保存できないときNone。"""
+    if (converter_fingerprint := converter.fingerprint()) is None:
+        return None
+    filepaths = [getattr(names_filepaths, NAMES_FILEPATH_NAMES[kind])]
+    if kind in POKEAPI_DATA_KINDS:
+        filepaths += vars(pokeapi_filepaths).values()
+    fingerprint: list = [SNAPSHOT_VERSION, converter_fingerprint]
+    for filepath in filepaths:
+        stat = os.stat(filepath)
+        fingerprint.append([os.fspath(filepath), stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
+
+def load_snapshot(filepath: PathLike | str, fingerprint: list) -> tuple[dict[str, NameExtended], NGramIndex] | None:
+    if not os.path.exists(filepath):
+        return None
+    try:
+        with open(filepath, mode="rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        # 古いクラス定義で保存したものは、さまざまな例外になる
+        return None
+    if snapshot["fingerprint"] != fingerprint:
+        return None
+    return snapshot["data"], snapshot["ngram_index"]
+
+
+def save_snapshot(
+    filepath: PathLike | str, fingerprint: list, data: dict[str, NameExtended], ngram_index: NGramIndex
+) -> None:
+    temp_filepath = f"{os.fspath(filepath)}.tmp"
+    with open(temp_filepath, mode="wb") as f:
+        pickle.dump(
+            {"fingerprint": fingerprint, "data": data, "ngram_index": ngram_index}, f, protocol=pickle.HIGHEST_PROTOCOL
+        )
+    os.replace(temp_filepath, filepath)
+
+
+def build_name_extended_data(
+    kind: str,
+    pokeapi_data: tuple[dict[str, Pokemon], dict[str, Move], dict[str, Ability], dict[str, Type]] | None,
+    names_filepaths: NamesFilepaths,
+    converter: Converter,
+) -> tuple[dict[str, NameExtended], NGramIndex]:
+    """pokeapi_dataはkindがPOKEAPI_DATA_KINDSのときだけ使う。"""
+    names_filepath = getattr(names_filepaths, NAMES_FILEPATH_NAMES[kind])
+    if kind in POKEAPI_DATA_KINDS:
+        assert pokeapi_data is not None
+        data = load_name_extended_data(names_filepath, pokeapi_data[POKEAPI_DATA_KINDS.index(kind)], converter)
+    else:
+        data = load_name_extended_other_data(names_filepath, converter)
+    return data, NGramIndex(data)
 
 
-def load_all_data(
-    pokeapi_filepaths: PokeapiFilepaths, names_filepaths: NamesFilepaths, converter: Converter
+def build_snapshot(
+    kind: str, pokeapi_filepaths: PokeapiFilepaths, names_filepaths: NamesFilepaths, converter: Converter
+) -> None:
+    fingerprint = get_snapshot_fingerprint(kind, pokeapi_filepaths, names_filepaths, converter)
+    if fingerprint is None:
+        raise ValueError(f"{type(converter).__name__} cannot be saved in a snapshot")
+    pokeapi_data = load_pokeapi_data(pokeapi_filepaths) if kind in POKEAPI_DATA_KINDS else None
+    data, ngram_index = build_name_extended_data(kind, pokeapi_data, names_filepaths, converter)
+    names_filepath = getattr(names_filepaths, NAMES_FILEPATH_NAMES[kind])
+    save_snapshot(snapshot_filepath(names_filepath), fingerprint, data, ngram_index)
+
+
+def _make_all_data(
+    loaded: dict[str, tuple[dict[str, NameExtended], NGramIndex]], metagame_filepath: PathLike | str | None
 ) -> AllData:
-    pokemon_data, move_data, ability_data, type_data = load_pokeapi_data(pokeapi_filepaths)
-    pokemons = load_name_extended_data(names_filepaths.pokemon_names_filepath, pokemon_data, converter)
-    moves = load_name_extended_data(names_filepaths.move_names_filepath, move_data, converter)
-    abilities = load_name_extended_data(names_filepaths.ability_names_filepath, ability_data, converter)
-    types = load_name_extended_data(names_filepaths.type_names_filepath, type_data, converter)
+    all_data = AllData(*(loaded[kind][0] for kind in NAMES_FILEPATH_NAMES))
+    for kind in NAMES_FILEPATH_NAMES:
+        all_data.ngram_indexes[kind] = loaded[kind][1]
+    if metagame_filepath is not None:
+        all_data.metagame = metagame_db.load_if_exists(metagame_filepath)
+    return all_data
+
 
-    items = load_name_extended_other_data(names_filepaths.item_names_filepath, converter)
-    states = load_name_extended_other_data(names_filepaths.state_names_filepath, converter)
+def build_all_data(
+    pokeapi_filepaths: PokeapiFilepaths,
+    names_filepaths: NamesFilepaths,
+    converter: Converter,
+    metagame_filepath: PathLike | str | None = default_input_filepaths.metagame_filepath,
+) -> AllData:
+    """スナップショットを使わずに作る。"""
+    pokeapi_data = load_pokeapi_data(pokeapi_filepaths)
+    return _make_all_data(
+        {
+            kind: build_name_extended_data(kind, pokeapi_data, names_filepaths, converter)
+            for kind in NAMES_FILEPATH_NAMES
+        },
+        metagame_filepath,
+    )
 
-    for data in [pokemons, moves, abilities, types, items, states]:
-        check_duplicate_display_names(data)
 
-    return AllData(pokemons, moves, abilities, types, items, states)
+def load_all_data(
+    pokeapi_filepaths: PokeapiFilepaths,
+    names_filepaths: NamesFilepaths,
+    converter: Converter,
+    metagame_filepath: PathLike | str | None = default_input_filepaths.metagame_filepath,
+) -> AllData:
+    """種類ごとに、依存するファイルとconverterが変わっていなければスナップショット（data_build.pyでも作られる）を読む。
+    変わっていれば作り直し、スナップショットを保存する。データの検査はここでは行わない（data_build.pyのステップで行う）。
+    起動時に読むキャッシュはこのスナップショットだけで、PokeAPIのJSONは作り直すときだけ読む。
+    metagame_filepathのファイルがあれば、metagame_db.MetagameDBとして開く（Noneなら開かない）。
+    """
+    pokeapi_data = None
+    loaded: dict[str, tuple[dict[str, NameExtended], NGramIndex]] = {}
+    for kind, names_filepath_name in NAMES_FILEPATH_NAMES.items():
+        filepath = snapshot_filepath(getattr(names_filepaths, names_filepath_name))
+        fingerprint = get_snapshot_fingerprint(kind, pokeapi_filepaths, names_filepaths, converter)
+        if fingerprint is not None:
+            with profiler.timer("load_all_data.load_snapshot"):
+                if (snapshot := load_snapshot(filepath, fingerprint)) is not None:
+                    loaded[kind] = snapshot
+                    continue
+        if kind in POKEAPI_DATA_KINDS and pokeapi_data is None:
+            with profiler.timer("load_all_data.load_pokeapi_data"):
+                pokeapi_data = load_pokeapi_data(pokeapi_filepaths)
+        with profiler.timer("load_all_data.build_name_extended_data"):
+            loaded[kind] = build_name_extended_data(kind, pokeapi_data, names_filepaths, converter)
+        if fingerprint is not None:
+            try:
+                save_snapshot(filepath, fingerprint, *loaded[kind])
+            except OSError as e:
+                print(f"failed to save {filepath}: {e}", file=sys.stderr)
+
+    return _make_all_data(loaded, metagame_filepath)
 
 
 def main() -> None:
@@ -0,0 +1,129 @@
+import bisect
+import json
+import os
+import os.path
+import tempfile
+from os import PathLike
+import jsonc
+
+
+class PresetStore:
+    """preset.jsonを一度だけ読み込み、メモリ上に保持する。
+
+    変更はpreset.jsonを書き換えずに "<preset.json>.journal" に1行ずつ追記し、journalの行数がcompaction_thresholdに達したらpreset.jsonに書き戻してjournalを削除する。
+    ほかのプロセスがファイルを変更したときは、mtimeとサイズの変化を検出して読み込み直す。
+    """
+
+    def __init__(self, preset_filepath: PathLike | str, compaction_threshold: int = 64) -> None:
+        self.preset_filepath = preset_filepath
+        self.journal_filepath = f"{os.fspath(preset_filepath)}.journal"
+        self.compaction_threshold = compaction_threshold
+        self.presets: dict[str, str] = {}
+        self.sorted_keys: list[str] = []
+        self.journal_length = 0
+        # journalの先頭から、最後の完全な行までのバイト数。追記の前にこれより後ろを切り捨てる
+        self.journal_size = 0
+        self.file_states: tuple[tuple[int, int] | None, ...] = ()
+        self.load()
+
+    def _get_file_states(self) -> tuple[tuple[int, int] | None, ...]:
+        file_states: list[tuple[int, int] | None] = []
+        for filepath in (self.preset_filepath, self.journal_filepath):
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                file_states.append(None)
+            else:
+                file_states.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(file_states)
+
+    def load(self) -> None:
+        if os.path.exists(self.preset_filepath):
+            with open(self.preset_filepath, encoding="utf-8") as f:
+                self.presets = jsonc.load(f)
+        else:
+            self.presets = {}
+        self.journal_length = 0
+        self.journal_size = 0
+        if os.path.exists(self.journal_filepath):
+            with open(self.journal_filepath, mode="rb") as f:
+                for line in f:
+                    # 追記の途中で中断された行と、それより後ろは無視する
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self._apply(record)
+                    self.journal_length += 1
+                    self.journal_size += len(line)
+        self.sorted_keys = sorted(self.presets)
+        self.file_states = self._get_file_states()
+
+    def sync(self) -> None:
+        """ファイルが外部で変更されていれば読み込み直す。"""
+        if self._get_file_states() != self.file_states:
+            self.load()
+
+    def _apply(self, record: dict) -> None:
+        if record["op"] == "set":
+            self.presets[record["key"]] = record["value"]
+        elif record["op"] == "del":
+            self.presets.pop(record["key"], None)
+
+    def _append_journal(self, record: dict) -> None:
+        # 1行を1回のwriteで書き込むため、中断されても壊れるのは最後の行だけになる。
+        # 壊れた行の後ろに続けて書かないように、最後の完全な行より後ろを切り捨ててから追記する
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.journal_filepath, mode="ab") as f:
+            f.truncate(self.journal_size)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(record)
+        self.journal_length += 1
+        self.journal_size += len(line)
+        self.sorted_keys = sorted(self.presets)
+        if self.journal_length >= self.compaction_threshold:
+            self.compact()
+        else:
+            self.file_states = self._get_file_states()
+
+    def compact(self) -> None:
+        """現在の内容をpreset.jsonにアトミックに書き戻し、journalを削除する。"""
+        directory = os.path.dirname(os.path.abspath(self.preset_filepath))
+        with tempfile.NamedTemporaryFile(
+            mode="w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False
+        ) as f:
+            jsonc.dump(self.presets, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f.name, self.preset_filepath)
+        # preset.jsonの置き換え後にjournalが残っても、再適用した結果は変わらない
+        if os.path.exists(self.journal_filepath):
+            os.remove(self.journal_filepath)
+        self.journal_length = 0
+        self.journal_size = 0
+        self.file_states = self._get_file_states()
+
+    def retrieve(self, prefix: str) -> list[str]:
+        """prefixで始まるkeyを辞書順で返す。"""
+        self.sync()
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        end = start
+        while end < len(self.sorted_keys) and self.sorted_keys[end].startswith(prefix):
+            end += 1
+        return self.sorted_keys[start:end]
+
+    def get(self, key: str) -> str:
+        self.sync()
+        return self.presets[key]
+
+    def set(self, key: str, value: str) -> None:
+        self.sync()
+        self._append_journal({"op": "set", "key": key, "value": value})
+
+    def delete(self, key: str) -> None:
+        self.sync()
+        self._append_journal({"op": "del", "key": key})
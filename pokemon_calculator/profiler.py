@@ -0,0 +1,118 @@
+"""処理の段階ごとに時間と回数を集計する。
+
+enable()するまではtimer()などは何もしないオブジェクトや関数を返すため、計測箇所を残したままでもほとんど遅くならない。
+"""
+
+from collections.abc import Callable
+import functools
+import time
+
+enabled: bool = False
+# name -> [回数, 合計時間(ns)]
+_totals: dict[str, list[int]] = {}
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    _totals.clear()
+
+
+def _add(name: str, elapsed_ns: int, count: int = 1) -> None:
+    if (total := _totals.get(name)) is None:
+        _totals[name] = [count, elapsed_ns]
+    else:
+        total[0] += count
+        total[1] += elapsed_ns
+
+
+class _NullTimer:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info) -> None:
+        _add(self.name, time.perf_counter_ns() - self.start)
+
+
+_null_timer = _NullTimer()
+
+
+def timer(name: str) -> _Timer | _NullTimer:
+    """withで囲んだ部分の時間をnameに加える。"""
+    return _Timer(name) if enabled else _null_timer
+
+
+def count(name: str, n: int = 1) -> None:
+    """時間は計らずに回数だけを加える。"""
+    if enabled:
+        _add(name, 0, n)
+
+
+def _null_lap(name: str) -> None:
+    pass
+
+
+def lap_timer(prefix: str) -> Callable[[str], None]:
+    """呼ぶたびに、前回呼んだとき（最初は作ったとき）からの時間を "<prefix>.<name>" に加える関数を返す。
+
+    段階ごとにwithで囲むと字下げが変わってしまう長い関数で、段階の区切りに置いて使う。
+    """
+    if not enabled:
+        return _null_lap
+    last = time.perf_counter_ns()
+
+    def lap(name: str) -> None:
+        nonlocal last
+        now = time.perf_counter_ns()
+        _add(f"{prefix}.{name}", now - last)
+        last = now
+
+    return lap
+
+
+def timed[**P, R](name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """関数の呼び出しの時間をnameに加えるデコレータ。"""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _add(name, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def report() -> str:
+    lines = [f"{'name':<48} {'count':>9} {'total ms':>11} {'mean us':>11}"]
+    for name, (n, elapsed_ns) in sorted(_totals.items()):
+        mean = f"{elapsed_ns / n / 1000:>11.2f}" if n > 0 and elapsed_ns > 0 else f"{'':>11}"
+        lines.append(f"{name:<48} {n:>9d} {elapsed_ns / 1e6:>11.3f} {mean}")
+    return "\n".join(lines)
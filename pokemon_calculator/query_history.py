@@ -0,0 +1,116 @@
+"""retrieve_one_data()で選ばれたデータの記録。候補を選ばせるときの並び順と、入力を求めずに選ぶかどうかに使う。
+
+記録はデータの種類（AllDataのメンバ名）ごとのnameから [スコア, 最後に選ばれた時刻] の表で、選ばれるたびにスコアに1を足す。
+スコアはhalf_lifeごとに半分になるため、よく選ばれるものほど、また最近選ばれたものほど大きい。
+
+表はメモリ上に持ち、変更から flush_delay 秒後に別のスレッドで query_history.json にアトミックに書き込む。プロセスの終了時にも書き込む。
+"""
+
+from __future__ import annotations
+from os import PathLike
+from pathlib import Path
+import atexit
+import json
+import os
+import threading
+import time
+
+from pokemon_data import HasName, NameExtended
+
+HALF_LIFE = 14 * 24 * 60 * 60
+
+
+def default_filepath(preset_filepath: PathLike | str) -> Path:
+    return Path(preset_filepath).with_name("query_history.json")
+
+
+class UsageTable:
+    """あるデータの種類の記録。QueryHistory.table()で得る。"""
+
+    def __init__(self, history: QueryHistory, entries: dict[str, list[float]]) -> None:
+        self.history = history
+        # name -> [スコア, 最後に選ばれた時刻]
+        self.entries = entries
+
+    def score(self, name: str, now: float) -> float:
+        if (entry := self.entries.get(name)) is None:
+            return 0.0
+        score, last_used = entry
+        return score * 0.5 ** ((now - last_used) / self.history.half_life)
+
+    def rank[T: HasName](self, candidates: list[NameExtended[T]]) -> list[NameExtended[T]]:
+        """スコアの大きい順。同じスコアのものは元の順。"""
+        now = time.time()
+        return sorted(candidates, key=lambda data: -self.score(data.data.name, now))
+
+    def dominant[T: HasName](self, candidates: list[NameExtended[T]]) -> NameExtended[T] | None:
+        """スコアがmin_auto_select_score以上で、候補のスコアの合計のauto_select_share以上を占めるもの。"""
+        now = time.time()
+        scores = [self.score(data.data.name, now) for data in candidates]
+        top = max(scores, default=0.0)
+        if top < self.history.min_auto_select_score or top < self.history.auto_select_share * sum(scores):
+            return None
+        return candidates[scores.index(top)]
+
+    def record(self, name: str) -> None:
+        now = time.time()
+        with self.history.lock:
+            self.entries[name] = [self.score(name, now) + 1, now]
+        self.history.schedule_flush()
+
+
+class QueryHistory:
+    def __init__(
+        self,
+        filepath: PathLike | str,
+        auto_select_share: float = 0.8,
+        min_auto_select_score: float = 2.5,
+        half_life: float = HALF_LIFE,
+        flush_delay: float = 2.0,
+    ) -> None:
+        """min_auto_select_scoreの既定値は、最近3回ほど選ばれたときのスコア。auto_select_shareを1より大きくすると、入力を求めずに選ぶことはなくなる。"""
+        self.filepath = filepath
+        self.auto_select_share = auto_select_share
+        self.min_auto_select_score = min_auto_select_score
+        self.half_life = half_life
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()
+        self.timer: threading.Timer | None = None
+        self.dirty = False
+        try:
+            with open(filepath, encoding="utf-8") as f:
+                tables: dict[str, dict[str, list[float]]] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            tables = {}
+        self.tables = {kind: UsageTable(self, entries) for kind, entries in tables.items()}
+        atexit.register(self.close)
+
+    def table(self, kind: str) -> UsageTable:
+        if (table := self.tables.get(kind)) is None:
+            table = self.tables[kind] = UsageTable(self, {})
+        return table
+
+    def schedule_flush(self) -> None:
+        with self.lock:
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.flush_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            self.timer = None
+            if not self.dirty:
+                return
+            temp_filepath = f"{os.fspath(self.filepath)}.tmp"
+            with open(temp_filepath, encoding="utf-8", mode="w") as f:
+                json.dump({kind: table.entries for kind, table in self.tables.items()}, f, ensure_ascii=False)
+            os.replace(temp_filepath, self.filepath)
+            self.dirty = False
+
+    def close(self) -> None:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        self.flush()
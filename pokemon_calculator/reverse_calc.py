@@ -0,0 +1,268 @@
+"""観測したダメージから、相手の努力値、性格補正、持ち物、特性の組を推定する。
+
+クエリは対話モードと同じ書式で、推定しない側の努力値は入力しておく。推定する側で入力したもの（特性、持ち物、努力値と性格補正）は固定する。
+    python reverse_calc.py gabu kai w zis d 252 s a --percent 40-45
+    python reverse_calc.py --infer a gabu kai w zis d 0 h 0 --damage 80-90
+
+ダメージは努力値について単調（attackerでは増加、defenderでは減少）なので、特性、持ち物、性格補正の組ごとに、
+最小乱数と最大乱数が観測値の範囲に入る努力値の区間を二分探索で求め、区間の中だけで乱数の一致を調べる。
+ダメージはHPの努力値によらないため、calc_damage()の結果は (特性, 持ち物, 性格補正, 努力値) ごとに1回だけ計算する。
+"""
+
+from __future__ import annotations
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import Literal
+import argparse
+import bisect
+import dataclasses
+import functools
+import itertools
+import math
+
+import input_processor
+from pokemon_data import AllData, Ability, Item, NameExtended
+from pokemon_calc import BattlePokemon, BattlePokemonArgs, Input, InputArgs, calc_damage, calc_hp
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import InvalidInput
+
+DORYOKUCHI_CANDIDATES = [0, *range(4, 253, 8)]
+SEIKAKU_HOSEI_CANDIDATES = [0.9, 1, 1.1]
+ATTACKER_ITEM_CANDIDATES = [None, "こだわり", "1.2倍アイテム", "いのちのたま"]
+# 技の分類（"physical"または"special"）がkeyと一致するときだけ試す持ち物
+DEFENDER_ITEM_CANDIDATES = [None, "とつげきチョッキ"]
+DEFENDER_ITEM_DAMAGE_CLASSES = {"とつげきチョッキ": "special"}
+
+
+@dataclass(eq=False)
+class Observation:
+    """観測したダメージの範囲。unitが"percent"のときは最大HPに対する割合（%）。"""
+
+    low: float
+    high: float
+    unit: Literal["hp", "percent"]
+
+    def hp_range(self, hp: int) -> tuple[int, int]:
+        """最大HPがhpのときに観測値と一致するダメージの範囲。"""
+        if self.unit == "hp":
+            return math.ceil(self.low), math.floor(self.high)
+        return math.ceil(self.low * hp / 100), math.floor(self.high * hp / 100)
+
+    @classmethod
+    def from_str(cls, value: str, unit: Literal["hp", "percent"]) -> Observation:
+        """"N" または "N-M"。"""
+        low, _, high = value.partition("-")
+        try:
+            return cls(float(low), float(high if high != "" else low), unit)
+        except ValueError:
+            raise InvalidInput(f"Invalid input: {value}")
+
+
+@dataclass(eq=False)
+class Hypothesis:
+    ability: NameExtended[Ability]
+    item: NameExtended[Item] | None
+    seikaku_hosei: float
+    doryokuchi: int
+    hp_doryokuchi: int | None
+    """ defenderのHPの努力値。入力されておらず、推定もしないとき（ダメージをHPで観測したとき）はNone。 """
+    damages: tuple[int, ...]
+    defender_hp: int | None
+
+
+class ReverseCalculator:
+    """推定する側の (特性, 持ち物, 性格補正, 努力値) の組を探索する。"""
+
+    def __init__(
+        self,
+        input_args: InputArgs,
+        all_data: AllData,
+        infer: Literal["a", "b"],
+        item_candidates: list[NameExtended[Item] | None] | None = None,
+    ) -> None:
+        if input_args.move is None:
+            raise InvalidInput("no move")
+        unknown = input_args.attacker if infer == "a" else input_args.defender
+        assert unknown.pokemon is not None
+        # 補完される前に、入力されたものを固定する
+        self.abilities = (
+            [unknown.ability]
+            if unknown.ability is not None
+            else [all_data.abilities[name] for name in unknown.pokemon.data.ability_names]
+        )
+        if unknown.item is not None:
+            self.items = [unknown.item]
+        elif item_candidates is not None:
+            self.items = item_candidates
+        elif infer == "a":
+            self.items = [all_data.items[name] if name is not None else None for name in ATTACKER_ITEM_CANDIDATES]
+        else:
+            self.items = [
+                all_data.items[name] if name is not None else None
+                for name in DEFENDER_ITEM_CANDIDATES
+                if name is None or DEFENDER_ITEM_DAMAGE_CLASSES[name] == input_args.move.data.damage_class
+            ]
+        if unknown.doryokuchi is not None:
+            self.doryokuchis = [unknown.doryokuchi]
+            self.seikaku_hoseis = [unknown.seikaku_hosei]
+        else:
+            self.doryokuchis = DORYOKUCHI_CANDIDATES
+            self.seikaku_hoseis = SEIKAKU_HOSEI_CANDIDATES
+            unknown.doryokuchi = 0  # 推定する側の補完とcheck_args_set()のため
+        input_processor.complete_input_args(input_args, all_data)
+        known = input_args.defender if infer == "a" else input_args.attacker
+        if known.doryokuchi is None:
+            raise InvalidInput(f"no {'defender' if infer == 'a' else 'attacker'} doryokuchi")
+
+        self.input_args = input_args
+        self.all_data = all_data
+        self.infer: Literal["a", "b"] = infer
+        self.known: BattlePokemon = known.make_battle_pokemon()
+        self.unknown: BattlePokemonArgs = unknown
+        self.calculated: dict[tuple[int, int, float, int], tuple[int, ...]] = {}
+
+    def damages(
+        self, ability: NameExtended[Ability], item: NameExtended[Item] | None, seikaku_hosei: float, doryokuchi: int
+    ) -> tuple[int, ...]:
+        key = (id(ability), id(item), seikaku_hosei, doryokuchi)
+        if (damages := self.calculated.get(key)) is None:
+            battle_pokemon = dataclasses.replace(
+                self.unknown, ability=ability, item=item, seikaku_hosei=seikaku_hosei, doryokuchi=doryokuchi
+            ).make_battle_pokemon()
+            attacker, defender = (battle_pokemon, self.known) if self.infer == "a" else (self.known, battle_pokemon)
+            assert self.input_args.move is not None
+            output = calc_damage(
+                Input(
+                    attacker,
+                    defender,
+                    self.input_args.move,
+                    self.input_args.states,
+                    self.input_args.hp_doryokuchi or 0,
+                    self.input_args.hp_kotaichi,
+                ),
+                self.all_data,
+            )
+            damages = self.calculated[key] = output.damage.damages
+        return damages
+
+    def _matched_doryokuchis(self, damages: Callable[[int], tuple[int, ...]], low: int, high: int) -> Iterator[int]:
+        """最小乱数がhigh以下かつ最大乱数がlow以上である区間を二分探索し、その中で乱数がlow以上high以下になるものを返す。"""
+        if self.infer == "a":
+            # 増加: 最大乱数がlow以上になる最初の位置から、最小乱数がhighを超える最初の位置まで
+            start = bisect.bisect_left(self.doryokuchis, True, key=lambda d: max(damages(d)) >= low)
+            stop = bisect.bisect_left(self.doryokuchis, True, key=lambda d: min(damages(d)) > high)
+        else:
+            start = bisect.bisect_left(self.doryokuchis, True, key=lambda d: min(damages(d)) <= high)
+            stop = bisect.bisect_left(self.doryokuchis, True, key=lambda d: max(damages(d)) < low)
+        for doryokuchi in self.doryokuchis[start:stop]:
+            if any(low <= damage <= high for damage in damages(doryokuchi)):
+                yield doryokuchi
+
+    def _hp_doryokuchis(self, observation: Observation) -> list[int | None]:
+        defender = self.known if self.infer == "a" else self.unknown
+        if self.input_args.hp_doryokuchi is not None or defender.all_doryokuchi is not None:
+            return [self.input_args.hp_doryokuchi]
+        if observation.unit == "hp":
+            return [None]
+        if self.infer == "a":
+            raise InvalidInput("no hp doryokuchi")
+        return DORYOKUCHI_CANDIDATES
+
+    def _defender_hp(self, hp_doryokuchi: int | None) -> int:
+        defender = self.known if self.infer == "a" else self.unknown
+        assert defender.pokemon is not None
+        if defender.all_doryokuchi is not None:
+            hp_doryokuchi = defender.all_doryokuchi.h
+        kotaichi = self.input_args.hp_kotaichi if defender.all_kotaichi is None else defender.all_kotaichi.h
+        return calc_hp(defender.pokemon.data.stats.h, hp_doryokuchi or 0, kotaichi, defender.level)
+
+    def search(self, observation: Observation) -> Iterator[Hypothesis]:
+        hp_doryokuchis = self._hp_doryokuchis(observation)
+        for ability, item, seikaku_hosei in itertools.product(self.abilities, self.items, self.seikaku_hoseis):
+            damages = functools.partial(self.damages, ability, item, seikaku_hosei)
+            for hp_doryokuchi in hp_doryokuchis:
+                hp = self._defender_hp(hp_doryokuchi)
+                low, high = observation.hp_range(hp)
+                for doryokuchi in self._matched_doryokuchis(damages, low, high):
+                    yield Hypothesis(
+                        ability,
+                        item,
+                        seikaku_hosei,
+                        doryokuchi,
+                        hp_doryokuchi,
+                        damages(doryokuchi),
+                        hp if observation.unit == "percent" else None,
+                    )
+
+
+def _ranges_str(doryokuchis: list[int]) -> str:
+    """DORYOKUCHI_CANDIDATESで連続するものを "4-60" のようにまとめる。"""
+    ranges: list[list[int]] = []
+    for doryokuchi in doryokuchis:
+        if (
+            ranges
+            and ranges[-1][-1] in DORYOKUCHI_CANDIDATES
+            and doryokuchi in DORYOKUCHI_CANDIDATES
+            and DORYOKUCHI_CANDIDATES.index(doryokuchi) == DORYOKUCHI_CANDIDATES.index(ranges[-1][-1]) + 1
+        ):
+            ranges[-1].append(doryokuchi)
+        else:
+            ranges.append([doryokuchi])
+    return ", ".join(str(r[0]) if len(r) == 1 else f"{r[0]}-{r[-1]}" for r in ranges)
+
+
+def hypotheses_str(hypotheses: list[Hypothesis]) -> str:
+    """特性、持ち物、性格補正、HPの努力値が同じものを1行にまとめる。"""
+    groups: dict[tuple, list[Hypothesis]] = {}
+    for hypothesis in hypotheses:
+        key = (id(hypothesis.ability), id(hypothesis.item), hypothesis.seikaku_hosei, hypothesis.hp_doryokuchi)
+        groups.setdefault(key, []).append(hypothesis)
+    lines: list[str] = []
+    for group in groups.values():
+        first = group[0]
+        item_str = first.item.display_name if first.item is not None else "なし"
+        hp_str = f" H{first.hp_doryokuchi}" if first.hp_doryokuchi is not None else ""
+        lines.append(
+            f"{first.ability.display_name} {item_str} 性格補正{first.seikaku_hosei}{hp_str}:"
+            f" {_ranges_str([hypothesis.doryokuchi for hypothesis in group])}"
+        )
+    lines.append(f"{len(hypotheses)} hypotheses")
+    return "\n".join(lines)
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", nargs="+", help="対話モードと同じ書式のクエリ")
+    parser.add_argument("--infer", choices=["a", "b"], default="b", help="推定する側。既定はdefender")
+    observation_group = parser.add_mutually_exclusive_group(required=True)
+    observation_group.add_argument("--damage", help="観測したダメージ（HP）。\"N\" または \"N-M\"")
+    observation_group.add_argument("--percent", help="観測したダメージ（最大HPに対する%%）。\"N\" または \"N-M\"")
+    parser.add_argument("--items", nargs="+", default=None, help="試す持ち物。\"-\" は持ち物なし")
+    args = parser.parse_args()
+
+    context = input_processor.load_query_context(input_filepaths)
+    all_data, preset_store = context.all_data, context.preset_store
+    try:
+        if args.damage is not None:
+            observation = Observation.from_str(args.damage, "hp")
+        else:
+            observation = Observation.from_str(args.percent, "percent")
+        item_candidates = None
+        if args.items is not None:
+            item_candidates = [
+                (
+                    input_processor.retrieve_one_data(all_data.items, item, ngram_index=all_data.ngram_indexes["items"])
+                    if item != "-"
+                    else None
+                )
+                for item in args.items
+            ]
+        input_args = input_processor.make_input_args_from_str(" ".join(args.query), all_data, preset_store)
+        reverse_calculator = ReverseCalculator(input_args, all_data, args.infer, item_candidates)
+        print(hypotheses_str(list(reverse_calculator.search(observation))))
+    except (InvalidInput, IndexError, ValueError) as e:
+        print(e)
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
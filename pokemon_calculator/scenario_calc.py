@@ -0,0 +1,231 @@
+"""複数ターンにわたって受けるダメージと定数ダメージ、回復を合わせて、残りHPの分布とひんしになる確率を計算する。
+
+引数の1つが1ターンで、そのターンに起きることを ";" 区切りで順に書く。空白を含むものは対話モードと同じ書式のクエリ、含まないものはCHIPSのいずれか。
+    python scenario_calc.py "sute; gabu d 252 s a kai h 252 w gekiril; suna" "gabu d 252 s a kai h 252 w gekiril; suna"
+クエリはすべて同じdefenderについてのもので、努力値を入力して1つのInputになるようにする。
+
+残りHPの分布はHPを添字とする配列で持ち、ダメージを受けるたびに乱数の分布との畳み込みで更新する。組み合わせを列挙しないため、必要なメモリは最大HPに比例する。
+"""
+
+from __future__ import annotations
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Literal
+import argparse
+
+import input_processor
+from pokemon_data import AllData, Converter, NameExtended
+from pokemon_calc import BattlePokemon, Output, calc_damages
+from input_filepaths import default_input_filepaths, InputFilepaths
+from input_processor import InvalidInput, SpreadProfile
+from preset_store import PresetStore
+
+
+@dataclass(eq=False)
+class Chip:
+    """最大HPの numerator / denominator（切り捨て、最低1）の定数ダメージまたは回復。"""
+
+    name: str
+    kind: Literal["damage", "heal"]
+    numerator: int
+    denominator: int
+
+
+# defenderが場にいるだけで受けるもの。いのちのたまの反動のように、defender自身の行動で受けるものは扱わない
+CHIPS = [
+    # ダメージはいわタイプの技の相性で倍になる
+    Chip("ステルスロック", "damage", 1, 8),
+    Chip("すなあらし", "damage", 1, 16),
+    Chip("たべのこし", "heal", 1, 16),
+]
+# すなあらしのダメージを受けないタイプと特性
+SANDSTORM_IMMUNE_TYPE_NAMES = ["rock", "ground", "steel"]
+SANDSTORM_IMMUNE_ABILITY_NAMES = ["sand-veil", "sand-rush", "sand-force", "overcoat"]
+# 技以外のダメージを受けない特性
+INDIRECT_DAMAGE_IMMUNE_ABILITY_NAMES = ["magic-guard"]
+
+
+def load_chips(converter: Converter) -> dict[str, NameExtended[Chip]]:
+    return {chip.name: NameExtended(chip, chip.name, converter.convert(chip.name)) for chip in CHIPS}
+
+
+class HpDistribution:
+    """残りHPの分布。weights[h]は残りHPがhになる場合の数で、確率はweights[h] / total。
+
+    乱数の場合の数をそのまま掛けていくため、確率は誤差なく求まる。
+    """
+
+    __slots__ = ("max_hp", "weights", "total")
+
+    def __init__(self, max_hp: int) -> None:
+        self.max_hp = max_hp
+        self.weights: list[int] = [0] * (max_hp + 1)
+        self.weights[max_hp] = 1
+        self.total = 1
+
+    def hit(self, damages: Sequence[int]) -> None:
+        """乱数のそれぞれが等しい確率で出るダメージを受ける。ひんしのときは何も起きない。"""
+        counts = Counter(damages).items()
+        weights = [0] * (self.max_hp + 1)
+        weights[0] = self.weights[0] * len(damages)
+        for hp in range(1, self.max_hp + 1):
+            if (weight := self.weights[hp]) == 0:
+                continue
+            for damage, count in counts:
+                weights[max(hp - damage, 0)] += weight * count
+        self.weights = weights
+        self.total *= len(damages)
+
+    def shift(self, amount: int) -> None:
+        """amountが正ならダメージ、負なら回復。ひんしのときは何も起きない。"""
+        weights = [0] * (self.max_hp + 1)
+        weights[0] = self.weights[0]
+        for hp in range(1, self.max_hp + 1):
+            weights[min(max(hp - amount, 0), self.max_hp)] += self.weights[hp]
+        self.weights = weights
+
+    def copy(self) -> HpDistribution:
+        copied = HpDistribution(self.max_hp)
+        copied.weights = list(self.weights)
+        copied.total = self.total
+        return copied
+
+    def ko_probability(self) -> float:
+        return self.weights[0] / self.total
+
+    def min_hp(self) -> int:
+        return next(hp for hp, weight in enumerate(self.weights) if weight > 0)
+
+    def max_hp_remaining(self) -> int:
+        return next(hp for hp in range(self.max_hp, -1, -1) if self.weights[hp] > 0)
+
+    def average_hp(self) -> float:
+        return sum(hp * weight for hp, weight in enumerate(self.weights)) / self.total
+
+
+def chip_amount(chip: Chip, defender: BattlePokemon, max_hp: int, all_data: AllData) -> int:
+    """defenderが受けるダメージ。回復は負の値で返す。"""
+    if chip.kind == "heal":
+        return -max(max_hp * chip.numerator // chip.denominator, 1)
+    if defender.ability.data.name in INDIRECT_DAMAGE_IMMUNE_ABILITY_NAMES:
+        return 0
+    type_names = (
+        defender.pokemon.data.type_names
+        if defender.terasu_type is None or defender.terasu_type.data.name == "stellar"
+        else [defender.terasu_type.data.name]
+    )
+    numerator, denominator = chip.numerator, chip.denominator
+    if chip.name == "ステルスロック":
+        # 相性は1/4倍から4倍なので、4倍して整数にする
+        numerator *= int(all_data.types["rock"].data.damage_multiplier_to(type_names) * 4)
+        denominator *= 4
+        if numerator == 0:
+            return 0
+    elif chip.name == "すなあらし" and (
+        any(type_name in SANDSTORM_IMMUNE_TYPE_NAMES for type_name in type_names)
+        or defender.ability.data.name in SANDSTORM_IMMUNE_ABILITY_NAMES
+    ):
+        return 0
+    return max(max_hp * numerator // denominator, 1)
+
+
+type Event = Output | NameExtended[Chip]
+
+
+def _defender_key(output: Output) -> tuple:
+    defender = output.input.defender
+    return (defender.pokemon, defender.ability, defender.item, defender.terasu_type, output.defender_hp)
+
+
+class Scenario:
+    """ターンごとのイベント（ダメージを受けるOutputまたはChip）を順に適用する。"""
+
+    def __init__(self, turns: list[list[Event]], all_data: AllData) -> None:
+        outputs = [event for turn in turns for event in turn if isinstance(event, Output)]
+        if len(outputs) == 0:
+            raise InvalidInput("no query")
+        first = outputs[0]
+        for output in outputs[1:]:
+            # chip_amount()はself.defenderの特性、持ち物、テラスタイプを使うため、それらも同じでなければならない
+            if _defender_key(output) != _defender_key(first):
+                raise InvalidInput("all queries must have the same defender (ability, item, terasu type) and hp")
+        self.turns = turns
+        self.all_data = all_data
+        self.defender: BattlePokemon = first.input.defender
+        self.max_hp: int = first.defender_hp
+
+    def run(self) -> list[HpDistribution]:
+        """各ターンの終わりの分布を返す。"""
+        distribution = HpDistribution(self.max_hp)
+        distributions: list[HpDistribution] = []
+        for turn in self.turns:
+            for event in turn:
+                if isinstance(event, Output):
+                    distribution.hit(event.damage.damages)
+                else:
+                    distribution.shift(chip_amount(event.data, self.defender, self.max_hp, self.all_data))
+            distributions.append(distribution.copy())
+        return distributions
+
+
+def parse_turn(
+    turn_str: str,
+    all_data: AllData,
+    chips: dict[str, NameExtended[Chip]],
+    preset_store: PresetStore,
+    spread_profile: SpreadProfile,
+    compiled_presets: input_processor.CompiledPresets | None = None,
+) -> list[Event]:
+    events: list[Event] = []
+    for event_str in turn_str.split(";"):
+        event_str = event_str.strip()
+        if event_str == "":
+            continue
+        if len(event_str.split()) == 1:
+            events.append(input_processor.retrieve_one_data(chips, event_str))
+            continue
+        inputs = input_processor.get_inputs_from_str(
+            event_str, all_data, preset_store, spread_profile, compiled_presets, allow_preset_commands=False
+        )
+        assert inputs is not None
+        if len(inputs) != 1:
+            raise InvalidInput(f"{event_str} is expanded to {len(inputs)} inputs. Enter doryokuchi.")
+        events += calc_damages(inputs, all_data)
+    return events
+
+
+def main(input_filepaths: InputFilepaths) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("turns", nargs="+", help="1ターンに起きることを ; 区切りで書いたもの")
+    args = parser.parse_args()
+
+    context = input_processor.load_query_context(input_filepaths)
+    all_data, preset_store, spread_profile = context.all_data, context.preset_store, context.spread_profile
+    compiled_presets = context.compiled_presets
+    chips = load_chips(context.converter)
+    try:
+        turns = [
+            parse_turn(turn_str, all_data, chips, preset_store, spread_profile, compiled_presets)
+            for turn_str in args.turns
+        ]
+        scenario = Scenario(turns, all_data)
+    except (InvalidInput, IndexError, ValueError) as e:
+        print(e)
+        return
+    print(f"{scenario.defender.pokemon.display_name} HP{scenario.max_hp}")
+    for i, (turn, distribution) in enumerate(zip(turns, scenario.run()), 1):
+        events_str = ", ".join(
+            (
+                f"{event.input.attacker.pokemon.display_name}の{event.input.move.display_name}"
+                if isinstance(event, Output)
+                else event.display_name
+            )
+            for event in turn
+        )
+        hp_str = f" 残りHP {distribution.min_hp()}~{distribution.max_hp_remaining()} 平均{distribution.average_hp():.1f}"
+        print(f"{i}ターン目 ひんし{distribution.ko_probability() * 100:6.2f}%{hp_str} ({events_str})")
+
+
+if __name__ == "__main__":
+    main(default_input_filepaths)
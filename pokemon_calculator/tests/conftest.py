@@ -0,0 +1,51 @@
+from pathlib import Path
+import shutil
+import sys
+
+import pytest
+
+# pokemon_calculatorのモジュールは、そのディレクトリから実行される前提で互いを読み込む
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pokemon_calcより先にinput_processorを読み込む必要がある
+import input_processor  # noqa: E402
+import engine_golden  # noqa: E402
+from input_filepaths import InputFilepaths  # noqa: E402
+from input_processor import QueryContext, SpreadProfile  # noqa: E402
+from pokemon_data import AllData  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def fixture_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """fixtures/のコピー。スナップショット等がリポジトリの中に作られないようにする。"""
+    directory = tmp_path_factory.mktemp("fixtures")
+    shutil.copytree(engine_golden.fixture_dir_path, directory, dirs_exist_ok=True)
+    return directory
+
+
+@pytest.fixture(scope="session")
+def input_filepaths(fixture_dir: Path) -> InputFilepaths:
+    return InputFilepaths(
+        engine_golden.pokeapi_filepaths(fixture_dir),
+        engine_golden.names_filepaths(fixture_dir),
+        fixture_dir / "jp_replacement.json",
+        fixture_dir / "preset.json",
+        fixture_dir / "spread_profile.json",
+        fixture_dir / "metagame.json",
+    )
+
+
+@pytest.fixture(scope="session")
+def query_context(input_filepaths: InputFilepaths) -> QueryContext:
+    return input_processor.load_query_context(input_filepaths)
+
+
+@pytest.fixture(scope="session")
+def all_data(query_context: QueryContext) -> AllData:
+    """metagame.jsonはfixtures/にないため、all_data.metagameはNone。"""
+    return query_context.all_data
+
+
+@pytest.fixture(scope="session")
+def spread_profile(query_context: QueryContext) -> SpreadProfile:
+    return query_context.spread_profile
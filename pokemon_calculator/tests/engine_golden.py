@@ -0,0 +1,192 @@
+"""fixtures/のデータで、ダメージ計算の結果をベースラインの実装と比べるためのgolden（fixtures/engine_golden.jsonl）。
+
+    PYTHONPATH=<ベースラインのコミットのpokemon_calculator> python engine_golden.py
+
+goldenは、計算を速くする変更を加える前のベースラインのコミット（最初のコミット）の実装で作ったものであり、現在の実装で作り直してはいけない。
+そのため、main()は既にあるgoldenを上書きしない。ケースを増やすときは、ベースラインのコミットをチェックアウトした場所をPYTHONPATHにして、goldenを削除してから実行する。
+
+"engine"のケースは、engine_inputs()がBattlePokemonとInputを直接作り、calc_damage()の結果をOutput.to_str()の形で比べる。ここで使うAPIはベースラインと現在で同じである。
+"query"のケースは、QUERIESの入力を展開した結果を比べる。goldenを作るときはベースラインのinput_processor.get_inputs_to_calculate()を使い、
+test_engine_golden.pyは現在のinput_processor.get_inputs_from_str()とspread_profile.jsonを使う。
+"""
+
+from __future__ import annotations
+from os import PathLike
+from pathlib import Path
+import builtins
+import inspect
+import json
+import sys
+
+# ベースラインでは、pokemon_calcより先にinput_processorを読み込む必要がある
+import input_processor
+import pokemon_data
+from input_filepaths import NamesFilepaths, PokeapiFilepaths
+from pokemon_calc import BattlePokemon, Input, Output, calc_damage
+from pokemon_data import AllData, Stats
+
+fixture_dir_path = Path(__file__).resolve().parent / "fixtures"
+golden_filepath = fixture_dir_path / "engine_golden.jsonl"
+
+# 展開される入力。曖昧な名前があるとベースラインでは入力を求められるため、一つに定まるものだけにする
+QUERIES = [
+    "gabu kai w zis",
+    "gabu kai w doragolku d 252 s a h 4 m inoti",
+    "kai gabu w reitoubi-mu t honoo",
+    "kai doraparu w silsoku d6 0-252-0-0-4-252 seikaku a-c",
+    "doraparu gabu w doragolaro- to samehada",
+    "gabu kai w kaelhousya d 100 s k h 252",
+    "patti kai w delgeki j hare",
+    "morobare gabu w hedoro",
+    "zasial kai w kixyoj",
+    "kai zasial w zis",
+    "rekisel kai w aial",
+]
+# 1つのattackerとdefenderの組で試す技の数
+MOVES_PER_PAIR = 3
+
+
+def pokeapi_filepaths(directory: PathLike | str) -> PokeapiFilepaths:
+    directory = Path(directory)
+    return PokeapiFilepaths(
+        directory / "pokeapi" / "pokeapi_pokemon_species.json",
+        directory / "pokeapi" / "pokeapi_moves.json",
+        directory / "pokeapi" / "pokeapi_types.json",
+        directory / "pokeapi" / "pokeapi_abilities.json",
+    )
+
+
+def names_filepaths(directory: PathLike | str) -> NamesFilepaths:
+    directory = Path(directory)
+    return NamesFilepaths(
+        directory / "pokemon_names.json",
+        directory / "move_names.json",
+        directory / "type_names.json",
+        directory / "ability_names.json",
+        directory / "item_names.json",
+        directory / "state_names.json",
+    )
+
+
+def _variants(attacker_name: str, defender_name: str, move_name: str, all_data: AllData) -> list[Input]:
+    """1つの組で試す、能力や持ち物、状態の違う入力。"""
+    attacker = all_data.pokemons[attacker_name]
+    defender = all_data.pokemons[defender_name]
+    move = all_data.moves[move_name]
+    abilities = all_data.abilities
+    items = all_data.items
+    types = all_data.types
+    states = all_data.states
+    return [
+        Input(
+            BattlePokemon(attacker, abilities[attacker.data.ability_names[0]], 252, 31, 1.1, None, 0, None),
+            BattlePokemon(defender, abilities[defender.data.ability_names[0]], 0, 31, 1, None, 0, None),
+            move,
+            [],
+            0,
+            31,
+        ),
+        Input(
+            BattlePokemon(
+                attacker,
+                abilities[attacker.data.ability_names[-1]],
+                252,
+                31,
+                1,
+                items["こだわり"],
+                1,
+                types[move.data.type_name],
+            ),
+            BattlePokemon(
+                defender, abilities[defender.data.ability_names[-1]], 252, 31, 1.1, items["とつげきチョッキ"], -1, None
+            ),
+            move,
+            [states["にほんばれ"], states["エレキフィールド"]],
+            252,
+            31,
+        ),
+        Input(
+            BattlePokemon(
+                attacker,
+                abilities[attacker.data.ability_names[0]],
+                0,
+                31,
+                1,
+                items["いのちのたま"],
+                -2,
+                None,
+                50,
+                Stats(4, 252, 0, 0, 0, 252),
+                Stats(31, 31, 31, 0, 31, 31),
+                ("a", "c"),
+            ),
+            BattlePokemon(
+                defender, abilities[defender.data.ability_names[0]], 4, 0, 0.9, items["半減実"], 2, types["fairy"]
+            ),
+            move,
+            [states["あめ"], states["壁"], states["きゅうしょ"]],
+            4,
+            0,
+        ),
+    ]
+
+
+def engine_inputs(all_data: AllData) -> list[tuple[str, Input]]:
+    """("<attacker> <defender> <move> <variant>", Input) のリスト。変化技は除く。"""
+    cases: list[tuple[str, Input]] = []
+    for attacker_name, attacker in all_data.pokemons.items():
+        move_names = [
+            move_name
+            for move_name in attacker.data.move_names
+            if move_name in all_data.moves and all_data.moves[move_name].data.damage_class != "status"
+        ][:MOVES_PER_PAIR]
+        for defender_name in all_data.pokemons:
+            if defender_name == attacker_name:
+                continue
+            for move_name in move_names:
+                for i, input in enumerate(_variants(attacker_name, defender_name, move_name, all_data)):
+                    cases.append((f"{attacker_name} {defender_name} {move_name} {i}", input))
+    return cases
+
+
+def output_lines(outputs: list[Output]) -> list[str]:
+    """対話モードの表示と同じ、ヘッダーと各行、HPのバー。"""
+    return [outputs[0].header_str(), *(s for output in outputs for s in (output.to_str(), output.hp_bar_str()))]
+
+
+def _baseline_query_outputs(query: str, all_data: AllData, preset_filepath: PathLike | str) -> list[Output]:
+    """ベースラインのinput_processorで入力を展開する。"""
+    original_input = builtins.input
+    builtins.input = lambda prompt="": query
+    try:
+        inputs = input_processor.get_inputs_to_calculate(all_data, preset_filepath)
+    finally:
+        builtins.input = original_input
+    assert inputs is not None
+    return [calc_damage(input, all_data) for input in inputs]
+
+
+def main() -> None:
+    if golden_filepath.exists():
+        sys.exit(f"{golden_filepath} already exists. Delete it first to regenerate it at the baseline commit.")
+    if len(inspect.signature(input_processor.get_inputs_to_calculate).parameters) != 2:
+        sys.exit("run this with PYTHONPATH set to pokemon_calculator of the baseline commit")
+    all_data = pokemon_data.load_all_data(
+        pokeapi_filepaths(fixture_dir_path),
+        names_filepaths(fixture_dir_path),
+        pokemon_data.JpToRomaji(fixture_dir_path / "jp_replacement.json"),
+    )
+    records: list[dict] = []
+    for case, input in engine_inputs(all_data):
+        records.append({"kind": "engine", "case": case, "line": calc_damage(input, all_data).to_str()})
+    for query in QUERIES:
+        outputs = _baseline_query_outputs(query, all_data, fixture_dir_path / "nonexistent_preset.json")
+        records.append({"kind": "query", "case": query, "lines": output_lines(outputs)})
+    with open(golden_filepath, encoding="utf-8", mode="w", newline="\n") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"{len(records)} cases saved: {golden_filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+
+import pytest
+
+import batch_calc
+import engine_golden
+import input_processor
+from input_filepaths import InputFilepaths
+from input_processor import InvalidInput
+from pokemon_data import AllData
+
+queries_filepath = engine_golden.fixture_dir_path / "batch_queries.txt"
+
+
+@pytest.fixture(autouse=True)
+def reset_worker_calculator(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(batch_calc, "_worker_calculator", None)
+
+
+def read_queries() -> list[tuple[int, str]]:
+    with open(queries_filepath, encoding="utf-8") as f:
+        return list(batch_calc.read_queries(f))
+
+
+def query_line_count(query: str) -> int:
+    """goldenの、queryを展開した結果の行数（ヘッダーと、1つの結果につき2行）から、結果の数を求める。"""
+    with open(engine_golden.golden_filepath, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["kind"] == "query" and record["case"] == query:
+                return (len(record["lines"]) - 1) // 2
+    raise KeyError(query)
+
+
+def test_read_queries() -> None:
+    assert read_queries() == [
+        (3, "gabu kai w zis"),
+        (4, "doraparu gabu w doragolaro- to samehada"),
+        (6, "gabu doraparu w su"),
+        (7, "xyz kai w zis"),
+    ]
+
+
+def test_chunked() -> None:
+    assert list(batch_calc.chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_run_batch(input_filepaths: InputFilepaths) -> None:
+    records = list(batch_calc.run_batch(read_queries(), input_filepaths, "first"))
+    by_line: dict[int, list[dict]] = {}
+    for record in records:
+        by_line.setdefault(record["line_number"], []).append(record)
+    assert list(by_line) == [3, 4, 6, 7]
+    assert len(by_line[3]) == query_line_count("gabu kai w zis")
+    assert len(by_line[4]) == query_line_count("doraparu gabu w doragolaro- to samehada")
+    for record in by_line[3] + by_line[4] + by_line[6]:
+        assert "error" not in record
+        assert len(record["damages"]) == 16
+    # じめん技はひこうタイプに当たらない
+    assert {(record["attacker"], record["defender"], record["move"]) for record in by_line[3]} == {
+        ("garchomp", "dragonite", "earthquake")
+    }
+    assert all(record["max_damage_ratio"] == 0 for record in by_line[3])
+    assert all(record["defender_ability"] == "rough-skin" for record in by_line[4])
+    assert all(record["min_damage_ratio"] > 0 for record in by_line[4])
+    assert {record["move"] for record in by_line[6]} <= {"stone-edge", "scale-shot"}
+    assert [record["error"] for record in by_line[7]] == ["Invalid input: xyz"]
+
+
+def test_run_batch_ambiguity_error(input_filepaths: InputFilepaths) -> None:
+    records = list(batch_calc.run_batch([(6, "gabu doraparu w su")], input_filepaths, "error"))
+    assert len(records) == 1
+    assert records[0]["error"].startswith("Ambiguous input: su")
+
+
+def test_run_batch_status_move(input_filepaths: InputFilepaths) -> None:
+    queries = [(1, "gabu kai w turuginomai"), (2, "gabu kai w zis")]
+    records = list(batch_calc.run_batch(queries, input_filepaths, "first"))
+    assert records[0]["line_number"] == 1
+    assert records[0]["error"] == "not a damaging move: つるぎのまい"
+    assert all("error" not in record for record in records[1:])
+    assert len(records[1:]) == query_line_count("gabu kai w zis")
+
+
+def test_evaluate_unexpected_error(input_filepaths: InputFilepaths, monkeypatch: pytest.MonkeyPatch) -> None:
+    def raise_error(*args: object) -> None:
+        raise ZeroDivisionError("division by zero")
+
+    calculator = batch_calc.init_worker(input_filepaths, "first")
+    monkeypatch.setattr(batch_calc, "calc_damages", raise_error)
+    assert calculator.evaluate(1, "gabu kai w zis") == [
+        {"line_number": 1, "query": "gabu kai w zis", "error": "ZeroDivisionError: division by zero"}
+    ]
+
+
+def test_run_batch_workers(input_filepaths: InputFilepaths) -> None:
+    queries = read_queries()
+    expected = list(batch_calc.run_batch(queries, input_filepaths, "first"))
+    assert list(batch_calc.run_batch(queries, input_filepaths, "first", workers=2, chunk_size=1)) == expected
+
+
+def test_write_records_csv(input_filepaths: InputFilepaths) -> None:
+    records = list(batch_calc.run_batch(read_queries(), input_filepaths, "first"))
+    output = io.StringIO()
+    batch_calc.write_records(records, output, "csv")
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert len(rows) == len(records)
+    assert list(rows[0]) == batch_calc.CSV_FIELDNAMES
+    assert len(rows[0]["damages"].split(" ")) == 16
+
+
+def test_retrieve_one_data_ambiguity_policy(all_data: AllData) -> None:
+    with pytest.raises(InvalidInput):
+        input_processor.retrieve_one_data(all_data.moves, "dora", ambiguity_policy="error")
+    selected = input_processor.retrieve_one_data(all_data.moves, "dora", ambiguity_policy="first")
+    assert selected.data.name in ["dragon-claw", "dragon-darts"]
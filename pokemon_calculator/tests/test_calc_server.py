@@ -0,0 +1,117 @@
+from collections.abc import Iterator
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+import batch_calc
+from calc_server import CalcServer
+from input_filepaths import InputFilepaths
+
+
+@pytest.fixture(scope="module")
+def calc_server(input_filepaths: InputFilepaths) -> Iterator[tuple[CalcServer, tuple[str, int]]]:
+    """127.0.0.1の空いているポートで、別スレッドのイベントループで待ち受ける。"""
+    batch_calc._worker_calculator = None
+    calc_server = CalcServer(input_filepaths, "first", workers=1, chunk_size=1)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(calc_server.handle_connection, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield calc_server, server.sockets[0].getsockname()[:2]
+    server.close()
+    asyncio.run_coroutine_threadsafe(server.wait_closed(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    calc_server.close()
+    batch_calc._worker_calculator = None
+
+
+def request(address: tuple[str, int], method: str, path: str, body: object = None) -> tuple[int, dict]:
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    try:
+        connection.request(method, path, None if body is None else json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_health(calc_server: tuple[CalcServer, tuple[str, int]]) -> None:
+    _, address = calc_server
+    assert request(address, "GET", "/health") == (200, {"status": "ok"})
+    assert request(address, "POST", "/health", {})[0] == 405
+    assert request(address, "GET", "/unknown")[0] == 404
+
+
+def test_calc(calc_server: tuple[CalcServer, tuple[str, int]]) -> None:
+    _, address = calc_server
+    status, response = request(address, "POST", "/calc", {"query": "doraparu gabu w doragolaro- to samehada"})
+    assert status == 200
+    assert response["outputs"]
+    for output in response["outputs"]:
+        assert (output["attacker"], output["defender"], output["move"]) == ("dragapult", "garchomp", "dragon-darts")
+        assert output["defender_ability"] == "rough-skin"
+        assert len(output["damages"]) == 16
+
+    status, from_json = request(
+        address,
+        "POST",
+        "/calc",
+        {"attacker": {"pokemon": "doraparu"}, "defender": {"pokemon": "gabu", "to": "samehada"}, "move": "doragolaro-"},
+    )
+    assert status == 200
+    assert from_json["outputs"][0]["query"] == "doraparu gabu to samehada w doragolaro-"
+    assert [output["damages"] for output in from_json["outputs"]] == [
+        output["damages"] for output in response["outputs"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ({"query": "xyz kai w zis"}, "Invalid input: xyz"),
+        ({"query": "gabu kai w turuginomai"}, "not a damaging move: つるぎのまい"),
+        ({"attacker": {"pokemon": "gabu"}}, "defender.pokemon is required"),
+        ([], "request must be an object"),
+    ],
+)
+def test_calc_bad_request(calc_server: tuple[CalcServer, tuple[str, int]], body: object, error: str) -> None:
+    _, address = calc_server
+    assert request(address, "POST", "/calc", body) == (400, {"error": error})
+
+
+def test_calc_unexpected_error(
+    calc_server: tuple[CalcServer, tuple[str, int]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    server, address = calc_server
+
+    def raise_error(request: dict) -> dict:
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(server, "calc", raise_error)
+    assert request(address, "POST", "/calc", {"query": "gabu kai w zis"}) == (500, {"error": "RuntimeError: broken"})
+    # 500を返した後も同じサーバーで受け付けられる
+    assert request(address, "GET", "/health") == (200, {"status": "ok"})
+
+
+def test_sweep(calc_server: tuple[CalcServer, tuple[str, int]]) -> None:
+    _, address = calc_server
+    queries = ["gabu kai w zis", {"attacker": {"pokemon": "gabu"}}, "gabu kai w turuginomai", 1, "xyz kai w zis"]
+    status, response = request(address, "POST", "/sweep", {"queries": queries})
+    assert status == 200
+    results = response["results"]
+    assert [result["line_number"] for result in results] == sorted(result["line_number"] for result in results)
+    errors = {result["line_number"]: result["error"] for result in results if "error" in result}
+    assert errors == {
+        1: "defender.pokemon is required",
+        2: "not a damaging move: つるぎのまい",
+        3: "query must be a string or an object",
+        4: "Invalid input: xyz",
+    }
+    assert all(len(result["damages"]) == 16 for result in results if result["line_number"] == 0)
+    status, response = request(address, "POST", "/sweep", {"queries": "gabu kai w zis"})
+    assert (status, response) == (400, {"error": "queries must be a list"})
@@ -0,0 +1,90 @@
+import dataclasses
+import json
+import shutil
+from pathlib import Path
+
+import jsonc
+
+import data_validator
+import engine_golden
+import metagame_db
+from input_processor import QueryContext
+from pokemon_data import AllData, NameExtended
+
+
+def problem_strs(problems: list[data_validator.Problem]) -> list[str]:
+    return sorted(str(problem) for problem in problems)
+
+
+# fixturesの持ち物の"こだわり"は、"こだわりハチマキ"、"こだわりメガネ"と区別して入力できない
+FIXTURE_PROBLEMS = ["prefix_collision: items こだわり: every retrieval name also matches こだわりハチマキ, こだわりメガネ"]
+
+
+def test_validate_fixtures(all_data: AllData) -> None:
+    assert problem_strs(data_validator.validate(all_data)) == FIXTURE_PROBLEMS
+
+
+def test_duplicate_display_name(all_data: AllData) -> None:
+    earthquake = all_data.moves["earthquake"]
+    moves = {**all_data.moves, "earthquake-copy": NameExtended(earthquake.data, earthquake.display_name, ["zzz"])}
+    problems = data_validator.validate(dataclasses.replace(all_data, moves=moves))
+    detail = f"{earthquake.display_name} is also earthquake"
+    assert problem_strs(problems) == sorted(
+        [*FIXTURE_PROBLEMS, f"duplicate_display_name: moves earthquake-copy: {detail}"]
+    )
+
+
+def test_dangling_reference(all_data: AllData) -> None:
+    moves = {name: move for name, move in all_data.moves.items() if name != "earthquake"}
+    problems = data_validator.validate(dataclasses.replace(all_data, moves=moves))
+    dangling = [problem for problem in problems if problem.check == "dangling_reference"]
+    assert len(dangling) > 0
+    assert all(problem.kind == "pokemons" for problem in dangling)
+    assert all(problem.detail == "moves earthquake does not exist" for problem in dangling)
+    assert {problem.name for problem in dangling} == {
+        name for name, pokemon in all_data.pokemons.items() if "earthquake" in pokemon.data.move_names
+    }
+
+
+def test_prefix_collision(all_data: AllData) -> None:
+    earthquake = all_data.moves["earthquake"]
+    # retrieval_nameがじしんの接頭辞なので、最後まで入力しても候補が2つになる
+    prefix = earthquake.retrieval_names[0][:2]
+    moves = {**all_data.moves, "ji": NameExtended(earthquake.data, "じ", [prefix])}
+    problems = data_validator.validate(dataclasses.replace(all_data, moves=moves))
+    assert [
+        str(problem) for problem in problems if problem.check == "prefix_collision" and problem.kind == "moves"
+    ] == ["prefix_collision: moves ji: every retrieval name also matches earthquake"]
+
+
+def test_metagame_references(all_data: AllData, tmp_path: Path) -> None:
+    filepath = tmp_path / "metagame.json"
+    metagame = {
+        "garchomp": {"sets": [{"usage": 1, "ability": "no-such-ability", "d6": "0-252-0-0-4-252"}]},
+        "no-such-pokemon": {"sets": [{"usage": 1, "d6": "0-252-0-0-4-252"}]},
+    }
+    filepath.write_text(json.dumps(metagame), encoding="utf-8")
+    problems = data_validator.validate(dataclasses.replace(all_data, metagame=metagame_db.MetagameDB(filepath)))
+    assert [str(problem) for problem in problems if problem.kind == "metagame"] == [
+        "dangling_reference: metagame garchomp: abilities no-such-ability does not exist",
+        "dangling_reference: metagame no-such-pokemon: pokemons no-such-pokemon does not exist",
+    ]
+
+
+def test_validate_names_files(tmp_path: Path, query_context: QueryContext) -> None:
+    shutil.copytree(engine_golden.fixture_dir_path, tmp_path, dirs_exist_ok=True)
+    names_filepaths = engine_golden.names_filepaths(tmp_path)
+    with open(names_filepaths.move_names_filepath, encoding="utf-8") as f:
+        move_names = jsonc.load(f)
+    move_names["no-such-move"] = {"display_name": "ないわざ", "retrieval_names": ["ないわざ"]}
+    move_names["earthquake"]["retrieval_names"].append("𠮷")
+    with open(names_filepaths.move_names_filepath, encoding="utf-8", mode="w") as f:
+        json.dump(move_names, f, ensure_ascii=False)
+    problems = data_validator.validate_all(
+        engine_golden.pokeapi_filepaths(tmp_path), names_filepaths, query_context.converter, tmp_path / "metagame.json"
+    )
+    # names fileに問題があるときは、AllDataを作らずにそれだけを返す
+    assert problem_strs(problems) == [
+        "conversion_failure: moves earthquake: 𠮷: Unexpected character 𠮷 is in 𠮷",
+        "unknown_name: moves no-such-move: not in the PokeAPI data",
+    ]
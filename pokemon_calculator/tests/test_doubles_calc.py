@@ -0,0 +1,81 @@
+import dataclasses
+from pathlib import Path
+
+import pytest
+
+import doubles_calc
+import input_processor
+from doubles_calc import Target
+from input_processor import InputArgs, InvalidInput
+from pokemon_calc import calc_damage, calc_damages
+from pokemon_data import AllData, Move, NameExtended
+from preset_store import PresetStore
+
+
+def make_input_args(query: str, all_data: AllData, tmp_path: Path) -> InputArgs:
+    return input_processor.make_input_args_from_str(query, all_data, PresetStore(tmp_path / "preset.json"))
+
+
+def test_spread_inputs(all_data: AllData, tmp_path: Path) -> None:
+    opponents = [
+        make_input_args("gabu d 252 kai h 252 d 0 w zis j kabe", all_data, tmp_path),
+        make_input_args("gabu d 252 doraparu h 0 d 0 w zis j kabe", all_data, tmp_path),
+    ]
+    ally = make_input_args("gabu d 252 patti h 4 d 0 w zis j kabe", all_data, tmp_path)
+    inputs = doubles_calc.make_spread_inputs(opponents, ally, all_data)
+    assert [input.defender.pokemon.data.name for input in inputs] == ["dragonite", "dragapult", "dracozolt"]
+    assert [input.hp_doryokuchi for input in inputs] == [252, 0, 4]
+    # attackerは全員で共有する
+    assert inputs[0].attacker is inputs[1].attacker is inputs[2].attacker
+    # 味方には壁がかからない
+    assert [[state.data.name for state in input.states] for input in inputs] == [
+        ["壁", "ダブルバトル"],
+        ["壁", "ダブルバトル"],
+        ["ダブルバトル"],
+    ]
+    # input_args.statesは書き換えない
+    assert [[state.data.name for state in input_args.states] for input_args in [*opponents, ally]] == [["壁"]] * 3
+
+
+def test_spread_damage(all_data: AllData, tmp_path: Path) -> None:
+    [input] = doubles_calc.make_spread_inputs(
+        [make_input_args("gabu d 252 patti h 252 d 0 w zis", all_data, tmp_path)], None, all_data
+    )
+    [output] = calc_damages([input], all_data)
+    single = calc_damage(dataclasses.replace(input, states=[]), all_data)
+    # 全体技の補正（3072/4096）は乱数より前にかかるため、丸めの分だけずれる
+    assert max(output.damage.damages) == pytest.approx(max(single.damage.damages) * 0.75, rel=0.02)
+
+
+def test_not_spread_move(all_data: AllData, tmp_path: Path) -> None:
+    with pytest.raises(InvalidInput):
+        doubles_calc.make_spread_inputs(
+            [make_input_args("gabu d 252 kai h 252 d 0 w doragolkuro-", all_data, tmp_path)], None, all_data
+        )
+
+
+def test_ally_with_all_opponents_move(all_data: AllData, tmp_path: Path) -> None:
+    opponent = make_input_args("gabu d 252 kai h 252 d 0 w zis", all_data, tmp_path)
+    opponent.move = NameExtended(Move("rock-slide", 75, "physical", "all-opponents", "rock"), "rock-slide", [])
+    ally = make_input_args("gabu d 252 patti h 4 d 0 w zis", all_data, tmp_path)
+    with pytest.raises(InvalidInput):
+        doubles_calc.make_spread_inputs([opponent], ally, all_data)
+    # 味方がいなければ計算できる
+    assert len(doubles_calc.make_spread_inputs([opponent], None, all_data)) == 1
+
+
+class FakeOutput:
+    def __init__(self, ko_probability: float) -> None:
+        self.ko_probability = ko_probability
+
+
+def test_joint_ko_table() -> None:
+    targets = [Target(FakeOutput(0.5), False), Target(FakeOutput(0.25), False)]  # type: ignore[arg-type]
+    table = dict(doubles_calc.joint_ko_table(targets))
+    assert table == {
+        (True, True): 0.125,
+        (True, False): 0.375,
+        (False, True): 0.125,
+        (False, False): 0.375,
+    }
+    assert sum(table.values()) == 1
@@ -0,0 +1,46 @@
+"""ベースラインの実装で作ったgolden（fixtures/engine_golden.jsonl）と、現在の実装の結果を比べる。"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+import engine_golden
+import input_processor
+from input_processor import SpreadProfile
+from pokemon_calc import OutputTable, calc_damage, calc_damages
+from pokemon_data import AllData
+from preset_store import PresetStore
+
+
+def load_golden(kind: str) -> dict[str, dict]:
+    with open(engine_golden.golden_filepath, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    return {record["case"]: record for record in records if record["kind"] == kind}
+
+
+def test_engine(all_data: AllData) -> None:
+    golden = load_golden("engine")
+    cases = engine_golden.engine_inputs(all_data)
+    assert [case for case, _ in cases] == list(golden)
+    # calc_damages()はHP以外が同じ入力をまとめて計算し、OutputTableは行をまとめて整形する
+    outputs = calc_damages([input for _, input in cases], all_data)
+    rows = OutputTable(outputs).row_strs()
+    mismatches = [case for (case, _), row in zip(cases, rows) if row != golden[case]["line"]]
+    assert mismatches == []
+    # 1つずつ計算しても同じ
+    for case, input in cases[:: len(cases) // 20]:
+        assert calc_damage(input, all_data).to_str() == golden[case]["line"]
+
+
+@pytest.mark.parametrize("query", engine_golden.QUERIES)
+def test_query(
+    query: str, all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path
+) -> None:
+    inputs = input_processor.get_inputs_from_str(
+        query, all_data, PresetStore(tmp_path / "preset.json"), spread_profile, ambiguity_policy="error"
+    )
+    assert inputs is not None
+    outputs = calc_damages(inputs, all_data)
+    lines = [outputs[0].header_str(), *OutputTable(outputs).render().split("\n")]
+    assert lines == load_golden("query")[query]["lines"]
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+import benchmark
+from pokemon_calc import FinalDamageCalc, Hoseichi
+from pokemon_calc import mul_round_5_to_down, mul_round_5_to_down_list, mul_round_5_to_up
+from pokemon_calc import round_5_to_down, round_5_to_up
+
+
+@pytest.mark.parametrize(
+    "x, value, up, down",
+    [
+        # 2048 / 4096 = 0.5 ちょうど
+        (1, 2048, 1, 0),
+        (3, 2048, 2, 1),
+        (2047, 1, 0, 0),
+        (2049, 1, 1, 1),
+        (100, 6144, 150, 150),
+        (4096, 5325, 5325, 5325),
+        (0, 8192, 0, 0),
+    ],
+)
+def test_mul_round_5(x: int, value: int, up: int, down: int) -> None:
+    assert mul_round_5_to_up(x, value) == up == round_5_to_up(x * value / 4096)
+    assert mul_round_5_to_down(x, value) == down == round_5_to_down(x * value / 4096)
+
+
+def test_mul_round_5_to_down_list() -> None:
+    xs = list(range(0, 300, 7))
+    assert mul_round_5_to_down_list(xs, 6144) == [mul_round_5_to_down(x, 6144) for x in xs]
+
+
+def test_hoseichi() -> None:
+    hoseichi = Hoseichi()
+    hoseichi.hosei(5325)
+    hoseichi.hosei(6144)
+    assert hoseichi.hoseichi == round_5_to_up(5325 * 6144 / 4096)
+
+
+def test_final_damage_calc() -> None:
+    final_damage_calc = FinalDamageCalc(123)
+    # 123 * 6144 / 4096 = 184.5 は切り捨てる
+    final_damage_calc.hosei(6144)
+    assert final_damage_calc.damage == 184
+    final_damage_calc.ransuu()
+    damages = [184 * r // 100 for r in range(85, 101)]
+    assert final_damage_calc.get_damages() == damages
+    final_damage_calc.hosei(5325)
+    assert final_damage_calc.get_damages() == [round_5_to_down(damage * 5325 / 4096) for damage in damages]
+
+
+def test_hoseichi_table_values() -> None:
+    values = benchmark.hoseichi_table_values()
+    assert {2048, 4915, 5325, 6144, 8192} <= set(values)
+    assert values == sorted(values)
+
+
+def test_verify_fixed_point() -> None:
+    assert benchmark.verify_fixed_point(max_x=64, max_quotient=256) == []
+
+
+def test_verify_fixed_point_detects_wrong_tie_rule(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(benchmark, "mul_round_5_to_down", lambda x, value: (x * value + 2048) >> 12)
+    assert benchmark.verify_fixed_point(max_x=64, max_quotient=256) != []
+
+
+def test_ransuu_matches_float() -> None:
+    for damage in range(2000):
+        assert [damage * r // 100 for r in range(85, 101)] == [math.floor(damage * r / 100) for r in range(85, 101)]
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import input_processor
+from input_processor import SpreadProfile
+from pokemon_data import AllData
+from preset_store import PresetStore
+
+
+def make_input_args(query: str, all_data: AllData, tmp_path: Path) -> input_processor.InputArgs:
+    return input_processor.make_input_args_from_str(query, all_data, PresetStore(tmp_path / "preset.json"))
+
+
+def test_iter_inputs_is_product(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    input_args = make_input_args("gabu kai w zis", all_data, tmp_path)
+    inputs = list(input_processor.iter_inputs(input_args, all_data, spread_profile))
+    attacker_overrides = spread_profile.attacker_overrides(input_args)
+    defender_overrides = spread_profile.defender_overrides(input_args)
+    assert len(inputs) == len(attacker_overrides) * len(defender_overrides)
+    # attackerごとに、defenderの組を順に試す
+    assert [input.hp_doryokuchi for input in inputs[: len(defender_overrides)]] == [
+        hp_override.get("hp_doryokuchi", input_args.hp_doryokuchi) for _, hp_override in defender_overrides
+    ]
+
+
+def test_iter_inputs_shares_battle_pokemons(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    input_args = make_input_args("gabu kai w zis", all_data, tmp_path)
+    inputs = list(input_processor.iter_inputs(input_args, all_data, spread_profile))
+    # 上書きの組ごとにBattlePokemonは1つ
+    attackers = {id(input.attacker): input.attacker for input in inputs}
+    defenders = {id(input.defender): input.defender for input in inputs}
+    assert len(attackers) == len({(a.doryokuchi, a.seikaku_hosei, a.item) for a in attackers.values()})
+    assert len(defenders) < len(inputs)
+    # HPだけが違う組は、同じdefenderのBattlePokemonを使う
+    assert len(defenders) == len({(d.doryokuchi, d.seikaku_hosei, d.item) for d in defenders.values()})
+
+
+def test_iter_inputs_with_doryokuchi(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    input_args = make_input_args("gabu d 252 kai h 252 d 0 w zis", all_data, tmp_path)
+    [input] = input_processor.iter_inputs(input_args, all_data, spread_profile)
+    assert input.hp_doryokuchi == 252
+    assert (input.attacker.doryokuchi, input.defender.doryokuchi) == (252, 0)
+
+
+def test_iter_inputs_does_not_copy_input_args(
+    all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path
+) -> None:
+    input_args = make_input_args("gabu kai w zis", all_data, tmp_path)
+    list(input_processor.iter_inputs(input_args, all_data, spread_profile))
+    # 展開でinput_argsの努力値は書き換えない
+    assert input_args.attacker.doryokuchi is None and input_args.defender.doryokuchi is None
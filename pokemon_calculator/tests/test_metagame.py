@@ -0,0 +1,129 @@
+import dataclasses
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+import input_processor
+import metagame_db
+from input_filepaths import InputFilepaths
+from input_processor import BUILTIN_FIXED_SETTINGS, SpreadProfile
+from pokemon_calc import Input, calc_damage
+from pokemon_data import AllData, Move, NameExtended
+from preset_store import PresetStore
+
+
+def expand(query: str, all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> list[Input]:
+    inputs = input_processor.get_inputs_from_str(
+        query, all_data, PresetStore(tmp_path / "preset.json"), spread_profile, ambiguity_policy="error"
+    )
+    assert inputs is not None
+    return inputs
+
+
+def test_builtin_fixed_settings_names(all_data: AllData) -> None:
+    for item_name, terasu_type_name in BUILTIN_FIXED_SETTINGS.values():
+        assert item_name is None or item_name in all_data.items
+        assert terasu_type_name is None or terasu_type_name in all_data.types
+
+
+def test_fixed_fallback_without_metagame(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    assert all_data.metagame is None
+    for input in expand("zasial kai w kixyoj", all_data, spread_profile, tmp_path):
+        assert input.attacker.item is not None and input.attacker.item.data.name == "もちもの指定なし"
+    for input in expand("kai zasial w zis", all_data, spread_profile, tmp_path):
+        assert input.defender.item is not None and input.defender.item.data.name == "もちもの指定なし"
+    # 王でない姿には適用しない
+    for input in expand("rekisel kai w aial", all_data, spread_profile, tmp_path):
+        assert input.attacker.item is None or input.attacker.item.data.name != "もちもの指定なし"
+
+
+type MakeAllData = Callable[[dict], AllData]
+
+
+@pytest.fixture
+def metagame_all_data(all_data: AllData, tmp_path: Path) -> MakeAllData:
+    def make(metagame: dict) -> AllData:
+        filepath = tmp_path / "metagame.json"
+        filepath.write_text(json.dumps(metagame, ensure_ascii=False), encoding="utf-8")
+        return dataclasses.replace(all_data, metagame=metagame_db.MetagameDB(filepath))
+
+    return make
+
+
+def test_fixed_settings_with_metagame(
+    metagame_all_data: MakeAllData, input_filepaths: InputFilepaths, tmp_path: Path
+) -> None:
+    # setsの持ち物より、BUILTIN_FIXED_SETTINGSが優先される
+    all_data = metagame_all_data(
+        {"zacian-crowned": {"sets": [{"usage": 1, "item": "こだわり", "d6": "4-252-0-0-0-252", "seikaku": "a-c"}]}}
+    )
+    spread_profile = SpreadProfile(all_data, input_filepaths.spread_profile_filepath)
+    for input in expand("zasial kai w kixyoj", all_data, spread_profile, tmp_path):
+        assert input.attacker.item is not None and input.attacker.item.data.name == "もちもの指定なし"
+
+
+# fixturesにない技。_select_metagame()は技のnameとdamage_classだけを見る
+EXTRA_MOVES = [
+    Move("psyshock", 80, "special", "selected-pokemon", "psychic"),
+    Move("body-press", 80, "physical", "selected-pokemon", "fighting"),
+    Move("foul-play", 95, "physical", "selected-pokemon", "dark"),
+]
+SETS_METAGAME = {
+    "garchomp": {"sets": [{"usage": 1, "item": "こだわり", "d6": "4-252-8-16-32-196", "seikaku": "a-c"}]},
+    "dragonite": {"sets": [{"usage": 1, "item": "いのちのたま", "d6": "244-12-20-28-36-168", "seikaku": "b-a"}]},
+}
+
+
+@pytest.mark.parametrize(
+    "move_name, attacker_override, defender_override",
+    [
+        # (努力値, 性格補正, 持ち物)
+        ("earthquake", (252, 1.1, "こだわり"), (20, 1.1, "いのちのたま")),
+        ("flamethrower", (16, 0.9, "こだわり"), (36, 1, "いのちのたま")),
+        ("psyshock", (16, 0.9, "こだわり"), (20, 1.1, "いのちのたま")),
+        ("body-press", (8, 1, "こだわり"), (20, 1.1, "いのちのたま")),
+        # イカサマはdefender（カイリュー）のこうげき
+        ("foul-play", (12, 0.9, None), (20, 1.1, "いのちのたま")),
+    ],
+)
+def test_metagame_spread_stat(
+    move_name: str,
+    attacker_override: tuple,
+    defender_override: tuple,
+    metagame_all_data: MakeAllData,
+    input_filepaths: InputFilepaths,
+    tmp_path: Path,
+) -> None:
+    all_data = metagame_all_data(SETS_METAGAME)
+    all_data.moves = {**all_data.moves, **{move.name: NameExtended(move, move.name, []) for move in EXTRA_MOVES}}
+    spread_profile = SpreadProfile(all_data, input_filepaths.spread_profile_filepath)
+    input_args = input_processor.make_input_args_from_str("gabu kai w zis", all_data, PresetStore(tmp_path / "p.json"))
+    input_args.move = all_data.moves[move_name]
+    input_processor.complete_input_args(input_args, all_data)
+
+    def summary(override: dict) -> tuple:
+        item = override.get("item")
+        return override["doryokuchi"], override["seikaku_hosei"], item.data.name if item is not None else None
+
+    assert [summary(override) for override in spread_profile.attacker_overrides(input_args)] == [attacker_override]
+    assert [
+        (summary(override), hp_override) for override, hp_override in spread_profile.defender_overrides(input_args)
+    ] == [(defender_override, {"hp_doryokuchi": 244, "hp_kotaichi": 31})]
+
+
+def test_physical_defense_special_moves(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    # 同じ威力、タイプの特殊技で、ぼうぎょで計算するものとしないものを比べる
+    moves = {
+        name: NameExtended(Move(name, 80, "special", "selected-pokemon", "psychic"), name, [])
+        for name in ["psyshock", "psystrike", "secret-sword", "extrasensory"]
+    }
+    # カイリューはぼうぎょ95、とくぼう100
+    [input] = expand("gabu d 252 kai h 0 d 0 w zis", all_data, spread_profile, tmp_path)
+    damages = {
+        name: calc_damage(dataclasses.replace(input, move=move), all_data).damage.damages
+        for name, move in moves.items()
+    }
+    assert damages["psyshock"] == damages["psystrike"] == damages["secret-sword"]
+    assert damages["psyshock"] > damages["extrasensory"]
@@ -0,0 +1,43 @@
+import pytest
+
+import input_processor
+import move_ranking
+from input_processor import QueryContext
+from pokemon_calc import Output
+
+
+@pytest.fixture(scope="module")
+def ranked(query_context: QueryContext) -> list[Output]:
+    input_args = input_processor.make_input_args_from_str(
+        "gabu d 252 kai h 0 d 0", query_context.all_data, query_context.preset_store
+    )
+    return move_ranking.rank_moves(input_args, query_context.all_data)
+
+
+def test_damaging_moves(query_context: QueryContext) -> None:
+    garchomp = query_context.all_data.pokemons["garchomp"]
+    names = {move.data.name for move in move_ranking.damaging_moves(garchomp, query_context.all_data)}
+    assert "earthquake" in names and "outrage" in names
+    assert "swords-dance" not in names
+
+
+def test_rank_moves_order(ranked: list[Output], query_context: QueryContext) -> None:
+    garchomp = query_context.all_data.pokemons["garchomp"]
+    assert sorted(output.input.move.data.name for output in ranked) == sorted(
+        move.data.name for move in move_ranking.damaging_moves(garchomp, query_context.all_data)
+    )
+    keys = [(output.ko_probability, output.damage.average) for output in ranked]
+    assert keys == sorted(keys, reverse=True)
+    # げきりんは確定、ドラゴンクローは乱数1発、じしんはカイリューに当たらない
+    assert [(output.input.move.data.name, output.ko_probability) for output in ranked[:2]] == [
+        ("outrage", 1.0),
+        ("dragon-claw", 0.125),
+    ]
+    assert ranked[-1].input.move.data.name == "earthquake"
+    assert ranked[-1].damage.max == 0
+
+
+def test_ko_probability(ranked: list[Output]) -> None:
+    for output in ranked:
+        ko_count = sum(damage >= output.defender_hp for damage in output.damage.damages)
+        assert output.ko_probability == ko_count / 16
@@ -0,0 +1,41 @@
+import pytest
+
+import input_processor
+from pokemon_data import AllData, prefix_edit_distance
+
+
+def names(data_list) -> list[str]:
+    return [data.data.name for data in data_list]
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [("gavu", ["garchomp"]), ("kia", ["dragonite"]), ("dorapalt", ["dragapult"]), ("zasian", ["zacian-crowned"])],
+)
+def test_ngram_index_search(all_data: AllData, query: str, expected: list[str]) -> None:
+    assert names(all_data.ngram_indexes["pokemons"].search(query)) == expected
+
+
+def test_ngram_index_search_no_candidate(all_data: AllData) -> None:
+    assert all_data.ngram_indexes["pokemons"].search("xyz") == []
+
+
+def test_ngram_index_search_restriction(all_data: AllData) -> None:
+    ngram_index = all_data.ngram_indexes["moves"]
+    assert names(ngram_index.search("doragolkuro", restriction=["earthquake"])) == []
+    assert names(ngram_index.search("doragolkuro", restriction=["dragon-claw", "earthquake"])) == ["dragon-claw"]
+
+
+def test_prefix_edit_distance() -> None:
+    assert prefix_edit_distance("gabu", "gaburiasu") == 0
+    assert prefix_edit_distance("gavu", "gaburiasu") == 1
+    assert prefix_edit_distance("xyz", "gaburiasu", max_distance=1) == 2
+
+@pytest.mark.parametrize("ambiguity_policy, printed", [("prompt", True), ("first", False), ("error", False)])
+def test_retrieve_one_data_ngram_fallback(
+    all_data: AllData, capsys: pytest.CaptureFixture[str], ambiguity_policy, printed: bool
+) -> None:
+    selected = input_processor.retrieve_one_data(
+        all_data.pokemons, "gavu", ngram_index=all_data.ngram_indexes["pokemons"], ambiguity_policy=ambiguity_policy
+    )
+    assert selected.data.name == "garchomp"
+    assert (capsys.readouterr().out != "") == printed
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+
+import pytest
+
+import input_processor
+from input_processor import QueryContext
+from pokemon_calc import OUTPUT_FIELDNAMES, Output, OutputTable, calc_damages
+
+
+@pytest.fixture(scope="module")
+def outputs(query_context: QueryContext) -> list[Output]:
+    inputs = input_processor.get_inputs_from_str(
+        "doraparu gabu w doragolaro-",
+        query_context.all_data,
+        query_context.preset_store,
+        query_context.spread_profile,
+        allow_preset_commands=False,
+    )
+    assert inputs is not None
+    return calc_damages(inputs, query_context.all_data)
+
+
+def test_to_dict_keys(outputs: list[Output]) -> None:
+    assert list(outputs[0].to_dict()) == OUTPUT_FIELDNAMES
+
+
+def test_write_json_lines(outputs: list[Output]) -> None:
+    f = io.StringIO()
+    OutputTable(outputs).write_json_lines(f)
+    lines = f.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [output.to_dict() for output in outputs]
+
+
+def test_write_csv(outputs: list[Output]) -> None:
+    f = io.StringIO()
+    OutputTable(outputs).write_csv(f)
+    rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+    assert len(rows) == len(outputs)
+    for row, output in zip(rows, outputs):
+        assert list(row) == OUTPUT_FIELDNAMES
+        assert row["attacker"] == "dragapult"
+        assert row["damages"] == " ".join(map(str, output.damage.damages))
+        assert row["states"] == ""
+
+
+def test_write_csv_empty() -> None:
+    f = io.StringIO()
+    OutputTable([]).write_csv(f)
+    assert f.getvalue() == ",".join(OUTPUT_FIELDNAMES) + "\n"
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pytest
+
+import input_processor
+from input_processor import InvalidInput
+from pokemon_data import AllData
+from preset_store import PresetStore
+
+
+@pytest.fixture
+def preset_store(tmp_path: Path) -> PresetStore:
+    preset_store = PresetStore(tmp_path / "preset.json")
+    preset_store.set("gabu", "gabu d 252 s a")
+    return preset_store
+
+
+@pytest.mark.parametrize("query, message", [("gabu p", "p requires a preset name"), ("gabu kai w", "w requires a value")])
+def test_option_without_value(
+    query: str, message: str, all_data: AllData, preset_store: PresetStore, tmp_path: Path
+) -> None:
+    compiled_presets = input_processor.CompiledPresets(all_data, [], tmp_path / "preset.json.compiled.json")
+    for presets in [None, compiled_presets]:
+        with pytest.raises(InvalidInput, match=message):
+            input_processor.make_input_args_from_str(query, all_data, preset_store, presets)
+
+
+def test_preset_expansion(all_data: AllData, preset_store: PresetStore) -> None:
+    input_args = input_processor.make_input_args_from_str("p gabu kai w zis", all_data, preset_store)
+    assert input_args.attacker.pokemon is not None and input_args.attacker.pokemon.data.name == "garchomp"
+    assert input_args.attacker.doryokuchi == 252
+    assert input_args.defender.pokemon is not None and input_args.defender.pokemon.data.name == "dragonite"
@@ -0,0 +1,337 @@
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import threading
+
+import jsonc
+import pytest
+
+import pokeapi_async_downloader
+import pokeapi_downloader
+from pokeapi_async_downloader import PokeapiClient, PokeapiError, ResourceCache
+
+
+class PokeapiServer(ThreadingHTTPServer):
+    """記録したレスポンスの代わりに、resourcesのJSONを返す。ETagは本体のsha256。"""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), PokeapiHandler)
+        self.resources: dict[str, object] = {}
+        # パスごとに、先に返すステータス
+        self.failures: dict[str, list[int]] = {}
+        self.requested: list[str] = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v2/"
+
+
+class PokeapiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: PokeapiServer
+
+    def do_GET(self) -> None:
+        with self.server.lock:
+            self.server.requested.append(self.path)
+            failures = self.server.failures.get(self.path)
+            status = failures.pop(0) if failures else None
+        if status is None and (resource := self.server.resources.get(self.path)) is not None:
+            body = json.dumps(resource).encode("utf-8")
+            etag = f'"{hashlib.sha256(body).hexdigest()}"'
+            if self.headers["If-None-Match"] == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+        else:
+            body = b"{}"
+            self.send_response(status or 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def pokeapi_server() -> Iterator[PokeapiServer]:
+    server = PokeapiServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """再試行の前に待つ時間を記録し、待たずに続ける。"""
+    delays: list[float] = []
+    sleep = asyncio.sleep
+
+    async def record(delay: float) -> None:
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(pokeapi_async_downloader.asyncio, "sleep", record)
+    return delays
+
+
+def add_resources(server: PokeapiServer, endpoint: str, records: dict[str, dict]) -> None:
+    server.resources[f"/api/v2/{endpoint}/?limit=100000"] = {"results": [{"name": name} for name in records]}
+    for name, record in records.items():
+        server.resources[f"/api/v2/{endpoint}/{name}/"] = record
+
+
+async def fetch_thing(client: PokeapiClient, name: str) -> dict:
+    return await client.get_json(f"thing/{name}/")
+
+
+def test_get_json(pokeapi_server: PokeapiServer) -> None:
+    pokeapi_server.resources["/api/v2/move/1/"] = {"name": "pound"}
+
+    async def get() -> list:
+        client = PokeapiClient(pokeapi_server.base_url, requests_per_second=0)
+        try:
+            # レスポンス中のPokeAPIの絶対URLも、base_urlのサーバーで解決する
+            return [
+                await client.get_json("move/1/"),
+                await client.get_json(f"{pokeapi_async_downloader.DEFAULT_BASE_URL}move/1/"),
+            ]
+        finally:
+            client.close()
+
+    first, second = asyncio.run(get())
+    assert first == second == {"name": "pound"}
+    # 呼び出しごとに新しいオブジェクト
+    assert first is not second
+
+
+def test_retry(pokeapi_server: PokeapiServer, no_backoff: list[float]) -> None:
+    pokeapi_server.resources["/api/v2/move/1/"] = {"name": "pound"}
+    pokeapi_server.failures["/api/v2/move/1/"] = [503]
+    client = PokeapiClient(pokeapi_server.base_url, requests_per_second=0, retries=1)
+    assert asyncio.run(client.get_json("move/1/")) == {"name": "pound"}
+    client.close()
+    assert pokeapi_server.requested == ["/api/v2/move/1/"] * 2
+    assert no_backoff == [1]
+
+
+@pytest.mark.parametrize("failures, retries", [([404], 3), ([503, 503], 1)])
+def test_error(pokeapi_server: PokeapiServer, no_backoff: list[float], failures: list[int], retries: int) -> None:
+    pokeapi_server.resources["/api/v2/move/1/"] = {"name": "pound"}
+    pokeapi_server.failures["/api/v2/move/1/"] = list(failures)
+    client = PokeapiClient(pokeapi_server.base_url, requests_per_second=0, retries=retries)
+    with pytest.raises(PokeapiError, match=f"HTTP {failures[-1]}"):
+        asyncio.run(client.get_json("move/1/"))
+    client.close()
+    # 再試行しないステータスでは1回だけ
+    assert len(pokeapi_server.requested) == len(failures)
+
+
+def test_shared_request(pokeapi_server: PokeapiServer) -> None:
+    pokeapi_server.resources["/api/v2/move/1/"] = {"name": "pound"}
+
+    async def get() -> list:
+        client = PokeapiClient(pokeapi_server.base_url, requests_per_second=0)
+        try:
+            results = await asyncio.gather(*(client.get_json("move/1/") for _ in range(3)))
+            assert client.counts == {"downloaded": 1, "shared": 2}
+            # 取得を終えたURLは残さず、次は取得し直す
+            assert client.pending == {}
+            results.append(await client.get_json("move/1/"))
+            return results
+        finally:
+            client.close()
+
+    assert asyncio.run(get()) == [{"name": "pound"}] * 4
+    assert pokeapi_server.requested == ["/api/v2/move/1/"] * 2
+
+
+def test_cache(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    pokeapi_server.resources["/api/v2/move/1/"] = {"name": "pound"}
+    pokeapi_server.resources["/api/v2/move/2/"] = {"name": "pound"}
+
+    def get_all() -> tuple[list, PokeapiClient]:
+        client = PokeapiClient(pokeapi_server.base_url, requests_per_second=0, cache=ResourceCache(tmp_path))
+        results = [asyncio.run(client.get_json(f"move/{i}/")) for i in [1, 2]]
+        client.close()
+        return results, client
+
+    results, client = get_all()
+    assert results == [{"name": "pound"}] * 2
+    assert client.counts == {"downloaded": 2}
+    # 同じ内容は1つのファイルにまとめる
+    assert len(list((tmp_path / "objects").iterdir())) == 1
+    assert len(list((tmp_path / "urls").iterdir())) == 2
+
+    pokeapi_server.resources["/api/v2/move/2/"] = {"name": "karate-chop"}
+    results, client = get_all()
+    assert results == [{"name": "pound"}, {"name": "karate-chop"}]
+    assert client.counts == {"not_modified": 1, "downloaded": 1}
+
+
+def test_cache_without_object(tmp_path: Path) -> None:
+    cache = ResourceCache(tmp_path)
+    cache.store("http://example.com/move/1/", b'{"name": "pound"}', '"etag"', None)
+    entry = cache.get("http://example.com/move/1/")
+    assert entry is not None and cache.load(entry) == b'{"name": "pound"}'
+    assert cache.get("http://example.com/move/2/") is None
+    # 本体が失われているときは、条件付きリクエストをしない
+    (tmp_path / "objects" / f"{entry.content}.json").unlink()
+    assert cache.get("http://example.com/move/1/") is None
+
+
+def test_download_all(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    records = {name: {"name": name, "value": i} for i, name in enumerate(["c", "a", "b"])}
+    add_resources(pokeapi_server, "thing", records)
+    output_filepath = tmp_path / "pokeapi_things.json"
+    client = PokeapiClient(pokeapi_server.base_url, concurrency=2, requests_per_second=0)
+    asyncio.run(pokeapi_async_downloader.download_all(client, "thing", fetch_thing, output_filepath))
+    client.close()
+    # 取得した順によらず、APIResourceListの順に保存する
+    with open(output_filepath, encoding="utf-8") as f:
+        assert json.load(f) == list(records.values())
+
+
+def test_download_all_resumes(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    records = {name: {"name": name} for name in ["a", "b", "c"]}
+    add_resources(pokeapi_server, "thing", records)
+    pokeapi_server.failures["/api/v2/thing/c/"] = [404]
+    output_filepath = tmp_path / "pokeapi_things.json"
+    client = PokeapiClient(pokeapi_server.base_url, concurrency=1, requests_per_second=0)
+    with pytest.raises(ExceptionGroup):
+        asyncio.run(pokeapi_async_downloader.download_all(client, "thing", fetch_thing, output_filepath))
+    client.close()
+    assert not output_filepath.exists()
+
+    pokeapi_server.requested.clear()
+    client = PokeapiClient(pokeapi_server.base_url, concurrency=1, requests_per_second=0)
+    asyncio.run(pokeapi_async_downloader.download_all(client, "thing", fetch_thing, output_filepath))
+    client.close()
+    # ジャーナルにあるものは取得し直さない
+    assert pokeapi_server.requested == ["/api/v2/thing/?limit=100000", "/api/v2/thing/c/"]
+    with open(output_filepath, encoding="utf-8") as f:
+        assert json.load(f) == list(records.values())
+
+
+def refresh(server: PokeapiServer, output_filepath: Path, revalidate: bool = True) -> tuple[dict, dict]:
+    client = PokeapiClient(server.base_url, requests_per_second=0)
+    try:
+        return asyncio.run(
+            pokeapi_async_downloader.refresh_all(client, "thing", fetch_thing, output_filepath, revalidate)
+        )
+    finally:
+        client.close()
+
+
+def test_refresh_all(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_things.json"
+    previous = [{"name": "a", "value": 0}, {"name": "b", "value": 1}, {"name": "removed", "value": 2}]
+    pokeapi_downloader.save_to_json(previous, output_filepath)
+    add_resources(
+        pokeapi_server, "thing", {"c": {"name": "c", "value": 3}, "a": {"name": "a", "value": 4}, "b": previous[1]}
+    )
+    previous_records, updated = refresh(pokeapi_server, output_filepath)
+    assert previous_records == {record["name"]: record for record in previous}
+    assert updated == {"c": {"name": "c", "value": 3}, "a": {"name": "a", "value": 4}}
+    # APIResourceListの順で、なくなったものは末尾に残す
+    assert pokeapi_downloader.load_pokeapi_data_json(output_filepath) == [
+        {"name": "c", "value": 3},
+        {"name": "a", "value": 4},
+        {"name": "b", "value": 1},
+        {"name": "removed", "value": 2},
+    ]
+
+
+def test_refresh_all_new_only(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_things.json"
+    pokeapi_downloader.save_to_json([{"name": "a", "value": 0}], output_filepath)
+    add_resources(pokeapi_server, "thing", {"a": {"name": "a", "value": 4}, "b": {"name": "b", "value": 1}})
+    _, updated = refresh(pokeapi_server, output_filepath, revalidate=False)
+    assert updated == {"b": {"name": "b", "value": 1}}
+    assert pokeapi_server.requested == ["/api/v2/thing/?limit=100000", "/api/v2/thing/b/"]
+    assert pokeapi_downloader.load_pokeapi_data_json(output_filepath) == [
+        {"name": "a", "value": 0},
+        {"name": "b", "value": 1},
+    ]
+
+
+def test_refresh_all_unchanged(pokeapi_server: PokeapiServer, tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_things.json"
+    output_filepath.write_text('[{"name": "a"}]', encoding="utf-8")
+    add_resources(pokeapi_server, "thing", {"a": {"name": "a"}})
+    assert refresh(pokeapi_server, output_filepath)[1] == {}
+    # 変わったものがなければ書き換えない
+    assert output_filepath.read_text(encoding="utf-8") == '[{"name": "a"}]'
+
+
+def move_record(name: str, jp_name: str | None, power: int = 40) -> dict:
+    return {
+        "id": 1,
+        "name": name,
+        "accuracy": 100,
+        "power": power,
+        "damage_class.name": "physical",
+        "meta": {"min_hits": None, "max_hits": None, "crit_rate": 0},
+        "jp_name": {"name": jp_name, "language": "ja-Hrkt"} if jp_name is not None else None,
+        "target.name": "selected-pokemon",
+        "type.name": "normal",
+    }
+
+
+def test_refresh_names_file(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    names_filepath = tmp_path / "move_names.json"
+    names_filepath.write_text(
+        """{
+    // コメントは残す
+    "pound": {
+        "display_name": "はたく",
+        "retrieval_names": [
+            "はたく"
+        ]
+    },
+    "slam": {
+        "display_name": "たたきつける",
+        "retrieval_names": [
+            "たたきつける",
+            "slam"
+        ]
+    }
+    // "tackle": {"display_name": "たいあたり", "retrieval_names": ["たいあたり"]}
+}
+""",
+        encoding="utf-8",
+    )
+    previous_records = {"pound": move_record("pound", "はたく"), "slam": move_record("slam", "たたきつける")}
+    updated = {
+        "pound": move_record("pound", "はたくX"),
+        "slam": move_record("slam", "たたきつけるX"),
+        "tackle": move_record("tackle", "たいあたり"),
+        "scratch": move_record("scratch", "ひっかく"),
+        "unnamed": move_record("unnamed", None),
+    }
+    pokeapi_async_downloader.refresh_names_file("move", previous_records, updated, names_filepath)
+    with open(names_filepath, encoding="utf-8") as f:
+        text = f.read()
+    assert "// コメントは残す" in text
+    # 作ったときのままのエントリーは作り直し、手で編集したものは残し、コメントアウトしたものは追加しない
+    assert jsonc.loads(text) == {
+        "pound": {"display_name": "はたくX", "retrieval_names": ["はたくX"]},
+        "slam": {"display_name": "たたきつける", "retrieval_names": ["たたきつける", "slam"]},
+        "scratch": {"display_name": "ひっかく", "retrieval_names": ["ひっかく"]},
+    }
+    out = capsys.readouterr().out
+    assert "unnamed has no japanese name" in out
+    assert "slam is edited by hand" in out
@@ -0,0 +1,80 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+import pokeapi_downloader
+
+NAMES = ["bulbasaur", "ivysaur", "venusaur", "charmander"]
+
+
+class ResourceList:
+    def __init__(self, endpoint: str) -> None:
+        self.names = NAMES
+
+
+@pytest.fixture(autouse=True)
+def resource_list(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pokeapi_downloader.pokebase, "APIResourceList", ResourceList, raising=False)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def download_until(stop: str | None, downloaded: list[str]):
+    def download(name: str) -> dict:
+        if name == stop:
+            raise Interrupted
+        downloaded.append(name)
+        return {"name": name}
+
+    return download
+
+
+def load(output_filepath: Path) -> list[dict]:
+    with open(output_filepath, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_resume_from_journal(tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_pokemon_species.json"
+    downloaded: list[str] = []
+    with pytest.raises(Interrupted):
+        pokeapi_downloader.download_all("pokemon-species", download_until("venusaur", downloaded), output_filepath)
+    assert downloaded == ["bulbasaur", "ivysaur"]
+    # 中断したときは出力先を作らない
+    assert not output_filepath.exists()
+    assert not Path(f"{output_filepath}.tmp").exists()
+
+    downloaded.clear()
+    pokeapi_downloader.download_all("pokemon-species", download_until(None, downloaded), output_filepath)
+    assert downloaded == ["venusaur", "charmander"]
+    assert load(output_filepath) == [{"name": name} for name in NAMES]
+
+    pokeapi_downloader.remove_journals([output_filepath])
+    assert not os.path.exists(pokeapi_downloader.journal_filepath(output_filepath))
+
+
+def test_truncated_journal_line_is_downloaded_again(tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_moves.json"
+    with pytest.raises(Interrupted):
+        pokeapi_downloader.download_all("move", download_until("venusaur", []), output_filepath)
+    with open(pokeapi_downloader.journal_filepath(output_filepath), mode="ab") as f:
+        f.write(b'{"name": "venusaur", "rec')
+
+    downloaded: list[str] = []
+    pokeapi_downloader.download_all("move", download_until(None, downloaded), output_filepath)
+    assert downloaded == ["venusaur", "charmander"]
+    assert load(output_filepath) == [{"name": name} for name in NAMES]
+    with open(pokeapi_downloader.journal_filepath(output_filepath), encoding="utf-8") as f:
+        assert [json.loads(line)["name"] for line in f] == NAMES
+
+
+def test_start_from(tmp_path: Path) -> None:
+    output_filepath = tmp_path / "pokeapi_abilities.json"
+    downloaded: list[str] = []
+    pokeapi_downloader.download_all("ability", download_until(None, downloaded), output_filepath, start_from=3)
+    assert downloaded == ["venusaur", "charmander"]
+    assert load(output_filepath) == [{"name": "venusaur"}, {"name": "charmander"}]
@@ -0,0 +1,35 @@
+from pokemon_data import AllData, PrefixIndex, retrieve_data
+
+
+def names(data_list) -> list[str]:
+    return [data.data.name for data in data_list]
+
+def test_prefix_index_candidates_match_retrieve_data(all_data: AllData) -> None:
+    prefix_index = PrefixIndex(all_data.moves)
+    for prefix in ["d", "dora", "doragolk", "honoono", "z", "xyz", ""]:
+        candidates = [prefix_index.names[i] for i in prefix_index.candidates(prefix)]
+        assert candidates == names(retrieve_data(all_data.moves, prefix))
+
+
+def test_prefix_index_shortest_unique_prefixes(all_data: AllData) -> None:
+    prefix_index = PrefixIndex(all_data.moves)
+    shortest = dict(zip(prefix_index.names, prefix_index.shortest_unique_prefixes()))
+    assert shortest["dragon-claw"] == "doragolk"
+    assert shortest["dragon-darts"] == "doragola"
+    assert shortest["earthquake"] == "z"
+    for name, prefix in shortest.items():
+        assert prefix is not None
+        assert names(retrieve_data(all_data.moves, prefix)) == [name]
+        assert len(retrieve_data(all_data.moves, prefix[:-1])) > 1
+
+
+def test_prefix_index_ambiguous_prefixes(all_data: AllData) -> None:
+    prefix_index = PrefixIndex(all_data.moves)
+    ambiguous = {
+        prefix: [prefix_index.names[i] for i in candidates]
+        for prefix, candidates in prefix_index.ambiguous_prefixes().items()
+    }
+    assert ambiguous["dora"] == ["dragon-claw", "dragon-darts"]
+    assert ambiguous["honoono"] == ["fire-fang", "fire-punch"]
+    assert "doragolk" not in ambiguous
+    assert PrefixIndex(all_data.pokemons).ambiguous_prefixes() == {}
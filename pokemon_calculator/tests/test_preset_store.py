@@ -0,0 +1,86 @@
+import json
+import os
+from pathlib import Path
+
+from preset_store import PresetStore
+
+
+def read_journal(store: PresetStore) -> list[dict]:
+    with open(store.journal_filepath, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_replay(tmp_path: Path) -> None:
+    preset_filepath = tmp_path / "preset.json"
+    preset_filepath.write_text('{"a": "gabu", "b": "kai"}', encoding="utf-8")
+    store = PresetStore(preset_filepath)
+    store.set("c", "doraparu")
+    store.set("a", "gabu d 252 s a")
+    store.delete("b")
+    # preset.jsonは書き換えず、journalに追記する
+    assert json.loads(preset_filepath.read_text(encoding="utf-8")) == {"a": "gabu", "b": "kai"}
+    assert [record["op"] for record in read_journal(store)] == ["set", "set", "del"]
+
+    reloaded = PresetStore(preset_filepath)
+    assert reloaded.presets == {"a": "gabu d 252 s a", "c": "doraparu"}
+    assert reloaded.journal_length == 3
+    assert reloaded.retrieve("") == ["a", "c"]
+
+
+def test_truncated_journal_line_is_ignored(tmp_path: Path) -> None:
+    store = PresetStore(tmp_path / "preset.json")
+    store.set("a", "gabu")
+    with open(store.journal_filepath, encoding="utf-8", mode="a") as f:
+        f.write('{"op": "set", "key": "b", "va')
+    reloaded = PresetStore(tmp_path / "preset.json")
+    assert reloaded.presets == {"a": "gabu"}
+
+
+def test_set_after_torn_journal_line(tmp_path: Path) -> None:
+    store = PresetStore(tmp_path / "preset.json")
+    store.set("a", "gabu")
+    # 追記の途中で中断された
+    with open(store.journal_filepath, encoding="utf-8", mode="a") as f:
+        f.write('{"op": "set", "key": "b", "va')
+    store = PresetStore(tmp_path / "preset.json")
+    store.set("c", "kai")
+    assert [record["key"] for record in read_journal(store)] == ["a", "c"]
+    reloaded = PresetStore(tmp_path / "preset.json")
+    assert reloaded.presets == {"a": "gabu", "c": "kai"}
+    assert reloaded.journal_length == 2
+
+
+def test_glued_journal_line_is_ignored(tmp_path: Path) -> None:
+    """以前の実装で、壊れた行の後ろに続けて書かれたjournalも読める。"""
+    store = PresetStore(tmp_path / "preset.json")
+    store.set("a", "gabu")
+    with open(store.journal_filepath, encoding="utf-8", mode="a") as f:
+        f.write('{"op": "set", "key": "b", "va{"op": "set", "key": "c", "value": "kai"}\n')
+    reloaded = PresetStore(tmp_path / "preset.json")
+    assert reloaded.presets == {"a": "gabu"}
+    reloaded.set("d", "doraparu")
+    assert PresetStore(tmp_path / "preset.json").presets == {"a": "gabu", "d": "doraparu"}
+
+
+def test_compaction(tmp_path: Path) -> None:
+    preset_filepath = tmp_path / "preset.json"
+    store = PresetStore(preset_filepath, compaction_threshold=3)
+    store.set("a", "gabu")
+    store.set("b", "kai")
+    assert os.path.exists(store.journal_filepath)
+    assert not preset_filepath.exists()
+    store.delete("a")
+    # 3行目でpreset.jsonに書き戻し、journalを削除する
+    assert not os.path.exists(store.journal_filepath)
+    assert store.journal_length == 0
+    assert json.loads(preset_filepath.read_text(encoding="utf-8")) == {"b": "kai"}
+    assert PresetStore(preset_filepath).presets == {"b": "kai"}
+    assert list(tmp_path.iterdir()) == [preset_filepath]
+
+
+def test_sync_reloads_changes_from_another_store(tmp_path: Path) -> None:
+    store = PresetStore(tmp_path / "preset.json")
+    other = PresetStore(tmp_path / "preset.json")
+    other.set("kai", "kairyu-")
+    assert store.retrieve("ka") == ["kai"]
+    assert store.get("kai") == "kairyu-"
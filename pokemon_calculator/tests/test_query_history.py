@@ -0,0 +1,126 @@
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+import input_processor
+import query_history
+from pokemon_data import AllData, Item, NameExtended
+from query_history import HALF_LIFE, QueryHistory
+
+# "kodawari"で"こだわり"、"こだわりハチマキ"、"こだわりメガネ"の3つが候補になる
+QUERY = "kodawari"
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(query_history.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def history(tmp_path: Path) -> Iterator[QueryHistory]:
+    history = QueryHistory(tmp_path / "query_history.json", flush_delay=3600)
+    yield history
+    history.close()
+
+
+def candidates(all_data: AllData) -> list[NameExtended[Item]]:
+    return [all_data.items[name] for name in ["こだわり", "こだわりハチマキ", "こだわりメガネ"]]
+
+
+def test_score_decays(history: QueryHistory, clock: Clock) -> None:
+    table = history.table("items")
+    table.record("こだわり")
+    table.record("こだわり")
+    assert table.score("こだわり", clock.now) == 2
+    assert table.score("こだわり", clock.now + HALF_LIFE) == pytest.approx(1)
+    clock.now += HALF_LIFE
+    table.record("こだわり")
+    assert table.score("こだわり", clock.now) == pytest.approx(2)
+    assert table.score("こだわりメガネ", clock.now) == 0
+
+
+def test_rank(all_data: AllData, history: QueryHistory, clock: Clock) -> None:
+    table = history.table("items")
+    assert [data.data.name for data in table.rank(candidates(all_data))] == [
+        "こだわり",
+        "こだわりハチマキ",
+        "こだわりメガネ",
+    ]
+    table.record("こだわりハチマキ")
+    clock.now += 1
+    table.record("こだわりメガネ")
+    # 最近選ばれたものほどスコアが大きく、記録のないものは元の順
+    assert [data.data.name for data in table.rank(candidates(all_data))] == [
+        "こだわりメガネ",
+        "こだわりハチマキ",
+        "こだわり",
+    ]
+
+
+def test_dominant(all_data: AllData, history: QueryHistory, clock: Clock) -> None:
+    table = history.table("items")
+    for _ in range(2):
+        table.record("こだわりメガネ")
+    # min_auto_select_scoreに満たない
+    assert table.dominant(candidates(all_data)) is None
+    table.record("こだわりメガネ")
+    assert table.dominant(candidates(all_data)) is all_data.items["こだわりメガネ"]
+    # 他の候補のスコアが大きく、auto_select_shareに満たない
+    table.record("こだわりハチマキ")
+    assert table.dominant(candidates(all_data)) is None
+
+
+def test_retrieve_one_data(
+    all_data: AllData, history: QueryHistory, clock: Clock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    prompts: list[str] = []
+
+    def get_input(prompt_str: str = ">>>") -> str:
+        prompts.append(prompt_str)
+        return "f"
+
+    monkeypatch.setattr(input_processor, "get_input", get_input)
+    table = history.table("items")
+
+    def retrieve() -> str:
+        return input_processor.retrieve_one_data(all_data.items, QUERY, history=table).data.name
+
+    # 記録のスコアの順に並べた先頭（"f"）を選び、選んだものを記録する
+    table.record("こだわりメガネ")
+    assert [retrieve(), retrieve()] == ["こだわりメガネ"] * 2
+    assert len(prompts) == 2
+    assert table.score("こだわりメガネ", clock.now) == 3
+    # 十分多く選ばれたものは入力を求めずに選ぶ
+    assert retrieve() == "こだわりメガネ"
+    assert len(prompts) == 2
+
+
+def test_persistence(tmp_path: Path, clock: Clock) -> None:
+    filepath = tmp_path / "query_history.json"
+    history = QueryHistory(filepath, flush_delay=3600)
+    history.table("items").record("こだわりメガネ")
+    assert not filepath.exists()
+    history.close()
+    reloaded = QueryHistory(filepath)
+    assert reloaded.table("items").score("こだわりメガネ", clock.now) == 1
+    assert reloaded.table("moves").entries == {}
+    reloaded.close()
+
+
+def test_broken_file(tmp_path: Path) -> None:
+    filepath = tmp_path / "query_history.json"
+    filepath.write_text('{"items": ', encoding="utf-8")
+    history = QueryHistory(filepath)
+    assert history.tables == {}
+    history.close()
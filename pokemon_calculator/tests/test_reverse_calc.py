@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+import input_processor
+from input_processor import InvalidInput
+from pokemon_calc import BattlePokemon, Input, calc_damage, calc_hp
+from pokemon_data import AllData
+from preset_store import PresetStore
+from reverse_calc import DORYOKUCHI_CANDIDATES, Observation, ReverseCalculator
+
+
+def make_calculator(query: str, all_data: AllData, tmp_path: Path, infer) -> ReverseCalculator:
+    input_args = input_processor.make_input_args_from_str(query, all_data, PresetStore(tmp_path / "preset.json"))
+    return ReverseCalculator(input_args, all_data, infer)
+
+
+def test_observation() -> None:
+    assert Observation.from_str("40-45", "percent").hp_range(200) == (80, 90)
+    assert Observation.from_str("81.5", "hp").hp_range(200) == (82, 81)
+    with pytest.raises(InvalidInput):
+        Observation.from_str("a-b", "hp")
+
+
+def test_infer_defender(all_data: AllData, tmp_path: Path) -> None:
+    calculator = make_calculator("gabu d 252 s a doraparu h 4 w gekiril", all_data, tmp_path, "b")
+    assert calculator.doryokuchis == DORYOKUCHI_CANDIDATES
+    # 推定される側の本当の型で計算したダメージを観測値にする
+    ability = calculator.abilities[0]
+    defender = BattlePokemon(all_data.pokemons["dragapult"], ability, 100, 31, 1, None, 0, None)
+    move = all_data.moves["outrage"]
+    damages = calc_damage(Input(calculator.known, defender, move, [], 4, 31), all_data).damage.damages
+    observation = Observation(min(damages), max(damages), "hp")
+
+    hypotheses = list(calculator.search(observation))
+    assert any(
+        hypothesis.ability is ability
+        and hypothesis.item is None
+        and hypothesis.seikaku_hosei == 1
+        and hypothesis.doryokuchi == 100
+        and hypothesis.damages == damages
+        for hypothesis in hypotheses
+    )
+    for hypothesis in hypotheses:
+        assert any(min(damages) <= damage <= max(damages) for damage in hypothesis.damages)
+    # 二分探索で区間を絞っても、すべての組を調べたときと同じものが見つかる
+    expected = {
+        (id(ability), id(item), seikaku_hosei, doryokuchi)
+        for ability in calculator.abilities
+        for item in calculator.items
+        for seikaku_hosei in calculator.seikaku_hoseis
+        for doryokuchi in calculator.doryokuchis
+        if any(
+            min(damages) <= damage <= max(damages)
+            for damage in calculator.damages(ability, item, seikaku_hosei, doryokuchi)
+        )
+    }
+    found = {(id(h.ability), id(h.item), h.seikaku_hosei, h.doryokuchi) for h in hypotheses}
+    assert found == expected
+
+
+def test_infer_attacker(all_data: AllData, tmp_path: Path) -> None:
+    calculator = make_calculator("gabu doraparu h 252 d 4 w gekiril", all_data, tmp_path, "a")
+    hp = calc_hp(all_data.pokemons["dragapult"].data.stats.h, 252, 31, 50)
+    damages = calculator.damages(calculator.abilities[0], None, 1, 100)
+    # 割合の丸めで境界のダメージが外れないように、0.5ずつ広げる
+    observation = Observation((min(damages) - 0.5) * 100 / hp, (max(damages) + 0.5) * 100 / hp, "percent")
+    assert observation.hp_range(hp) == (min(damages), max(damages))
+
+    hypotheses = list(calculator.search(observation))
+    assert any(
+        hypothesis.item is None and hypothesis.seikaku_hosei == 1 and hypothesis.doryokuchi == 100
+        for hypothesis in hypotheses
+    )
+    for hypothesis in hypotheses:
+        assert hypothesis.hp_doryokuchi == 252
+        assert hypothesis.defender_hp == hp
+        assert any(min(damages) <= damage <= max(damages) for damage in hypothesis.damages)
+    # attackerの努力値が大きいほどダメージは大きい
+    assert max(calculator.damages(calculator.abilities[0], None, 1, 252)) > max(damages)
+    assert max(calculator.damages(calculator.abilities[0], None, 1, 0)) < max(damages)
+
+
+def test_infer_attacker_needs_defender_hp(all_data: AllData, tmp_path: Path) -> None:
+    calculator = make_calculator("gabu doraparu d 4 w gekiril", all_data, tmp_path, "a")
+    with pytest.raises(InvalidInput):
+        list(calculator.search(Observation(30, 40, "percent")))
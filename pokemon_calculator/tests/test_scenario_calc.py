@@ -0,0 +1,112 @@
+import pytest
+
+import input_processor
+import scenario_calc
+from input_processor import InvalidInput, QueryContext
+from pokemon_calc import Output, calc_damages
+from scenario_calc import Chip, HpDistribution, Scenario
+
+
+def calc(query: str, query_context: QueryContext) -> Output:
+    inputs = input_processor.get_inputs_from_str(
+        query,
+        query_context.all_data,
+        query_context.preset_store,
+        query_context.spread_profile,
+        allow_preset_commands=False,
+    )
+    assert inputs is not None and len(inputs) == 1
+    return calc_damages(inputs, query_context.all_data)[0]
+
+
+def chip(name: str) -> Chip:
+    return next(chip for chip in scenario_calc.CHIPS if chip.name == name)
+
+
+def test_hit() -> None:
+    distribution = HpDistribution(10)
+    distribution.hit([3, 4])
+    assert distribution.weights == [0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0]
+    assert distribution.total == 2
+    distribution.hit([5, 7])
+    # 7 → 2, 0 と 6 → 1, 0
+    assert distribution.weights == [2, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert distribution.total == 4
+    assert distribution.ko_probability() == 0.5
+    assert (distribution.min_hp(), distribution.max_hp_remaining()) == (0, 2)
+    distribution.hit([1, 1, 1])
+    # ひんしのものはそのまま、残りHP2と1は1ずつ減る
+    assert distribution.weights == [9, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert distribution.total == 12
+
+
+def test_shift() -> None:
+    distribution = HpDistribution(10)
+    distribution.hit([4, 10])
+    distribution.shift(-3)
+    # 回復は最大HPまで。ひんしからは回復しない
+    assert distribution.weights == [1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0]
+    distribution.shift(-3)
+    assert distribution.weights == [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+    distribution.shift(12)
+    assert distribution.weights == [2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert distribution.ko_probability() == 1
+
+
+def test_copy() -> None:
+    distribution = HpDistribution(10)
+    copied = distribution.copy()
+    distribution.hit([3])
+    assert copied.weights[10] == 1 and copied.average_hp() == 10
+    assert distribution.average_hp() == 7
+
+
+def test_chip_amount(query_context: QueryContext) -> None:
+    all_data = query_context.all_data
+    # カイリュー（ドラゴン・ひこう）の最大HPは198
+    dragonite = calc("gabu d 252 kai h 252 d 0 w gekiril", query_context)
+    assert dragonite.defender_hp == 198
+    amounts = {
+        chip.name: scenario_calc.chip_amount(chip, dragonite.input.defender, 198, all_data)
+        for chip in scenario_calc.CHIPS
+    }
+    assert amounts == {"ステルスロック": 198 * 2 // 8, "すなあらし": 198 // 16, "たべのこし": -(198 // 16)}
+
+    # テラスタルしたはがねタイプは、すなあらしを受けず、ステルスロックは1/2倍
+    steel = calc("gabu d 252 kai h 252 d 0 t hagane w gekiril", query_context)
+    assert scenario_calc.chip_amount(chip("ステルスロック"), steel.input.defender, 198, all_data) == 198 // 16
+    assert scenario_calc.chip_amount(chip("すなあらし"), steel.input.defender, 198, all_data) == 0
+
+    # じめんタイプはすなあらしを受けない。最低1ダメージ
+    garchomp = calc("kai d 252 gabu h 0 d 0 w gekiril", query_context)
+    assert scenario_calc.chip_amount(chip("すなあらし"), garchomp.input.defender, 198, all_data) == 0
+    assert scenario_calc.chip_amount(chip("ステルスロック"), garchomp.input.defender, 1, all_data) == 1
+
+
+def test_scenario(query_context: QueryContext) -> None:
+    hit = calc("gabu d 0 kai h 252 d 252 w doragolkuro-", query_context)
+    chips = scenario_calc.load_chips(query_context.converter)
+    distributions = Scenario([[hit, chips["すなあらし"]], [hit]], query_context.all_data).run()
+    assert len(distributions) == 2
+    assert distributions[0].max_hp_remaining() == 198 - min(hit.damage.damages) - 198 // 16
+    assert distributions[0].min_hp() == 198 - max(hit.damage.damages) - 198 // 16
+    assert distributions[0].ko_probability() == 0
+    assert 0 < distributions[1].ko_probability() < 1
+    assert distributions[1].total == 16 * 16
+
+
+@pytest.mark.parametrize(
+    "other_query",
+    [
+        "gabu d 252 kai h 252 d 0 m totugeki w gekiril",
+        "gabu d 252 kai h 252 d 0 t hagane w gekiril",
+        "gabu d 252 kai h 252 d 0 to seisinryoku w gekiril",
+        "gabu d 252 kai h 0 d 0 w gekiril",
+        "gabu d 252 doraparu h 252 d 0 w gekiril",
+    ],
+)
+def test_scenario_different_defender(other_query: str, query_context: QueryContext) -> None:
+    first = calc("gabu d 252 kai h 252 d 0 w gekiril", query_context)
+    other = calc(other_query, query_context)
+    with pytest.raises(InvalidInput):
+        Scenario([[first], [other]], query_context.all_data)
@@ -0,0 +1,77 @@
+from pathlib import Path
+import os
+import shutil
+
+import pytest
+
+import engine_golden
+import pokemon_data
+from input_filepaths import NamesFilepaths, PokeapiFilepaths
+from pokemon_data import AllData
+
+
+@pytest.fixture
+def filepaths(tmp_path: Path) -> tuple[PokeapiFilepaths, NamesFilepaths, pokemon_data.JpToRomaji]:
+    shutil.copytree(engine_golden.fixture_dir_path, tmp_path, dirs_exist_ok=True)
+    converter = pokemon_data.JpToRomaji(tmp_path / "jp_replacement.json")
+    return engine_golden.pokeapi_filepaths(tmp_path), engine_golden.names_filepaths(tmp_path), converter
+
+
+def load(filepaths: tuple[PokeapiFilepaths, NamesFilepaths, pokemon_data.JpToRomaji]) -> AllData:
+    return pokemon_data.load_all_data(*filepaths, None)
+
+
+def summary(all_data: AllData) -> dict:
+    """比較のため、各データをdata、display_name、retrieval_namesの組にする。"""
+    return {
+        kind: {
+            name: (value.data, value.display_name, value.retrieval_names)
+            for name, value in getattr(all_data, kind).items()
+        }
+        for kind in pokemon_data.NAMES_FILEPATH_NAMES
+    }
+
+
+def test_snapshot_round_trip(
+    filepaths: tuple[PokeapiFilepaths, NamesFilepaths, pokemon_data.JpToRomaji], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    built = load(filepaths)
+    for names_filepath in vars(filepaths[1]).values():
+        assert os.path.exists(pokemon_data.snapshot_filepath(names_filepath))
+
+    def fail(*args: object) -> None:
+        raise AssertionError("snapshot was not used")
+
+    monkeypatch.setattr(pokemon_data, "load_pokeapi_data", fail)
+    monkeypatch.setattr(pokemon_data, "build_name_extended_data", fail)
+    loaded = load(filepaths)
+    assert summary(loaded) == summary(built)
+    assert [value.data.name for value in loaded.ngram_indexes["moves"].search("gekirin")] == ["outrage"]
+
+
+def test_snapshot_rebuilt_after_edit(
+    filepaths: tuple[PokeapiFilepaths, NamesFilepaths, pokemon_data.JpToRomaji], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    load(filepaths)
+    move_names_filepath = Path(filepaths[1].move_names_filepath)
+    move_names_filepath.write_text(
+        move_names_filepath.read_text(encoding="utf-8").replace("げきりん", "ゲキリン"), encoding="utf-8"
+    )
+    built_kinds: list[str] = []
+    build_name_extended_data = pokemon_data.build_name_extended_data
+
+    def record_kind(kind: str, *args):
+        built_kinds.append(kind)
+        return build_name_extended_data(kind, *args)
+
+    monkeypatch.setattr(pokemon_data, "build_name_extended_data", record_kind)
+    loaded = load(filepaths)
+    # 編集したファイルの種類だけ作り直す
+    assert built_kinds == ["moves"]
+    assert loaded.moves["outrage"].display_name == "ゲキリン"
+
+
+def test_broken_snapshot(filepaths: tuple[PokeapiFilepaths, NamesFilepaths, pokemon_data.JpToRomaji]) -> None:
+    built = load(filepaths)
+    Path(pokemon_data.snapshot_filepath(filepaths[1].pokemon_names_filepath)).write_bytes(b"broken")
+    assert summary(load(filepaths)) == summary(built)
@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import input_processor
+from input_processor import InputArgs, SpreadProfile
+from pokemon_data import AllData
+from preset_store import PresetStore
+
+
+def make_input_args(query: str, all_data: AllData, tmp_path: Path) -> InputArgs:
+    input_args = input_processor.make_input_args_from_str(query, all_data, PresetStore(tmp_path / "preset.json"))
+    input_processor.complete_input_args(input_args, all_data)
+    return input_args
+
+
+def write_profile(tmp_path: Path, profile: dict) -> Path:
+    filepath = tmp_path / "spread_profile.json"
+    filepath.write_text(json.dumps(profile, ensure_ascii=False), encoding="utf-8")
+    return filepath
+
+
+def summary(override: dict) -> tuple:
+    item = override.get("item")
+    return override["doryokuchi"], override["seikaku_hosei"], item.data.name if item is not None else None
+
+
+def test_attacker_item_spreads(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    overrides = spread_profile.attacker_overrides(make_input_args("gabu kai w zis", all_data, tmp_path))
+    assert [summary(override) for override in overrides] == [
+        (252, 1.1, "こだわり"),
+        (252, 1.1, "1.2倍アイテム"),
+        (252, 1.1, None),
+        (252, 1, None),
+        (0, 1, None),
+    ]
+    # 持ち物が入力されているときは、itemを持つ組を使わない
+    overrides = spread_profile.attacker_overrides(make_input_args("gabu m totugeki kai w zis", all_data, tmp_path))
+    assert [summary(override) for override in overrides] == [(252, 1.1, None), (252, 1, None), (0, 1, None)]
+
+
+def test_defender_damage_class(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    # とつげきチョッキの組は特殊技のときだけ使う
+    overrides = spread_profile.defender_overrides(make_input_args("gabu kai w zis", all_data, tmp_path))
+    assert [(summary(override), hp_override["hp_doryokuchi"]) for override, hp_override in overrides] == [
+        ((0, 1, None), 0),
+        ((0, 1, None), 252),
+        ((252, 1.1, None), 0),
+        ((252, 1.1, None), 252),
+    ]
+
+
+def test_doryokuchi_given(all_data: AllData, spread_profile: SpreadProfile, tmp_path: Path) -> None:
+    input_args = make_input_args("gabu d 0 kai d 0 w zis", all_data, tmp_path)
+    assert spread_profile.attacker_overrides(input_args) == [{}]
+    assert spread_profile.defender_overrides(input_args) == [({}, {})]
+
+
+def test_custom_profile(all_data: AllData, tmp_path: Path) -> None:
+    filepath = write_profile(
+        tmp_path,
+        {
+            "attacker": [
+                {"doryokuchi": 4, "kotaichi": 0, "seikaku_hosei": 0.9},
+                {"doryokuchi": 252, "seikaku_hosei": 1.1, "damage_class": "physical"},
+                {"doryokuchi": 252, "seikaku_hosei": 1.1, "damage_class": "special"},
+            ],
+            "defender": [{"doryokuchi": 4}, {"doryokuchi": 4, "hp_doryokuchi": 252, "hp_kotaichi": 0}],
+        },
+    )
+    spread_profile = SpreadProfile(all_data, filepath)
+    input_args = make_input_args("gabu kai w zis", all_data, tmp_path)
+    attacker_overrides = spread_profile.attacker_overrides(input_args)
+    assert attacker_overrides == [
+        {"doryokuchi": 4, "kotaichi": 0, "seikaku_hosei": 0.9},
+        {"doryokuchi": 252, "kotaichi": 31, "seikaku_hosei": 1.1},
+    ]
+    # 努力値等が同じ組は同じOverrideのオブジェクト
+    [(first, first_hp), (second, second_hp)] = spread_profile.defender_overrides(input_args)
+    assert first is second
+    assert first == {"doryokuchi": 4, "kotaichi": 31, "seikaku_hosei": 1}
+    assert (first_hp, second_hp) == ({}, {"hp_doryokuchi": 252, "hp_kotaichi": 0})
+
+
+@pytest.mark.parametrize(
+    "spread",
+    [
+        {"seikaku_hosei": 1.1},
+        {"doryokuchi": 252, "unknown": 1},
+        {"doryokuchi": 252, "item": "no such item"},
+        # HPの指定はdefenderだけ
+        {"doryokuchi": 252, "hp_doryokuchi": 252},
+    ],
+)
+def test_invalid_spread(all_data: AllData, tmp_path: Path, spread: dict) -> None:
+    filepath = write_profile(tmp_path, {"attacker": [spread], "defender": []})
+    with pytest.raises(ValueError):
+        SpreadProfile(all_data, filepath)